@@ -3,7 +3,7 @@
 # Configuration for the Crisp environment
 ENV = None
 
-from .configuration import load_configuration
+from .configuration import load_configuration, get_setting
 from .service import Service
 from .servicemanager import ServiceManager
 
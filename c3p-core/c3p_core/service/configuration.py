@@ -50,3 +50,15 @@ def load_configuration(filepath: str = None) -> types.SimpleNamespace:
 
     return service.ENV
 
+
+def get_setting(name: str, default=None):
+    """Return the ENV value at the dotted path name, e.g. "crisp.batch_size".
+
+    The default is returned when the configuration has no such key.
+    """
+    value = service.ENV
+    for key in name.split("."):
+        value = getattr(value, key, None)
+        if value is None:
+            return default
+    return value
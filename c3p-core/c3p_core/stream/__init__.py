@@ -5,3 +5,4 @@ from .message import Message
 from .consumer import Consumer
 from .producer import Producer
 from .type import Type
+from .factory import create_stream
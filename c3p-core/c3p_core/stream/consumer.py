@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 from abc import ABCMeta, abstractmethod
+from typing import List
 
 from .message import Message
 
@@ -19,6 +20,15 @@ class Consumer(metaclass=ABCMeta):
     async def __anext__(self):
         pass
 
+    @abstractmethod
+    async def getmany(self, max_records: int = None, timeout: float = None) -> List[Message]:
+        '''Return up to max_records messages, waiting at most timeout seconds for the first one.
+
+        An empty list is returned when the timeout expires. Like __anext__, raises
+        StopAsyncIteration once the stream has ended or the consumer is closed.
+        '''
+        pass
+
     @abstractmethod
     def ack(self, message: Message):
         '''TODO: make async'''
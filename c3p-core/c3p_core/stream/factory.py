@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+
+from .stream import Stream
+from .type import Type
+
+
+def create_stream(type: Type, topic: str, schema: object, **options) -> Stream:
+    """Create a stream of the given type, options are passed to the stream constructor."""
+    if type == Type.STUB:
+        from .stub import Stream as StreamClass
+    elif type == Type.MEMORY:
+        from .memory import Stream as StreamClass
+    elif type == Type.FILE:
+        from .file import Stream as StreamClass
+    elif type == Type.PROCESS:
+        from .process import Stream as StreamClass
+    else:
+        raise ValueError(f"Unsupported stream type: {type}")
+    return StreamClass(topic, schema, **options)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+
+import asyncio
+import os
+import pickle
+from typing import List
+
+from ..consumer import Consumer as ABCConsumer
+from ..stub.message import Message
+from .log import Log
+from .segment import END_OF_STREAM, SegmentReader, list_segments, segment_path
+
+
+class Consumer(ABCConsumer):
+    """A consumer reading the log of a topic from its last committed offset.
+
+    Acking a message commits the offset following it, so a consumer created again
+    with the same id, in this process or after a restart, replays the messages
+    that were not acked. Acks are cumulative.
+
+    The consumer is woken up by the producers of this process, and polls the log
+    every poll_interval seconds for the records appended by other processes.
+    """
+
+    # Number of messages returned by getmany when max_records is not set
+    max_records = 10000
+
+    def __init__(self, id: str, schema: object, log: Log, poll_interval: float = 0.05) -> None:
+        super().__init__()
+        self.id = id
+        self.schema = schema
+        self.poll_interval = poll_interval
+        self._log = log
+        self._offset_path = log.consumers_directory / f"{id}.offset"
+        # Offset of the first message not acked
+        self.committed = self._load_committed()
+        # Offset of the next message to read
+        self.position = self.committed
+        self._reader: SegmentReader = None
+        self._byte_position = 0
+        # Offset of the end-of-stream record read
+        self._end_offset: int = None
+        self._closing = False
+        self._waiter: asyncio.Future = None
+        # The properties are shared by the messages of a batch, so the last ones are reused
+        self._last_properties = (b"", None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return (await self.getmany(max_records=1))[0]
+
+    async def getmany(self, max_records: int = None, timeout: float = None) -> List[Message]:
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        while True:
+            if self._closing or self._end_offset is not None:
+                raise StopAsyncIteration
+            messages = self._read(max_records or self.max_records)
+            if messages:
+                return messages
+            if self._end_offset is not None:
+                raise StopAsyncIteration
+
+            wait = self.poll_interval
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return []
+                wait = min(wait, remaining)
+            await self._wait(wait)
+
+    async def _wait(self, timeout: float):
+        self._waiter = asyncio.get_event_loop().create_future()
+        self._log.add_waiter(self._waiter)
+        try:
+            await asyncio.wait_for(self._waiter, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._log.remove_waiter(self._waiter)
+            self._waiter = None
+
+    def _read(self, max_records: int) -> List[Message]:
+        messages = []
+        while len(messages) < max_records:
+            if self._reader is None and not self._open():
+                break
+            record = self._reader.read(self._byte_position)
+            if record is None:
+                if self._next_segment():
+                    continue
+                break
+            self._byte_position += record.size
+            # Skip the records preceding the position in the segment
+            if record.offset < self.position:
+                continue
+            self.position = record.offset + 1
+            if record.flags & END_OF_STREAM:
+                self._end_offset = record.offset
+                # Nothing is left to ack before the end-of-stream, move past it
+                if self.committed == record.offset:
+                    self._commit(record.offset + 1)
+                break
+            messages.append(
+                Message(
+                    record.offset,
+                    record.data,
+                    schema=self.schema,
+                    properties=self._decode_properties(record.properties),
+                    timestamp=record.timestamp,
+                )
+            )
+        return messages
+
+    def _decode_properties(self, data: bytes):
+        if data != self._last_properties[0]:
+            self._last_properties = (data, pickle.loads(data) if data else None)
+        return self._last_properties[1]
+
+    def _open(self) -> bool:
+        """Open the segment holding the position."""
+        bases = list_segments(self._log.directory)
+        if not bases:
+            return False
+        preceding = [base for base in bases if base <= self.position]
+        base = preceding[-1] if preceding else bases[0]
+        self._reader = SegmentReader(segment_path(self._log.directory, base), base)
+        self._byte_position = 0
+        return True
+
+    def _next_segment(self) -> bool:
+        """Move to the following segment once the current one is read entirely."""
+        following = [base for base in list_segments(self._log.directory) if base > self._reader.base]
+        if not following:
+            return False
+        # The writer has moved to a new segment, this one can't grow anymore but
+        # its last records may have been written since the previous read
+        if self._reader.read(self._byte_position) is not None:
+            return True
+        self._reader.close()
+        self._reader = SegmentReader(segment_path(self._log.directory, following[0]), following[0])
+        self._byte_position = 0
+        return True
+
+    def seek(self, offset: int):
+        """Read again from offset, the committed offset is unchanged until the next ack."""
+        self.position = offset
+        self._end_offset = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def ack(self, message: Message):
+        offset = message.id + 1
+        # Don't replay an end-of-stream that follows the last message
+        if offset == self._end_offset:
+            offset += 1
+        if offset > self.committed:
+            self._commit(offset)
+
+    def _load_committed(self) -> int:
+        try:
+            return int(self._offset_path.read_text())
+        except FileNotFoundError:
+            return 0
+
+    def _commit(self, offset: int):
+        # Replace the file, so that a crash leaves either the previous or the new offset
+        temporary_path = self._offset_path.with_suffix(".tmp")
+        temporary_path.write_text(str(offset))
+        os.replace(temporary_path, self._offset_path)
+        self.committed = offset
+
+    def close(self):
+        self._closing = True
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+import asyncio
+import logging
+import os
+
+from pathlib import Path
+from typing import List, Set, Tuple
+
+from .segment import encode_record, list_segments, scan_segment, segment_path
+
+logger = logging.getLogger(__name__)
+
+
+class Log:
+    """The append-only segments of a topic, in a directory.
+
+    The records are numbered by a sequential offset. A segment is named after the
+    offset of its first record, a new one is started when the current segment
+    exceeds segment_bytes. There must be a single writer per topic.
+    """
+
+    def __init__(self, directory: Path, segment_bytes: int, fsync: bool = False) -> None:
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.consumers_directory = directory / "consumers"
+        self.consumers_directory.mkdir(exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._file = None
+        self._segment_size = 0
+        self._next_offset: int = None
+        # Futures of the consumers of this process waiting for records
+        self._waiters: Set[asyncio.Future] = set()
+
+    @property
+    def next_offset(self) -> int:
+        if self._next_offset is not None:
+            return self._next_offset
+        bases = list_segments(self.directory)
+        if not bases:
+            return 0
+        return scan_segment(segment_path(self.directory, bases[-1]), bases[-1])[0]
+
+    def open_writer(self):
+        """Open the last segment for appending, truncating a record partially written by a crash."""
+        if self._file is not None:
+            return
+        bases = list_segments(self.directory)
+        base = bases[-1] if bases else 0
+        path = segment_path(self.directory, base)
+        if bases:
+            self._next_offset, self._segment_size = scan_segment(path, base)
+            if path.stat().st_size > self._segment_size:
+                logger.warning(f"Truncating {path} after the last valid record, offset {self._next_offset - 1}")
+                os.truncate(path, self._segment_size)
+        else:
+            self._next_offset, self._segment_size = 0, 0
+        self._file = open(path, "ab")
+
+    def append(self, records: List[Tuple[bytes, bytes, int, int]]) -> int:
+        """Append records of properties, data, timestamp and flags, return the offset of the first one."""
+        if self._segment_size >= self.segment_bytes:
+            self._roll()
+        first = offset = self._next_offset
+        chunk = []
+        for properties, data, timestamp, flags in records:
+            chunk.append(encode_record(offset, properties, data, timestamp, flags))
+            offset += 1
+        buffer = b"".join(chunk)
+        self._file.write(buffer)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._segment_size += len(buffer)
+        self._next_offset = offset
+        self._wake_waiters()
+        return first
+
+    def _roll(self):
+        self._file.close()
+        self._file = open(segment_path(self.directory, self._next_offset), "ab")
+        self._segment_size = 0
+
+    def add_waiter(self, waiter: asyncio.Future):
+        self._waiters.add(waiter)
+
+    def remove_waiter(self, waiter: asyncio.Future):
+        self._waiters.discard(waiter)
+
+    def _wake_waiters(self):
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._waiters.clear()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._next_offset = None
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+import asyncio
+import pickle
+from typing import Dict, Sequence
+
+from ..producer import Producer as ABCProducer
+from .log import Log
+from .segment import END_OF_STREAM
+
+
+class Producer(ABCProducer):
+    """A producer appending the messages to the log of the topic.
+
+    A batch is written with a single write, and is flushed to the operating system
+    before send_batch_async returns. With fsync, it is also synced to the disk.
+    """
+
+    def __init__(self, schema: object, log: Log) -> None:
+        super().__init__()
+        self.schema = schema
+        self._log = log
+        self._log.open_writer()
+
+    async def send_async(self, value, key: str = None, properties: Dict = None, timestamp: int = None) -> None:
+        await self.send_batch_async([value], key=key, properties=properties, timestamp=timestamp)
+
+    async def send_batch_async(
+        self, values: Sequence, key: str = None, properties: Dict = None, timestamp: int = None
+    ) -> None:
+        # The file stream has no partitions, the key is not used
+        if not values:
+            return
+        # The properties are shared by the batch, they are pickled once
+        encoded_properties = pickle.dumps(properties) if properties is not None else b""
+        self._log.append([(encoded_properties, self.schema.encode(value), timestamp, 0) for value in values])
+        # Yield to other tasks once per batch
+        await asyncio.sleep(0)
+
+    def close(self):
+        # Append an end-of-stream record, the consumers stop when they read it
+        self._log.append([(b"", b"", None, END_OF_STREAM)])
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import mmap
+import os
+import struct
+import zlib
+
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+# A record is a CRC32 of the rest of the record, followed by the lengths of the
+# pickled properties and of the data, the offset, the timestamp and the flags,
+# then the properties and the data
+_CRC = struct.Struct("<I")
+_HEADER = struct.Struct("<IIIqqB")
+
+# Flags of a record
+END_OF_STREAM = 1
+HAS_TIMESTAMP = 2
+
+SUFFIX = ".log"
+
+
+class Record(NamedTuple):
+    offset: int
+    properties: bytes
+    data: bytes
+    timestamp: Optional[int]
+    flags: int
+    # Number of bytes of the record in its segment
+    size: int
+
+
+def encode_record(offset: int, properties: bytes, data, timestamp: int = None, flags: int = 0) -> bytes:
+    if timestamp is not None:
+        flags |= HAS_TIMESTAMP
+    rest = _HEADER.pack(0, len(properties), len(data), offset, timestamp or 0, flags)[_CRC.size:]
+    crc = zlib.crc32(data, zlib.crc32(properties, zlib.crc32(rest)))
+    return b"".join((_CRC.pack(crc), rest, properties, data))
+
+
+def decode_record(buffer, position: int) -> Optional[Record]:
+    """Decode the record at position, None if it is incomplete or corrupted."""
+    if position + _HEADER.size > len(buffer):
+        return None
+    crc, properties_length, data_length, offset, timestamp, flags = _HEADER.unpack_from(buffer, position)
+    end = position + _HEADER.size + properties_length + data_length
+    if end > len(buffer):
+        return None
+    raw = buffer[position + _CRC.size:end]
+    if zlib.crc32(raw) != crc:
+        return None
+    start = _HEADER.size - _CRC.size
+    return Record(
+        offset,
+        raw[start:start + properties_length],
+        raw[start + properties_length:],
+        timestamp if flags & HAS_TIMESTAMP else None,
+        flags,
+        end - position,
+    )
+
+
+def segment_path(directory: Path, base: int) -> Path:
+    """Path of the segment whose first record has the offset base."""
+    return directory / f"{base:020d}{SUFFIX}"
+
+
+def list_segments(directory: Path) -> List[int]:
+    """Return the base offsets of the segments of the directory, in order."""
+    return sorted(int(path.stem) for path in directory.glob("*" + SUFFIX))
+
+
+def scan_segment(path: Path, base: int):
+    """Return the offset following the last valid record of a segment, and the size of its valid records."""
+    offset = base
+    position = 0
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return offset, position
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            record = decode_record(buffer, position)
+            while record is not None:
+                offset = record.offset + 1
+                position += record.size
+                record = decode_record(buffer, position)
+    return offset, position
+
+
+class SegmentReader:
+    """Read the records of a segment through a memory map.
+
+    The segment may still be written: the map is recreated when a read reaches its end
+    and the file has grown.
+    """
+
+    def __init__(self, path: Path, base: int) -> None:
+        self.path = path
+        self.base = base
+        self._file = open(path, "rb")
+        self._map: mmap.mmap = None
+        self._size = 0
+
+    def read(self, position: int) -> Optional[Record]:
+        record = decode_record(self._map, position) if self._map is not None else None
+        if record is None and self._remap():
+            record = decode_record(self._map, position)
+        return record
+
+    def _remap(self) -> bool:
+        size = os.fstat(self._file.fileno()).st_size
+        if size <= self._size:
+            return False
+        if self._map is not None:
+            self._map.close()
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._size = size
+        return True
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
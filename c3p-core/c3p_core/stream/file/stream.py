@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+import shutil
+from pathlib import Path
+from typing import ClassVar, Dict
+
+from ..stream import Stream as ABCStream
+from .consumer import Consumer
+from .log import Log
+from .producer import Producer
+
+
+class Stream(ABCStream):
+    """A durable stream, stored as append-only segment files in directory/topic.
+
+    The consumers commit the offset of the messages they ack, and resume from it
+    when they are created again.
+    """
+
+    # Class variable, holds the logs opened by this process
+    logs: ClassVar[Dict[Path, Log]] = {}
+
+    def __init__(
+        self,
+        topic: str,
+        schema: object,
+        directory: str,
+        segment_bytes: int = 64 << 20,
+        fsync: bool = False,
+        poll_interval: float = 0.05,
+    ) -> None:
+        """segment_bytes is the size from which a new segment is started.
+
+        With fsync, every batch sent is synced to the disk. poll_interval is the
+        period at which the consumers look for records written by other processes.
+        """
+        super().__init__()
+
+        self.topic = topic
+        self.schema = schema
+        self.poll_interval = poll_interval
+        path = (Path(directory) / topic).resolve()
+        self._log = Stream.logs.get(path)
+        if self._log is None:
+            self._log = Log(path, segment_bytes, fsync=fsync)
+            Stream.logs[path] = self._log
+        self._producer: Producer = None
+
+    def create_consumer(self, id: str) -> Consumer:
+        return Consumer(id, self.schema, self._log, poll_interval=self.poll_interval)
+
+    def create_producer(self) -> Producer:
+        if self._producer is None:
+            self._producer = Producer(self.schema, self._log)
+        return self._producer
+
+    def close(self):
+        pass
+
+    def reset(self):
+        """Delete the messages and the committed offsets of the topic."""
+        self._log.close()
+        shutil.rmtree(self._log.directory, ignore_errors=True)
+        Stream.logs.pop(self._log.directory, None)
+
+    def get_last_message_id(self) -> object:
+        next_offset = self._log.next_offset
+        return next_offset - 1 if next_offset > 0 else None
@@ -0,0 +1,5 @@
+#!/usr/bin/env python3
+
+from .stream import Stream
+from .producer import Producer
+from .consumer import Consumer
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+import asyncio
+from collections import deque
+from typing import Deque, Dict, List
+
+from ..consumer import Consumer as ABCConsumer
+from ..stub.message import Message
+
+
+class Consumer(ABCConsumer):
+    """A consumer reading from a deque filled synchronously by the producer.
+
+    A future is only created to wait when the deque is empty, or for the producer
+    to wait when it is full.
+    """
+
+    def __init__(
+        self, id: str, schema: object, consumers: Dict[str, object], capacity: int = None, capacity_bytes: int = None
+    ) -> None:
+        super().__init__()
+        self.id = id
+        self.schema = schema
+        self.capacity = capacity
+        self.capacity_bytes = capacity_bytes
+        self.size_bytes = 0
+        # Highest number of messages queued so far
+        self.high_watermark = 0
+        self._consumers = consumers
+        self._buffer: Deque[Message] = deque()
+        self._ended = False
+        self._closing = False
+        # Future of the consumer waiting for messages
+        self._waiter: asyncio.Future = None
+        # Futures of the producers waiting for room, all woken when room is made
+        self._space_waiters: List[asyncio.Future] = []
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        """Loop indefinitely until a message is received or the consumer is closed."""
+        while not self._closing:
+            if self._buffer:
+                return self._take(1)[0]
+            # The producer has sent an EOS, let's stop consuming.
+            if self._ended:
+                raise StopAsyncIteration
+            await self._wait()
+        raise StopAsyncIteration
+
+    async def getmany(self, max_records: int = None, timeout: float = None) -> List[Message]:
+        if not self._buffer and not self._ended and not self._closing:
+            try:
+                await self._wait(timeout)
+            except asyncio.TimeoutError:
+                return []
+
+        if self._closing or not self._buffer:
+            if self._closing or self._ended:
+                raise StopAsyncIteration
+            return []
+
+        count = len(self._buffer) if max_records is None else min(max_records, len(self._buffer))
+        return self._take(count)
+
+    async def _wait(self, timeout: float = None):
+        self._waiter = asyncio.get_event_loop().create_future()
+        try:
+            # Will throw a CancelledError when closing
+            await asyncio.wait_for(self._waiter, timeout)
+        finally:
+            self._waiter = None
+
+    def _take(self, count: int) -> List[Message]:
+        buffer = self._buffer
+        messages = [buffer.popleft() for _ in range(count)]
+        if self.capacity_bytes is not None:
+            self.size_bytes -= _data_size(messages)
+        if self._space_waiters and not self.is_full:
+            self._wake_space_waiters()
+        return messages
+
+    @property
+    def size(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def is_full(self) -> bool:
+        return (self.capacity is not None and len(self._buffer) >= self.capacity) or (
+            self.capacity_bytes is not None and self.size_bytes >= self.capacity_bytes
+        )
+
+    async def wait_not_full(self):
+        """Wait until the buffer is below its capacity."""
+        while self.is_full and not self._closing:
+            waiter = asyncio.get_event_loop().create_future()
+            self._space_waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._space_waiters:
+                    self._space_waiters.remove(waiter)
+
+    def _wake_space_waiters(self):
+        waiters, self._space_waiters = self._space_waiters, []
+        for waiter in waiters:
+            _wake(waiter)
+
+    def put(self, messages: List[Message]):
+        """Add messages to the buffer, regardless of its capacity."""
+        self._buffer.extend(messages)
+        if self.capacity_bytes is not None:
+            self.size_bytes += _data_size(messages)
+        if len(self._buffer) > self.high_watermark:
+            self.high_watermark = len(self._buffer)
+        if self._waiter is not None:
+            _wake(self._waiter)
+
+    def end(self):
+        """Stop the consumer once the buffered messages are consumed."""
+        self._ended = True
+        if self._waiter is not None:
+            _wake(self._waiter)
+
+    def ack(self, message: Message):
+        # There is no acking in the memory stream
+        pass
+
+    def close(self):
+        self._closing = True
+        self._consumers.pop(self.id, None)
+        if self._waiter is not None:
+            self._waiter.cancel()
+        self._wake_space_waiters()
+
+    def reset(self):
+        self._buffer.clear()
+        self._ended = False
+        self.size_bytes = 0
+        self._wake_space_waiters()
+
+
+def _data_size(messages: List[Message]) -> int:
+    return sum(len(message.data) for message in messages if isinstance(message.data, (bytes, bytearray, memoryview)))
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
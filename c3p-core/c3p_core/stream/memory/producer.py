@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import asyncio
+from typing import Dict, List, Sequence
+
+from ..producer import Producer as ABCProducer
+from ..stub.groups import ConsumerGroups
+from ..stub.message import Message, fan_out
+
+
+class Producer(ABCProducer):
+    """A producer appending the messages to the consumers' buffers without awaiting.
+
+    It yields to the event loop every yield_every messages, or when it waits for
+    room in a full consumer.
+    """
+
+    def __init__(self, schema: object, consumers: ConsumerGroups, yield_every: int = 1000) -> None:
+        super().__init__()
+        self.schema = schema
+        self.yield_every = yield_every
+        self._consumers = consumers
+        self._since_yield = 0
+        self.count = 0
+
+    def _prepare(self, value, key, partition, properties, timestamp) -> Message:
+        message = Message(
+            self.count,
+            self.schema.encode(value),
+            schema=self.schema,
+            properties=properties,
+            timestamp=timestamp,
+            key=key,
+            partition=partition,
+        )
+        self.count += 1
+        return message
+
+    async def _send(self, messages: List[Message], partition: int):
+        # The messages go to one consumer of each group, chosen by their partition
+        consumers = self._consumers.assign(partition)
+        for consumer in consumers:
+            if consumer.is_full:
+                await consumer.wait_not_full()
+                self._since_yield = 0
+        for index, consumer in enumerate(consumers):
+            consumer.put(fan_out(messages, self.schema) if index else messages)
+
+        self._since_yield += len(messages)
+        if self._since_yield >= self.yield_every:
+            self._since_yield = 0
+            await asyncio.sleep(0)
+
+    async def send_async(self, value, key: str = None, properties: Dict = None, timestamp: int = None) -> None:
+        partition = self._consumers.partition(key)
+        await self._send([self._prepare(value, key, partition, properties, timestamp)], partition)
+
+    async def send_batch_async(
+        self, values: Sequence, key: str = None, properties: Dict = None, timestamp: int = None
+    ) -> None:
+        if not values:
+            return
+        # The batch shares the key, so it goes to a single partition
+        partition = self._consumers.partition(key)
+        await self._send([self._prepare(value, key, partition, properties, timestamp) for value in values], partition)
+
+    def close(self):
+        # Unlike the stub stream, the end-of-stream is signaled synchronously
+        for consumer in self._consumers.values():
+            consumer.end()
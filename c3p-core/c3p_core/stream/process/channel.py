@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+import multiprocessing
+import os
+import struct
+
+from abc import ABCMeta, abstractmethod
+from typing import Optional
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+# Size prefix of the frames written to a channel
+FRAME_SIZE = struct.Struct("<I")
+
+# Positions in bytes written and read since the creation of a ring,
+# each one is only updated by one side
+_POSITIONS = struct.Struct("<QQ")
+_POSITION = struct.Struct("<Q")
+_WRITTEN_AT = 0
+_READ_AT = 8
+_DATA_START = 64
+
+
+class Channel(metaclass=ABCMeta):
+    """A one-way channel carrying frames from a producer process to a consumer process.
+
+    A frame starts with its size, as a FRAME_SIZE.
+    """
+
+    @abstractmethod
+    def try_write(self, frame: bytes) -> bool:
+        """Write the frame, return False without writing when there is no room for it."""
+        pass
+
+    @abstractmethod
+    def try_read(self) -> Optional[bytes]:
+        """Return the next frame, None when there is none."""
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+
+class RingChannel(Channel):
+    """A ring buffer in shared memory, with a single writer and a single reader.
+
+    The first bytes of the block hold the positions written and read. The frame is
+    copied before the write position is updated, and read before the read position
+    is updated, so no lock is needed.
+    """
+
+    def __init__(self, capacity_bytes: int) -> None:
+        if shared_memory is None:
+            raise RuntimeError("Shared memory requires Python 3.8 or later")
+        self.capacity = capacity_bytes
+        self._memory = shared_memory.SharedMemory(create=True, size=_DATA_START + capacity_bytes)
+        _POSITIONS.pack_into(self._memory.buf, 0, 0, 0)
+        self._owner = os.getpid()
+
+    def try_write(self, frame: bytes) -> bool:
+        if len(frame) > self.capacity:
+            raise ValueError(f"A frame of {len(frame)} bytes exceeds the capacity of the channel, {self.capacity} bytes")
+        written, read = _POSITIONS.unpack_from(self._memory.buf, 0)
+        if self.capacity - (written - read) < len(frame):
+            return False
+        self._copy_in(written, frame)
+        _POSITION.pack_into(self._memory.buf, _WRITTEN_AT, written + len(frame))
+        return True
+
+    def try_read(self) -> Optional[bytes]:
+        written, read = _POSITIONS.unpack_from(self._memory.buf, 0)
+        if written == read:
+            return None
+        size, = FRAME_SIZE.unpack(self._copy_out(read, FRAME_SIZE.size))
+        frame = self._copy_out(read, size)
+        _POSITION.pack_into(self._memory.buf, _READ_AT, read + size)
+        return frame
+
+    def _copy_in(self, position: int, data: bytes):
+        start = position % self.capacity
+        first = min(len(data), self.capacity - start)
+        buffer = self._memory.buf
+        buffer[_DATA_START + start:_DATA_START + start + first] = data[:first]
+        if first < len(data):
+            buffer[_DATA_START:_DATA_START + len(data) - first] = data[first:]
+
+    def _copy_out(self, position: int, size: int) -> bytes:
+        start = position % self.capacity
+        first = min(size, self.capacity - start)
+        buffer = self._memory.buf
+        data = bytes(buffer[_DATA_START + start:_DATA_START + start + first])
+        if first < size:
+            data += bytes(buffer[_DATA_START:_DATA_START + size - first])
+        return data
+
+    def close(self):
+        self._memory.close()
+        # The process that created the block releases it
+        if self._owner == os.getpid():
+            self._memory.unlink()
+
+
+class PipeChannel(Channel):
+    """A multiprocessing pipe, for the platforms without shared memory.
+
+    Writes block while the pipe is full, which holds back the producer process.
+    """
+
+    def __init__(self) -> None:
+        self._reader, self._writer = multiprocessing.Pipe(duplex=False)
+
+    def try_write(self, frame: bytes) -> bool:
+        self._writer.send_bytes(frame)
+        return True
+
+    def try_read(self) -> Optional[bytes]:
+        if not self._reader.poll():
+            return None
+        return self._reader.recv_bytes()
+
+    def close(self):
+        self._reader.close()
+        self._writer.close()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import asyncio
+from collections import deque
+from typing import Deque, List
+
+from ..consumer import Consumer as ABCConsumer
+from ..stub.message import Message
+from .channel import Channel
+from .frame import decode_frame, is_end_of_stream
+
+
+class Consumer(ABCConsumer):
+    """A consumer reading the frames of its channel, written by a producer in another process.
+
+    When the channel is empty, the consumer polls it, backing off up to poll_interval seconds.
+    """
+
+    def __init__(self, id: str, schema: object, channel: Channel, poll_interval: float = 0.005) -> None:
+        super().__init__()
+        self.id = id
+        self.schema = schema
+        self.poll_interval = poll_interval
+        self._channel = channel
+        # Messages of the frames already read but not returned yet
+        self._pending: Deque[Message] = deque()
+        self._ended = False
+        self._closing = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return (await self.getmany(max_records=1))[0]
+
+    async def getmany(self, max_records: int = None, timeout: float = None) -> List[Message]:
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        delay = 0.0001
+        while not self._pending:
+            if self._closing or self._ended:
+                raise StopAsyncIteration
+            if self._read_frame():
+                continue
+            if deadline is not None and loop.time() >= deadline:
+                return []
+            await asyncio.sleep(delay if deadline is None else min(delay, max(deadline - loop.time(), 0)))
+            delay = min(2 * delay, self.poll_interval)
+
+        # Take the frames already written without waiting
+        while max_records is None or len(self._pending) < max_records:
+            if not self._read_frame():
+                break
+
+        count = len(self._pending) if max_records is None else min(max_records, len(self._pending))
+        return [self._pending.popleft() for _ in range(count)]
+
+    def _read_frame(self) -> bool:
+        if self._ended:
+            return False
+        frame = self._channel.try_read()
+        if frame is None:
+            return False
+        if is_end_of_stream(frame):
+            self._ended = True
+            return False
+        self._pending.extend(decode_frame(frame, self.schema))
+        return True
+
+    def ack(self, message: Message):
+        # There is no acking in the process stream
+        pass
+
+    def close(self):
+        self._closing = True
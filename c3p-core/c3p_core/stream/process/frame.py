@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+import pickle
+import struct
+
+from typing import Dict, List, Sequence
+
+from ..stub.message import Message
+
+# A frame holds a batch of messages sharing their properties and timestamp: its size,
+# the flags, the number of messages, the id of the first one, the timestamp and the
+# length of the pickled properties, then the properties and the length-prefixed data
+_HEADER = struct.Struct("<IBIqqI")
+_LENGTH = struct.Struct("<I")
+
+# Flags of a frame
+END_OF_STREAM = 1
+HAS_TIMESTAMP = 2
+
+
+def encode_frame(first_id: int, datas: Sequence[bytes], properties: Dict = None, timestamp: int = None, flags: int = 0) -> bytes:
+    encoded_properties = pickle.dumps(properties) if properties is not None else b""
+    if timestamp is not None:
+        flags |= HAS_TIMESTAMP
+    parts = [b"", encoded_properties]
+    for data in datas:
+        parts.append(_LENGTH.pack(len(data)))
+        parts.append(data)
+    size = _HEADER.size + len(encoded_properties) + _LENGTH.size * len(datas) + sum(len(data) for data in datas)
+    parts[0] = _HEADER.pack(size, flags, len(datas), first_id, timestamp or 0, len(encoded_properties))
+    return b"".join(parts)
+
+
+def decode_frame(frame: bytes, schema: object) -> List[Message]:
+    """Return the messages of a frame, the data are decoded lazily by the messages."""
+    size, flags, count, first_id, timestamp, properties_length = _HEADER.unpack_from(frame, 0)
+    position = _HEADER.size
+    properties = pickle.loads(frame[position:position + properties_length]) if properties_length else None
+    position += properties_length
+    if not flags & HAS_TIMESTAMP:
+        timestamp = None
+    messages = []
+    for id in range(first_id, first_id + count):
+        length, = _LENGTH.unpack_from(frame, position)
+        position += _LENGTH.size
+        messages.append(Message(id, frame[position:position + length], schema, properties=properties, timestamp=timestamp))
+        position += length
+    return messages
+
+
+def is_end_of_stream(frame: bytes) -> bool:
+    return bool(_HEADER.unpack_from(frame, 0)[1] & END_OF_STREAM)
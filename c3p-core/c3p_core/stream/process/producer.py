@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Sequence
+
+from ..producer import Producer as ABCProducer
+from .channel import Channel
+from .frame import END_OF_STREAM, encode_frame
+
+logger = logging.getLogger(__name__)
+
+
+class Producer(ABCProducer):
+    """A producer writing each batch as one frame to the channel of every consumer.
+
+    When a channel is full, the producer polls it until the consumer makes room,
+    backing off up to poll_interval seconds.
+    """
+
+    def __init__(
+        self, schema: object, channels: List[Channel], poll_interval: float = 0.005, close_timeout: float = 10.0
+    ) -> None:
+        super().__init__()
+        self.schema = schema
+        self.poll_interval = poll_interval
+        self.close_timeout = close_timeout
+        self._channels = channels
+        self.count = 0
+
+    async def send_async(self, value, key: str = None, properties: Dict = None, timestamp: int = None) -> None:
+        await self.send_batch_async([value], key=key, properties=properties, timestamp=timestamp)
+
+    async def send_batch_async(
+        self, values: Sequence, key: str = None, properties: Dict = None, timestamp: int = None
+    ) -> None:
+        # The process stream has no partitions, the key is not used
+        if not values:
+            return
+        frame = encode_frame(self.count, [self.schema.encode(value) for value in values], properties, timestamp)
+        self.count += len(values)
+        for channel in self._channels:
+            await self._write(channel, frame)
+        # Yield to other tasks once per batch
+        await asyncio.sleep(0)
+
+    async def _write(self, channel: Channel, frame: bytes):
+        delay = 0.0001
+        while not channel.try_write(frame):
+            await asyncio.sleep(delay)
+            delay = min(2 * delay, self.poll_interval)
+
+    def close(self):
+        """Send an end-of-stream frame, waiting at most close_timeout seconds for room in the channels.
+
+        Waiting blocks, as the process of the producer is ending.
+        """
+        frame = encode_frame(self.count, [], flags=END_OF_STREAM)
+        deadline = time.monotonic() + self.close_timeout
+        for channel in self._channels:
+            while not channel.try_write(frame):
+                if time.monotonic() >= deadline:
+                    logger.warning("A consumer is not reading, the end-of-stream was not sent")
+                    return
+                time.sleep(self.poll_interval)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+from typing import Dict, Sequence
+
+from ..stream import Stream as ABCStream
+from .channel import Channel, PipeChannel, RingChannel, shared_memory
+from .consumer import Consumer
+from .producer import Producer
+
+
+class Stream(ABCStream):
+    """A stream between processes of this host, with one channel per consumer.
+
+    The consumers must be declared when the stream is created, before the processes
+    of the producer and the consumers are started: the stream is inherited by, or
+    passed to, the child processes, which create their producer or consumer from it.
+
+    The channels are ring buffers in shared memory of capacity_bytes each, or pipes
+    when transport is "pipe" or shared memory is not available.
+    """
+
+    def __init__(
+        self,
+        topic: str,
+        schema: object,
+        consumers: Sequence[str] = ("consumer",),
+        capacity_bytes: int = 16 << 20,
+        transport: str = None,
+        poll_interval: float = 0.005,
+    ) -> None:
+        super().__init__()
+
+        if transport is None:
+            transport = "shm" if shared_memory is not None else "pipe"
+        if transport not in ("shm", "pipe"):
+            raise ValueError(f"Unsupported transport: {transport}")
+        self.topic = topic
+        self.schema = schema
+        self.poll_interval = poll_interval
+        self._channels: Dict[str, Channel] = {
+            id: RingChannel(capacity_bytes) if transport == "shm" else PipeChannel() for id in consumers
+        }
+        self._producer: Producer = None
+
+    def create_consumer(self, id: str) -> Consumer:
+        channel = self._channels.get(id)
+        if channel is None:
+            raise ValueError(f"Consumer {id} was not declared on topic {self.topic}")
+        return Consumer(id, self.schema, channel, poll_interval=self.poll_interval)
+
+    def create_producer(self) -> Producer:
+        if self._producer is None:
+            self._producer = Producer(self.schema, list(self._channels.values()), poll_interval=self.poll_interval)
+        return self._producer
+
+    def close(self):
+        """Release the channels, the shared memory is freed by the process that created the stream."""
+        for channel in self._channels.values():
+            channel.close()
+
+    def reset(self):
+        self.close()
+
+    def get_last_message_id(self) -> object:
+        # Only known in the process of the producer
+        if self._producer is None or self._producer.count == 0:
+            return None
+        return self._producer.count - 1
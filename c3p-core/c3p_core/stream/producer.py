@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
 from abc import ABCMeta, abstractmethod
-from typing import Dict
+from typing import Dict, Sequence
 
 
 class Producer(metaclass=ABCMeta):
@@ -15,6 +15,11 @@ class Producer(metaclass=ABCMeta):
     async def send_async(self, value, key: str = None, properties: Dict = None, timestamp: int = None) -> None:
         pass
 
+    @abstractmethod
+    async def send_batch_async(self, values: Sequence, key: str = None, properties: Dict = None, timestamp: int = None) -> None:
+        '''Send all the values as one batch, sharing the same key, properties and timestamp.'''
+        pass
+
     @abstractmethod
     def close(self):
         pass
@@ -1,3 +1,5 @@
 #!/usr/bin/env python3
 
 from .pickleschema import PickleSchema
+from .structschema import StructSchema
+from .passthroughschema import PassthroughSchema
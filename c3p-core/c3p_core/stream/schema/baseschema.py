@@ -1,9 +1,17 @@
 #!/usr/bin/env python3
 
+import struct
+
 from abc import ABCMeta, abstractmethod
+from typing import List
+
+_LENGTH = struct.Struct("<I")
 
 
 class BaseSchema(metaclass=ABCMeta):
+    # Whether each consumer of a stream must receive its own copy of the encoded data, see copy
+    copy_on_fan_out = False
+
     def __init__(self, record_cls):
         self._record_cls = record_cls
 
@@ -15,6 +23,34 @@ class BaseSchema(metaclass=ABCMeta):
     def decode(self, data):
         pass
 
+    def encode_batch(self, objs) -> bytes:
+        """Encode the objects into a single buffer.
+
+        By default, the encoded objects are concatenated with a length prefix.
+        """
+        parts = []
+        for obj in objs:
+            data = self.encode(obj)
+            parts.append(_LENGTH.pack(len(data)))
+            parts.append(data)
+        return b"".join(parts)
+
+    def decode_batch(self, data) -> List:
+        """Decode a buffer created by encode_batch."""
+        buffer = memoryview(data)
+        objs = []
+        offset = 0
+        while offset < len(buffer):
+            length, = _LENGTH.unpack_from(buffer, offset)
+            offset += _LENGTH.size
+            objs.append(self.decode(buffer[offset:offset + length]))
+            offset += length
+        return objs
+
+    def copy(self, data):
+        """Return a copy of encoded data for another consumer, when copy_on_fan_out is set."""
+        return data
+
     def _validate_object_type(self, obj):
         if not isinstance(obj, self._record_cls):
             raise TypeError('Invalid record obj of type ' + str(type(obj))
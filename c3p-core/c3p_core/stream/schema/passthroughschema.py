@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+import copy
+
+from .baseschema import BaseSchema
+
+
+class PassthroughSchema(BaseSchema):
+    """A schema handing the objects through unchanged, for in-process streams.
+
+    The objects are type checked but not serialized. The consumers of a stream share
+    the same object unless copy_on_fan_out is set, in which case every consumer but
+    the first receives a deep copy. The data of the messages is not bytes, so it
+    doesn't count in the byte capacity of the stream consumers.
+    """
+
+    def __init__(self, record_cls, copy_on_fan_out: bool = False) -> None:
+        super().__init__(record_cls)
+        self.copy_on_fan_out = copy_on_fan_out
+
+    def encode(self, obj):
+        if obj is not None:
+            self._validate_object_type(obj)
+        return obj
+
+    def decode(self, data):
+        return data
+
+    def copy(self, data):
+        return copy.deepcopy(data)
+
+    def encode_batch(self, objs):
+        for obj in objs:
+            if obj is not None:
+                self._validate_object_type(obj)
+        return list(objs)
+
+    def decode_batch(self, data):
+        return list(data)
@@ -18,3 +18,12 @@ class PickleSchema(BaseSchema):
 
     def decode(self, data):
         return pickle.loads(data)
+
+    def encode_batch(self, objs) -> bytes:
+        for obj in objs:
+            if obj is not None:
+                self._validate_object_type(obj)
+        return pickle.dumps(list(objs), protocol=pickle.HIGHEST_PROTOCOL)
+
+    def decode_batch(self, data):
+        return pickle.loads(data)
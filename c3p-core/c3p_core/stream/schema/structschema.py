@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+import dataclasses
+import pickle
+import struct
+import typing
+
+from datetime import datetime
+from enum import Enum
+from operator import attrgetter
+from typing import List, Tuple
+
+from .baseschema import BaseSchema
+
+# Struct codes of the fixed size field types
+FIXED_CODES = {
+    bool: "?",
+    int: "q",
+    float: "d",
+}
+
+_LENGTH = struct.Struct("<I")
+_TAG = struct.Struct("<B")
+
+# Tags of the values of fields without a fixed binary layout
+TAG_STR = 0
+TAG_INT = 1
+TAG_FLOAT = 2
+TAG_DATETIME = 3
+TAG_PICKLE = 4
+
+
+class StructSchema(BaseSchema):
+    """A compact binary schema for dataclass records, built on the struct module.
+
+    The layout is derived once from the type hints of the dataclass fields:
+    bool, int and float fields are packed in a fixed size block, Enum fields are
+    packed as the index of their member, str fields are length-prefixed UTF-8 and
+    the other fields are tagged with the type of their value. A bitmap records
+    which fields are None. No class or field name is repeated in the messages.
+    """
+
+    def __init__(self, record_cls) -> None:
+        super().__init__(record_cls)
+        if not dataclasses.is_dataclass(record_cls):
+            raise TypeError(f"StructSchema requires a dataclass, not {record_cls}")
+
+        types = typing.get_type_hints(record_cls)
+        fields = [field for field in dataclasses.fields(record_cls) if field.init]
+        self._getter = attrgetter(*[field.name for field in fields])
+        self._field_count = len(fields)
+        self._bitmap = struct.Struct(f"<{(len(fields) + 7) // 8}s")
+
+        # For each field, either ("fixed", default) or ("enum", members) or ("str", None) or ("any", None)
+        self._kinds: List[Tuple[str, object]] = []
+        fixed_codes = []
+        for field in fields:
+            field_type = types.get(field.name)
+            if field_type in FIXED_CODES:
+                fixed_codes.append(FIXED_CODES[field_type])
+                self._kinds.append(("fixed", field_type()))
+            elif isinstance(field_type, type) and issubclass(field_type, Enum):
+                fixed_codes.append("H")
+                self._kinds.append(("enum", list(field_type)))
+            elif field_type is str:
+                self._kinds.append(("str", None))
+            else:
+                self._kinds.append(("any", None))
+        self._fixed = struct.Struct("<" + "".join(fixed_codes))
+
+    def encode(self, obj):
+        if obj is None:
+            return b""
+        self._validate_object_type(obj)
+        return self._encode(obj)
+
+    def decode(self, data):
+        if not data:
+            return None
+        return self._decode_from(memoryview(data), 0)[0]
+
+    def encode_batch(self, objs) -> bytes:
+        parts = [_LENGTH.pack(len(objs))]
+        for obj in objs:
+            self._validate_object_type(obj)
+            parts.append(self._encode(obj))
+        return b"".join(parts)
+
+    def decode_batch(self, data) -> List:
+        buffer = memoryview(data)
+        count, = _LENGTH.unpack_from(buffer, 0)
+        offset = _LENGTH.size
+        objs = []
+        for _ in range(count):
+            obj, offset = self._decode_from(buffer, offset)
+            objs.append(obj)
+        return objs
+
+    def _encode(self, obj) -> bytes:
+        values = self._getter(obj)
+        if self._field_count == 1:
+            values = (values,)
+
+        nulls = 0
+        fixed_values = []
+        variable_parts = []
+        for index, ((kind, info), value) in enumerate(zip(self._kinds, values)):
+            if value is None:
+                nulls |= 1 << index
+                if kind == "fixed":
+                    fixed_values.append(info)
+                elif kind == "enum":
+                    fixed_values.append(0)
+            elif kind == "fixed":
+                fixed_values.append(value)
+            elif kind == "enum":
+                fixed_values.append(info.index(value))
+            elif kind == "str":
+                encoded = value.encode()
+                variable_parts.append(_LENGTH.pack(len(encoded)))
+                variable_parts.append(encoded)
+            else:
+                variable_parts.append(_encode_any(value))
+
+        return b"".join(
+            [self._bitmap.pack(nulls.to_bytes(self._bitmap.size, "little")), self._fixed.pack(*fixed_values)] + variable_parts
+        )
+
+    def _decode_from(self, buffer: memoryview, offset: int):
+        nulls = int.from_bytes(self._bitmap.unpack_from(buffer, offset)[0], "little")
+        offset += self._bitmap.size
+        fixed_values = iter(self._fixed.unpack_from(buffer, offset))
+        offset += self._fixed.size
+
+        values = []
+        for index, (kind, info) in enumerate(self._kinds):
+            is_null = nulls >> index & 1
+            if kind == "fixed":
+                value = next(fixed_values)
+            elif kind == "enum":
+                value = info[next(fixed_values)]
+            elif is_null:
+                value = None
+            elif kind == "str":
+                length, = _LENGTH.unpack_from(buffer, offset)
+                offset += _LENGTH.size
+                value = str(buffer[offset:offset + length], "utf-8")
+                offset += length
+            else:
+                value, offset = _decode_any(buffer, offset)
+            values.append(None if is_null else value)
+
+        return self._record_cls(*values), offset
+
+
+def _encode_any(value) -> bytes:
+    if isinstance(value, str):
+        tag, payload = TAG_STR, value.encode()
+    elif isinstance(value, bool):
+        tag, payload = TAG_PICKLE, pickle.dumps(value)
+    elif isinstance(value, int):
+        tag, payload = TAG_INT, str(value).encode()
+    elif isinstance(value, float):
+        tag, payload = TAG_FLOAT, struct.pack("<d", value)
+    elif type(value) is datetime:
+        tag, payload = TAG_DATETIME, value.isoformat().encode()
+    else:
+        tag, payload = TAG_PICKLE, pickle.dumps(value)
+    return _TAG.pack(tag) + _LENGTH.pack(len(payload)) + payload
+
+
+def _decode_any(buffer: memoryview, offset: int):
+    tag, = _TAG.unpack_from(buffer, offset)
+    length, = _LENGTH.unpack_from(buffer, offset + _TAG.size)
+    offset += _TAG.size + _LENGTH.size
+    payload = buffer[offset:offset + length]
+    offset += length
+    if tag == TAG_STR:
+        return str(payload, "utf-8"), offset
+    if tag == TAG_INT:
+        return int(str(payload, "ascii")), offset
+    if tag == TAG_FLOAT:
+        return struct.unpack("<d", payload)[0], offset
+    if tag == TAG_DATETIME:
+        return datetime.fromisoformat(str(payload, "ascii")), offset
+    return pickle.loads(payload), offset
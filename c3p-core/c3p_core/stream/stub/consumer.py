@@ -2,16 +2,40 @@
 
 import asyncio
 from asyncio.queues import QueueEmpty
-from typing import Dict
+from collections import deque
+from typing import Deque, Dict, List
 
 from ..consumer import Consumer as ABCConsumer
 from .message import Message
 
 
+def _data_size(message: Message) -> int:
+    data = message.data
+    return len(data) if isinstance(data, (bytes, bytearray, memoryview)) else 0
+
+
 class Consumer(ABCConsumer):
-    def __init__(self, id: str, schema: object, consumers: Dict[str, object]) -> None:
+    def __init__(
+        self, id: str, schema: object, consumers: Dict[str, object], capacity: int = None, capacity_bytes: int = None
+    ) -> None:
         super().__init__()
+        # Bounds of the queued messages, the producer waits until there is room
+        self.capacity = capacity
+        self.capacity_bytes = capacity_bytes
+        self.size = 0
+        self.size_bytes = 0
+        # Highest number of messages and bytes queued so far
+        self.high_watermark = 0
+        self.high_watermark_bytes = 0
+        # Number of times a producer had to wait for room in the queue
+        self.full_count = 0
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        # Each queue item is a list of messages sent together, or None for end-of-stream
         self._queue = asyncio.Queue()
+        # Messages of the batches already taken from the queue but not returned yet
+        self._pending: Deque[Message] = deque()
+        self._ended = False
         self.id = id
         self.schema = schema
         self._consumers = consumers
@@ -24,18 +48,91 @@ class Consumer(ABCConsumer):
     async def __anext__(self):
         """Loop indefinitely until a message is received or the consumer is closed."""
         while not self._closing:
-            self._receive_task = asyncio.Task(self._queue.get())
-            # Will throw a CancelledError when closing
-            message: Message = await self._receive_task
-            self._receive_task = None
+            if self._pending:
+                return self._take(1)[0]
             # The producer has sent an EOS, let's stop consuming.
-            if message is None:
+            if self._ended:
                 raise StopAsyncIteration
-            return message
+            await self._receive()
         raise StopAsyncIteration
 
+    async def getmany(self, max_records: int = None, timeout: float = None) -> List[Message]:
+        if not self._pending and not self._ended and not self._closing:
+            await self._receive(timeout)
+
+        # Take the batches already queued without waiting
+        while not self._ended and (max_records is None or len(self._pending) < max_records):
+            try:
+                self._add_batch(self._queue.get_nowait())
+            except QueueEmpty:
+                break
+
+        if self._closing or not self._pending:
+            if self._closing or self._ended:
+                raise StopAsyncIteration
+            return []
+
+        count = len(self._pending) if max_records is None else min(max_records, len(self._pending))
+        return self._take(count)
+
+    def _take(self, count: int) -> List[Message]:
+        messages = [self._pending.popleft() for _ in range(count)]
+        self.size -= count
+        if self.capacity_bytes is not None:
+            self.size_bytes -= sum(_data_size(message) for message in messages)
+        if not self.is_full:
+            self._not_full.set()
+        return messages
+
+    @property
+    def is_full(self) -> bool:
+        return (self.capacity is not None and self.size >= self.capacity) or (
+            self.capacity_bytes is not None and self.size_bytes >= self.capacity_bytes
+        )
+
+    async def wait_not_full(self):
+        """Wait until the queue is below its capacity."""
+        if self.is_full:
+            self.full_count += 1
+        while self.is_full and not self._closing:
+            self._not_full.clear()
+            await self._not_full.wait()
+
+    async def _receive(self, timeout: float = None):
+        """Wait for the next batch, at most timeout seconds, and add its messages to the pending ones."""
+        self._receive_task = asyncio.ensure_future(self._queue.get())
+        try:
+            # Will throw a CancelledError when closing
+            batch = await asyncio.wait_for(self._receive_task, timeout)
+        except asyncio.TimeoutError:
+            return
+        finally:
+            self._receive_task = None
+        self._add_batch(batch)
+
+    def _add_batch(self, batch: List[Message]):
+        if batch is None:
+            self._ended = True
+        else:
+            self._pending.extend(batch)
+
     async def enqueue_async(self, message: Message):
-        await self._queue.put(message)
+        if message is None:
+            # The end-of-stream is never blocked
+            await self._queue.put(None)
+        else:
+            await self.enqueue_batch_async([message])
+
+    async def enqueue_batch_async(self, messages: List[Message]):
+        # A batch is accepted while the queue is below capacity: the queue holds
+        # at most capacity messages plus one batch.
+        await self.wait_not_full()
+        self.size += len(messages)
+        self.high_watermark = max(self.high_watermark, self.size)
+        if self.capacity_bytes is not None:
+            self.size_bytes += sum(_data_size(message) for message in messages)
+            self.high_watermark_bytes = max(self.high_watermark_bytes, self.size_bytes)
+        await self._queue.put(messages)
 
     def ack(self, message: Message):
         # There is no acking in the stub stream
@@ -44,10 +141,17 @@ class Consumer(ABCConsumer):
     def close(self):
         self._closing = True
         del self._consumers[self.id]
+        # Release a producer waiting for room
+        self._not_full.set()
         if self._receive_task is not None:
             self._receive_task.cancel()
 
     def reset(self):
+        self._pending.clear()
+        self._ended = False
+        self.size = 0
+        self.size_bytes = 0
+        self._not_full.set()
         # Queue has no clear method :(
         try:
             while True:
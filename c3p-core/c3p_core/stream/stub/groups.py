@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+import zlib
+from typing import Dict, List
+
+
+class ConsumerGroups(dict):
+    """The consumers of a topic by id, and the groups they are members of.
+
+    Every group receives each message. Within a group, the partitions of the topic
+    are split among the members: partition p goes to member p modulo the number of
+    members, so a partition is consumed by a single member, in order. The messages
+    already queued for a member stay with it when members join or leave.
+    """
+
+    def __init__(self, partitions: int = 1) -> None:
+        super().__init__()
+        if partitions < 1:
+            raise ValueError(f"Invalid number of partitions: {partitions}")
+        self.partitions = partitions
+        self._groups: Dict[str, List] = {}
+        self._next_partition = 0
+
+    def add(self, consumer, group: str = None):
+        """Add a consumer to a group, by default a group of its own."""
+        self[consumer.id] = consumer
+        self._groups.setdefault(group if group is not None else consumer.id, []).append(consumer)
+
+    def __delitem__(self, id: str):
+        consumer = self[id]
+        super().__delitem__(id)
+        for name, members in list(self._groups.items()):
+            if consumer in members:
+                members.remove(consumer)
+                if not members:
+                    del self._groups[name]
+
+    def pop(self, id: str, *default):
+        if id not in self:
+            if default:
+                return default[0]
+            raise KeyError(id)
+        consumer = self[id]
+        del self[id]
+        return consumer
+
+    def partition(self, key: str = None) -> int:
+        """Return the partition of a key. Without key, the partitions are used in turn."""
+        if key is None:
+            partition = self._next_partition
+            self._next_partition = (partition + 1) % self.partitions
+            return partition
+        # A stable hash, unlike hash() which changes with the process
+        return zlib.crc32(str(key).encode()) % self.partitions
+
+    def assign(self, partition: int) -> List:
+        """Return the member of each group consuming the partition."""
+        return [members[partition % len(members)] for members in self._groups.values()]
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from typing import Dict
+from typing import Dict, List
 from ..message import Message as ABCMessage
 
 
@@ -12,6 +12,8 @@ class Message(ABCMessage):
         schema: object,
         properties: Dict = None,
         timestamp: int = None,
+        key: str = None,
+        partition: int = 0,
     ) -> None:
         self._id = id
         self._data = data
@@ -19,6 +21,8 @@ class Message(ABCMessage):
         self._value = None
         self._properties = properties
         self._timestamp = timestamp
+        self.key = key
+        self.partition = partition
 
     @property
     def id(self) -> object:
@@ -45,3 +49,24 @@ class Message(ABCMessage):
 
     def __str__(self) -> str:
         return str(self._id)
+
+
+def fan_out(messages: List[Message], schema: object) -> List[Message]:
+    """Return the messages to hand to an additional consumer.
+
+    They are the same messages unless the schema copies the data for each consumer.
+    """
+    if not schema.copy_on_fan_out:
+        return messages
+    return [
+        Message(
+            message.id,
+            schema.copy(message.data),
+            schema,
+            properties=message.properties,
+            timestamp=message.timestamp,
+            key=message.key,
+            partition=message.partition,
+        )
+        for message in messages
+    ]
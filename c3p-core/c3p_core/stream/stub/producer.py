@@ -1,22 +1,22 @@
 #!/usr/bin/env python3
 
 import asyncio
-from typing import Dict, Tuple
+from typing import Dict, Sequence
 
 from ..producer import Producer as ABCProducer
-from .consumer import Consumer
-from .message import Message
+from .groups import ConsumerGroups
+from .message import Message, fan_out
 
 
 class Producer(ABCProducer):
-    def __init__(self, schema: object, consumers: Dict[str, Consumer]) -> None:
+    def __init__(self, schema: object, consumers: ConsumerGroups) -> None:
         super().__init__()
         self._loop = asyncio.get_event_loop()
         self.schema = schema
         self._consumers = consumers
         self.count = 0
 
-    def _prepare(self, value, properties, timestamp) -> Tuple[Message, str]:
+    def _prepare(self, value, key, partition, properties, timestamp) -> Message:
         data = self.schema.encode(value)
         message = Message(
             self.count,
@@ -24,14 +24,18 @@ class Producer(ABCProducer):
             schema=self.schema,
             properties=properties,
             timestamp=timestamp,
+            key=key,
+            partition=partition,
         )
         self.count += 1
         return message
 
-    async def send_async(self, value, properties: Dict = None, timestamp: int = None) -> None:
-        message = self._prepare(value, properties=properties, timestamp=timestamp)
-        for consumer in self._consumers.values():
-            await consumer.enqueue_async(message)
+    async def send_async(self, value, key: str = None, properties: Dict = None, timestamp: int = None) -> None:
+        # The message goes to one consumer of each group, chosen by the partition of its key
+        partition = self._consumers.partition(key)
+        message = self._prepare(value, key, partition, properties=properties, timestamp=timestamp)
+        for index, consumer in enumerate(self._consumers.assign(partition)):
+            await consumer.enqueue_async(fan_out([message], self.schema)[0] if index else message)
         # Yield to other tasks
         # When you use await asyncio.sleep(0),
         # you are essentially introducing a very short delay of zero seconds.
@@ -42,6 +46,19 @@ class Producer(ABCProducer):
         # from monopolizing the event loop and improve responsiveness in situations where tasks are competing for execution time.
         await asyncio.sleep(0)
 
+    async def send_batch_async(
+        self, values: Sequence, key: str = None, properties: Dict = None, timestamp: int = None
+    ) -> None:
+        if not values:
+            return
+        # The batch shares the key, so it goes to a single partition
+        partition = self._consumers.partition(key)
+        messages = [self._prepare(value, key, partition, properties=properties, timestamp=timestamp) for value in values]
+        for index, consumer in enumerate(self._consumers.assign(partition)):
+            await consumer.enqueue_batch_async(fan_out(messages, self.schema) if index else messages)
+        # Yield to other tasks once per batch instead of once per message
+        await asyncio.sleep(0)
+
     def close(self):
         # Send an empty message as an end-of-stream signal.
         # Issue: If the consumer starts after the producer has closed, it won't return.
@@ -5,31 +5,55 @@ from typing import ClassVar, Dict, Tuple
 from ..stream import Stream as ABCStream
 from .producer import Producer
 from .consumer import Consumer
+from .groups import ConsumerGroups
 
 
 class Stream(ABCStream):
 
     # Class variable, holds all the topics created and their producer/consumers
-    topics:ClassVar[Dict[str, Tuple[Producer, Dict[str, Consumer]]]] = {}
+    topics:ClassVar[Dict[str, Tuple[Producer, ConsumerGroups]]] = {}
 
-    def __init__(self, topic: str, schema: object) -> None:
+    def __init__(
+        self, topic: str, schema: object, capacity: int = None, capacity_bytes: int = None, partitions: int = 1
+    ) -> None:
+        """capacity and capacity_bytes are the default bounds of the consumers' queues, see create_consumer.
+
+        The messages are split in partitions by their key, see ConsumerGroups. The number
+        of partitions is set by the first stream created on the topic.
+        """
         super().__init__()
 
         self.topic = topic
         self.schema = schema
+        self.capacity = capacity
+        self.capacity_bytes = capacity_bytes
         endpoints = Stream.topics.get(topic)
         if endpoints is None:
-            self._consumers:Dict[str, Consumer] = {}
+            self._consumers = ConsumerGroups(partitions)
             self._producer = Producer(self.schema, self._consumers)
             Stream.topics[topic] = (self._producer, self._consumers)
         else:
             self._producer, self._consumers = endpoints
 
-    def create_consumer(self, id:str) -> Consumer:
+    def create_consumer(self, id:str, capacity: int = None, capacity_bytes: int = None, group: str = None) -> Consumer:
+        """Return the consumer with this id, creating it if needed.
+
+        A new consumer queues at most capacity messages or capacity_bytes bytes of encoded
+        data, the producer blocks until there is room. None means unbounded.
+
+        The members of a group share the partitions of the topic. By default, a consumer
+        is the only member of its group and receives all the messages.
+        """
         consumer = self._consumers.get(id)
         if consumer is None:
-            consumer = Consumer(id, self.schema, self._consumers)
-            self._consumers[id] = consumer
+            consumer = Consumer(
+                id,
+                self.schema,
+                self._consumers,
+                capacity=capacity if capacity is not None else self.capacity,
+                capacity_bytes=capacity_bytes if capacity_bytes is not None else self.capacity_bytes,
+            )
+            self._consumers.add(consumer, group)
         return consumer
 
     def create_producer(self) -> Producer:
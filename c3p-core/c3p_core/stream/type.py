@@ -6,6 +6,9 @@ class Type(Enum):
 
     NONE = auto()
     STUB = auto()
+    MEMORY = auto()
+    FILE = auto()
+    PROCESS = auto()
 
     def __str__(self):
         return self.name
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+
+from pathlib import Path
+import tempfile
+import unittest
+
+from c3p_core import service
+
+
+class TestConfiguration(unittest.TestCase):
+    def test_get_setting(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            config_file = Path(tmp_dir) / "test.yml"
+            config_file.write_text("crisp:\n  batch_size: 10\n  loader:\n    flush: false\n")
+            service.load_configuration(config_file)
+
+        self.assertEqual(10, service.get_setting("crisp.batch_size"))
+        self.assertEqual(False, service.get_setting("crisp.loader.flush", True))
+        self.assertEqual(5, service.get_setting("crisp.missing", 5))
+        self.assertIsNone(service.get_setting("crisp.batch_size.missing"))
+        self.assertIsNone(service.get_setting("other.batch_size"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import asyncio
+import unittest
+
+from c3p_core.stream import Type, create_stream
+from c3p_core.stream.schema import PassthroughSchema
+
+
+TOPIC = "MyPassthroughTopic"
+
+
+class TestPassthroughSchema(unittest.TestCase):
+    def test_encode_decode(self):
+        schema = PassthroughSchema(dict)
+        row = {"a": 1}
+        self.assertIs(row, schema.decode(schema.encode(row)))
+        self.assertIsNone(schema.encode(None))
+        with self.assertRaises(TypeError):
+            schema.encode("not a dict")
+        with self.assertRaises(TypeError):
+            schema.encode_batch([row, "not a dict"])
+
+    def check_fan_out(self, stream_type):
+        loop = asyncio.get_event_loop()
+        for copy_on_fan_out in (False, True):
+            with self.subTest(stream_type=stream_type, copy_on_fan_out=copy_on_fan_out):
+                stream = create_stream(stream_type, TOPIC, PassthroughSchema(dict, copy_on_fan_out=copy_on_fan_out))
+                stream.reset()
+                stream = create_stream(stream_type, TOPIC, PassthroughSchema(dict, copy_on_fan_out=copy_on_fan_out))
+                consumers = [stream.create_consumer("A"), stream.create_consumer("B")]
+                row = {"a": 1}
+                loop.run_until_complete(stream.create_producer().send_batch_async([row]))
+
+                values = [loop.run_until_complete(consumer.getmany())[0].value for consumer in consumers]
+                self.assertIs(row, values[0])
+                self.assertEqual(row, values[1])
+                self.assertEqual(not copy_on_fan_out, values[0] is values[1])
+                stream.reset()
+
+    def test_fan_out(self):
+        self.check_fan_out(Type.STUB)
+        self.check_fan_out(Type.MEMORY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import asyncio
+import tempfile
+import unittest
+
+from c3p_core.stream import Type, create_stream
+from c3p_core.stream.schema import PickleSchema
+from c3p_core.stream.file.segment import list_segments, segment_path
+import c3p_core.stream.file as fstream
+
+
+TOPIC = "MyFileTopic"
+
+PAYLOAD_FORMAT = "This is message %d"
+
+
+async def consume_all(consumer, max_records=None, ack=True):
+    values = []
+    try:
+        while True:
+            messages = await consumer.getmany(max_records, timeout=1)
+            values.extend(message.value for message in messages)
+            if ack and messages:
+                consumer.ack(messages[-1])
+    except StopAsyncIteration:
+        return values
+
+
+class TestFileStream(unittest.TestCase):
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = self._directory.name
+        self.loop = asyncio.get_event_loop()
+
+    def tearDown(self):
+        fstream.Stream(TOPIC, PickleSchema(str), self.directory).reset()
+        self._directory.cleanup()
+
+    def create_stream(self, **options):
+        return fstream.Stream(TOPIC, PickleSchema(str), self.directory, **options)
+
+    def produce(self, stream, values, batch_size=10, close=True):
+        producer = stream.create_producer()
+
+        async def produce():
+            for start in range(0, len(values), batch_size):
+                await producer.send_batch_async(values[start:start + batch_size], properties={"type": "update"})
+            if close:
+                producer.close()
+
+        return produce()
+
+    def test_create_stream(self):
+        stream = create_stream(Type.FILE, TOPIC, PickleSchema(str), directory=self.directory)
+        self.assertIsInstance(stream, fstream.Stream)
+
+    def test_multiple_consumers(self):
+        num = 250
+        expected = [PAYLOAD_FORMAT % i for i in range(num)]
+        # Small segments, so that the consumers read across several of them
+        stream = self.create_stream(segment_bytes=1000)
+        consumers = [stream.create_consumer("A"), stream.create_consumer("B")]
+
+        results = self.loop.run_until_complete(
+            asyncio.gather(self.produce(stream, expected), consume_all(consumers[0], 7), consume_all(consumers[1]))
+        )
+        self.assertEqual([expected, expected], results[1:])
+        self.assertGreater(len(list_segments(stream._log.directory)), 1)
+        # The end-of-stream record follows the last message
+        self.assertEqual(num, stream.get_last_message_id())
+
+    def test_resume_from_last_ack(self):
+        num = 100
+        expected = [PAYLOAD_FORMAT % i for i in range(num)]
+        stream = self.create_stream()
+        self.loop.run_until_complete(self.produce(stream, expected))
+
+        async def consume_and_fail():
+            with stream.create_consumer("F") as consumer:
+                messages = await consumer.getmany(max_records=30)
+                consumer.ack(messages[19])
+                # Fails before acking the other messages
+
+        self.loop.run_until_complete(consume_and_fail())
+
+        # The consumer resumes after the last message acked, in this process or another one
+        fstream.Stream.logs.clear()
+        consumer = self.create_stream().create_consumer("F")
+        self.assertEqual(20, consumer.committed)
+        self.assertEqual(expected[20:], self.loop.run_until_complete(consume_all(consumer)))
+        # Everything was acked, the consumer waits for the messages of the next producer
+        consumer = self.create_stream().create_consumer("F")
+        self.assertEqual(num + 1, consumer.committed)
+        self.assertEqual([], self.loop.run_until_complete(consumer.getmany(timeout=0.01)))
+
+    def test_replay(self):
+        expected = [PAYLOAD_FORMAT % i for i in range(20)]
+        stream = self.create_stream()
+        self.loop.run_until_complete(self.produce(stream, expected))
+        consumer = stream.create_consumer("R")
+        self.assertEqual(expected, self.loop.run_until_complete(consume_all(consumer)))
+
+        consumer.seek(15)
+        self.assertEqual(expected[15:], self.loop.run_until_complete(consume_all(consumer, ack=False)))
+
+    def test_getmany_timeout(self):
+        stream = self.create_stream()
+        consumer = stream.create_consumer("T")
+        self.assertEqual([], self.loop.run_until_complete(consumer.getmany(timeout=0.01)))
+
+        self.loop.run_until_complete(self.produce(stream, ["a", "b"], close=False))
+        messages = self.loop.run_until_complete(consumer.getmany(timeout=0.01))
+        self.assertEqual(["a", "b"], [message.value for message in messages])
+        self.assertEqual([0, 1], [message.id for message in messages])
+        self.assertEqual({"type": "update"}, messages[0].properties)
+
+    def test_recover_partial_record(self):
+        stream = self.create_stream()
+        self.loop.run_until_complete(self.produce(stream, ["a", "b"], close=False))
+        path = segment_path(stream._log.directory, 0)
+        stream._log.close()
+        # A crash in the middle of a write
+        with open(path, "ab") as f:
+            f.write(b"\x01\x02\x03")
+
+        fstream.Stream.logs.clear()
+        stream = self.create_stream()
+        self.assertEqual(1, stream.get_last_message_id())
+        self.loop.run_until_complete(self.produce(stream, ["c"]))
+        consumer = stream.create_consumer("P")
+        self.assertEqual(["a", "b", "c"], self.loop.run_until_complete(consume_all(consumer)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+import asyncio
+import unittest
+
+from c3p_core.stream import Type, create_stream
+from c3p_core.stream.schema import PickleSchema
+from c3p_core.stream.stub.groups import ConsumerGroups
+
+
+TOPIC = "MyPartitionedTopic"
+
+
+async def consume_all(consumer):
+    messages = []
+    try:
+        while True:
+            messages.extend(await consumer.getmany(timeout=1))
+    except StopAsyncIteration:
+        return messages
+
+
+class TestConsumerGroups(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+
+    def test_partition(self):
+        groups = ConsumerGroups(partitions=4)
+        self.assertEqual(groups.partition("key"), groups.partition("key"))
+        # Without key, the partitions are used in turn
+        self.assertEqual([0, 1, 2, 3, 0], [groups.partition() for _ in range(5)])
+        with self.assertRaises(ValueError):
+            ConsumerGroups(partitions=0)
+
+    def test_groups(self):
+        for stream_type in (Type.STUB, Type.MEMORY):
+            with self.subTest(stream_type=stream_type):
+                stream = create_stream(stream_type, TOPIC, PickleSchema(str), partitions=4)
+                try:
+                    self.check_groups(stream)
+                finally:
+                    stream.reset()
+
+    def check_groups(self, stream):
+        replicas = [stream.create_consumer(f"replica{i}", group="replicas") for i in range(2)]
+        auditor = stream.create_consumer("auditor")
+        producer = stream.create_producer()
+        keys = [f"order{i}" for i in range(20)]
+
+        async def produce():
+            for i in range(10):
+                for key in keys:
+                    await producer.send_async(f"{key} {i}", key=key)
+            await producer.send_batch_async(["a", "b"])
+            producer.close()
+
+        results = self.loop.run_until_complete(asyncio.gather(produce(), *(consume_all(c) for c in replicas + [auditor])))
+        replica_messages, auditor_messages = results[1:3], results[3]
+
+        # The group receives every message once, the other consumer receives them all
+        self.assertEqual(202, len(auditor_messages))
+        self.assertEqual(
+            sorted(message.value for message in auditor_messages),
+            sorted(message.value for messages in replica_messages for message in messages),
+        )
+        for index, messages in enumerate(replica_messages):
+            self.assertTrue(messages)
+            for message in messages:
+                # Each replica consumes its own partitions, the messages of a key stay in order
+                self.assertEqual(index, message.partition % 2)
+            for key in keys:
+                values = [message.value for message in messages if message.key == key]
+                self.assertIn(len(values), (0, 10))
+                self.assertEqual([f"{key} {i}" for i in range(len(values))], values)
+
+
+if __name__ == "__main__":
+    unittest.main()
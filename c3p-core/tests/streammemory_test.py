@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import asyncio
+import unittest
+
+from c3p_core.stream import Type, create_stream
+from c3p_core.stream.schema import PickleSchema
+import c3p_core.stream.memory as mstream
+import c3p_core.stream.stub as sstream
+
+
+TOPIC = "MyMemoryTopic"
+
+PAYLOAD_FORMAT = "This is message %d"
+
+
+async def consume_all(consumer, max_records=None):
+    values = []
+    try:
+        while True:
+            values.extend(message.value for message in await consumer.getmany(max_records))
+    except StopAsyncIteration:
+        return values
+
+
+class TestMemoryStream(unittest.TestCase):
+    def setUp(self):
+        mstream.Stream(TOPIC, PickleSchema(str)).reset()
+        self.loop = asyncio.get_event_loop()
+
+    def test_create_stream(self):
+        self.assertIsInstance(create_stream(Type.MEMORY, TOPIC, PickleSchema(str)), mstream.Stream)
+        self.assertIsInstance(create_stream(Type.from_string("STUB"), TOPIC, PickleSchema(str)), sstream.Stream)
+        with self.assertRaises(ValueError):
+            create_stream(Type.NONE, TOPIC, PickleSchema(str))
+
+    def test_multiple_consumers(self):
+        num = 2500
+        stream = mstream.Stream(TOPIC, PickleSchema(str), yield_every=100)
+        consumers = [stream.create_consumer("A"), stream.create_consumer("B")]
+        producer = stream.create_producer()
+
+        async def produce():
+            for i in range(num):
+                await producer.send_async(PAYLOAD_FORMAT % i, properties={"type": "update"})
+            producer.close()
+
+        results = self.loop.run_until_complete(
+            asyncio.gather(produce(), consume_all(consumers[0], 10), consume_all(consumers[1]))
+        )
+        expected = [PAYLOAD_FORMAT % i for i in range(num)]
+        self.assertEqual([expected, expected], results[1:])
+        self.assertEqual(num - 1, stream.get_last_message_id())
+        # The producer yields every 100 messages, the consumers never hold more
+        self.assertLessEqual(consumers[0].high_watermark, 100)
+
+    def test_async_iteration(self):
+        stream = mstream.Stream(TOPIC, PickleSchema(str))
+        consumer = stream.create_consumer("I")
+        producer = stream.create_producer()
+        self.loop.run_until_complete(producer.send_batch_async([PAYLOAD_FORMAT % i for i in range(3)]))
+        producer.close()
+
+        async def consume():
+            return [message.value async for message in consumer]
+
+        self.assertEqual([PAYLOAD_FORMAT % i for i in range(3)], self.loop.run_until_complete(consume()))
+
+    def test_getmany_timeout_and_close(self):
+        stream = mstream.Stream(TOPIC, PickleSchema(str))
+        consumer = stream.create_consumer("T")
+        self.assertEqual([], self.loop.run_until_complete(consumer.getmany(10, timeout=0.01)))
+
+        async def close_later():
+            await asyncio.sleep(0.01)
+            consumer.close()
+
+        with self.assertRaises(asyncio.CancelledError):
+            self.loop.run_until_complete(asyncio.gather(consumer.getmany(10), close_later()))
+        with self.assertRaises(StopAsyncIteration):
+            self.loop.run_until_complete(consumer.getmany(10))
+
+    def test_backpressure(self):
+        stream = mstream.Stream(TOPIC, PickleSchema(str), capacity=5)
+        consumer = stream.create_consumer("C")
+        producer = stream.create_producer()
+
+        async def produce():
+            for _ in range(4):
+                await producer.send_batch_async([PAYLOAD_FORMAT % i for i in range(3)])
+
+        task = self.loop.create_task(produce())
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertFalse(task.done())
+        self.assertEqual(6, consumer.high_watermark)
+
+        self.loop.run_until_complete(consumer.getmany(4))
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertFalse(task.done())
+        self.assertEqual(5, consumer.size)
+
+        self.loop.run_until_complete(consumer.getmany())
+        self.loop.run_until_complete(task)
+        self.assertEqual(3, consumer.size)
+
+    def test_backpressure_concurrent_producers(self):
+        stream = mstream.Stream(TOPIC, PickleSchema(str), capacity=2)
+        consumer = stream.create_consumer("C")
+        producer = stream.create_producer()
+
+        async def produce(name):
+            for i in range(3):
+                await producer.send_async(f"{name} {i}")
+
+        # Several senders blocked on the full consumer are all woken when it is drained
+        tasks = [self.loop.create_task(produce(name)) for name in "abcd"]
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertFalse(any(task.done() for task in tasks))
+
+        values = []
+        for _ in range(12):
+            if len(values) == 12:
+                break
+            values.extend(message.value for message in self.loop.run_until_complete(consumer.getmany(timeout=0.1)))
+        self.loop.run_until_complete(asyncio.wait_for(asyncio.gather(*tasks), 1))
+        self.assertEqual(sorted(f"{name} {i}" for name in "abcd" for i in range(3)), sorted(values))
+
+
+if __name__ == "__main__":
+    unittest.main()
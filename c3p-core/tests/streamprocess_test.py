@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+import asyncio
+import multiprocessing
+import unittest
+
+from c3p_core.stream import Type, create_stream
+from c3p_core.stream.schema import PickleSchema
+import c3p_core.stream.process as pstream
+
+
+TOPIC = "MyProcessTopic"
+
+PAYLOAD_FORMAT = "This is message %d"
+
+
+def produce(stream, num: int, batch_size: int):
+    async def send():
+        producer = stream.create_producer()
+        for start in range(0, num, batch_size):
+            values = [PAYLOAD_FORMAT % i for i in range(start, min(start + batch_size, num))]
+            await producer.send_batch_async(values, properties={"type": "update"})
+        producer.close()
+
+    asyncio.new_event_loop().run_until_complete(send())
+
+
+async def consume_all(consumer, max_records=None):
+    values = []
+    try:
+        while True:
+            values.extend(message.value for message in await consumer.getmany(max_records, timeout=10))
+    except StopAsyncIteration:
+        return values
+
+
+class TestProcessStream(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.get_event_loop()
+
+    def run_producer_process(self, transport: str, capacity_bytes: int = 1 << 16):
+        num = 2000
+        stream = pstream.Stream(TOPIC, PickleSchema(str), consumers=("A", "B"), capacity_bytes=capacity_bytes, transport=transport)
+        try:
+            process = multiprocessing.Process(target=produce, args=(stream, num, 64))
+            process.start()
+            results = self.loop.run_until_complete(
+                asyncio.gather(consume_all(stream.create_consumer("A"), 100), consume_all(stream.create_consumer("B")))
+            )
+            process.join(10)
+        finally:
+            stream.close()
+        expected = [PAYLOAD_FORMAT % i for i in range(num)]
+        self.assertEqual([expected, expected], results)
+        self.assertEqual(0, process.exitcode)
+
+    def test_shared_memory(self):
+        # A ring smaller than the data sent, which wraps around and fills up
+        self.run_producer_process("shm", capacity_bytes=8192)
+
+    def test_pipe(self):
+        self.run_producer_process("pipe")
+
+    def test_getmany_timeout(self):
+        stream = create_stream(Type.PROCESS, TOPIC, PickleSchema(str), consumers=("T",))
+        try:
+            consumer = stream.create_consumer("T")
+            self.assertEqual([], self.loop.run_until_complete(consumer.getmany(timeout=0.01)))
+            self.loop.run_until_complete(stream.create_producer().send_async("a", properties={"type": "update"}))
+            messages = self.loop.run_until_complete(consumer.getmany(timeout=0.01))
+            self.assertEqual(["a"], [message.value for message in messages])
+            self.assertEqual({"type": "update"}, messages[0].properties)
+            with self.assertRaises(ValueError):
+                stream.create_consumer("undeclared")
+        finally:
+            stream.close()
+
+    def test_frame_too_large(self):
+        stream = pstream.Stream(TOPIC, PickleSchema(str), consumers=("L",), capacity_bytes=100, transport="shm")
+        try:
+            with self.assertRaises(ValueError):
+                self.loop.run_until_complete(stream.create_producer().send_async("x" * 200))
+        finally:
+            stream.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -62,6 +62,15 @@ async def consume_thru_failures(tester: "TestStream", id: str, stream_factory: C
                 print(e)
 
 
+async def consume_batches(consumer: Consumer, max_records: int):
+    batches = []
+    try:
+        while True:
+            batches.append(await consumer.getmany(max_records=max_records))
+    except StopAsyncIteration:
+        return batches
+
+
 async def consume_with_consumer(stream: Stream, consumer: Consumer):
     last_msg_id = stream.get_last_message_id()
     if last_msg_id is None:
@@ -119,6 +128,67 @@ class TestStream(unittest.TestCase):
             )
         )
 
+    def test_batch_producer(self):
+        sstream.Stream(TOPIC, PickleSchema(str)).reset()
+
+        num = 25
+        loop = asyncio.get_event_loop()
+        with sstream.Stream(TOPIC, PickleSchema(str)) as stream:
+            with stream.create_consumer("B") as consumer:
+                producer = stream.create_producer()
+                payloads = [PAYLOAD_FORMAT % i for i in range(num)]
+                loop.run_until_complete(producer.send_batch_async(payloads, properties={"type": "update"}))
+                self.assertEqual(num - 1, stream.get_last_message_id())
+                producer.close()
+
+                batches = loop.run_until_complete(consume_batches(consumer, 10))
+                self.assertEqual([10, 10, 5], [len(batch) for batch in batches[:3]])
+                self.assertEqual(payloads, [message.value for batch in batches for message in batch])
+                self.assertEqual({"type": "update"}, batches[0][0].properties)
+
+    def test_getmany_timeout(self):
+        sstream.Stream(TOPIC, PickleSchema(str)).reset()
+
+        loop = asyncio.get_event_loop()
+        with sstream.Stream(TOPIC, PickleSchema(str)) as stream:
+            with stream.create_consumer("T") as consumer:
+                self.assertEqual([], loop.run_until_complete(consumer.getmany(10, timeout=0.01)))
+
+                stream.create_producer().close()
+                with self.assertRaises(StopAsyncIteration):
+                    loop.run_until_complete(consumer.getmany(10, timeout=0.01))
+
+    def test_backpressure(self):
+        sstream.Stream(TOPIC, PickleSchema(str)).reset()
+
+        loop = asyncio.get_event_loop()
+        with sstream.Stream(TOPIC, PickleSchema(str), capacity_bytes=10**6) as stream:
+            with stream.create_consumer("C", capacity=5) as consumer, stream.create_consumer("U") as large:
+                producer = stream.create_producer()
+                payloads = [PAYLOAD_FORMAT % i for i in range(3)]
+
+                async def produce():
+                    for _ in range(4):
+                        await producer.send_batch_async(payloads)
+
+                task = loop.create_task(produce())
+                loop.run_until_complete(asyncio.sleep(0.01))
+                # The second batch fills the queue, the third one waits for room
+                self.assertFalse(task.done())
+                self.assertTrue(consumer.is_full)
+                self.assertEqual(6, consumer.high_watermark)
+                self.assertEqual(1, consumer.full_count)
+
+                loop.run_until_complete(consumer.getmany(4))
+                loop.run_until_complete(asyncio.sleep(0.01))
+                self.assertFalse(task.done())
+                self.assertEqual(5, consumer.size)
+
+                loop.run_until_complete(consumer.getmany())
+                loop.run_until_complete(task)
+                self.assertEqual(12, large.size)
+                self.assertGreater(large.high_watermark_bytes, 0)
+
     @unittest.skip("Acking not implemented and in-memory queue is deleted.")
     def test_stream_failure(self):
         sstream.Stream(TOPIC, PickleSchema(str)).reset()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import dataclasses
+from datetime import datetime
+from enum import Enum
+import pickle
+import unittest
+
+from c3p_core.stream.schema import PickleSchema, StructSchema
+
+
+class Unit(Enum):
+    Kilograms = "kg"
+    Pounds = "lbs"
+
+
+@dataclasses.dataclass
+class Record:
+    Id: int = 0
+    Date: datetime = None
+    Name: str = ""
+    Quantity: float = 0.0
+    WeightUnit: Unit = Unit.Kilograms
+    Active: bool = False
+    Extra: object = None
+
+
+RECORDS = [
+    Record(),
+    Record(1, "2023-05-17 00:00:00", "Name with ünicode", 12.5, Unit.Pounds, True, {"a": 1}),
+    Record(-2**63, datetime(2023, 5, 17, 12, 30), "", -1.25, Unit.Kilograms, False, 2**70),
+    Record(None, None, None, None, None, None, None),
+    Record(3, 4, "x", 0.1, Unit.Pounds, True, 0.5),
+]
+
+
+class TestStructSchema(unittest.TestCase):
+    def test_encode_decode(self):
+        schema = StructSchema(Record)
+        for record in RECORDS:
+            with self.subTest(record=record):
+                self.assertEqual(record, schema.decode(schema.encode(record)))
+        self.assertIsNone(schema.decode(schema.encode(None)))
+
+    def test_batch(self):
+        schema = StructSchema(Record)
+        data = schema.encode_batch(RECORDS)
+        self.assertEqual(RECORDS, schema.decode_batch(data))
+        self.assertEqual([], schema.decode_batch(schema.encode_batch([])))
+
+        # The default batch encoding of BaseSchema, and the one of PickleSchema
+        pickle_schema = PickleSchema(Record)
+        self.assertEqual(RECORDS, pickle_schema.decode_batch(pickle_schema.encode_batch(RECORDS)))
+        self.assertEqual(RECORDS, super(PickleSchema, pickle_schema).decode_batch(
+            super(PickleSchema, pickle_schema).encode_batch(RECORDS)
+        ))
+
+    def test_compact(self):
+        record = Record(1, "2023-05-17 00:00:00", "ThisIsTheProductName", 1234.57, Unit.Pounds)
+        self.assertLess(len(StructSchema(Record).encode(record)), len(pickle.dumps(record)) / 2)
+
+    def test_validation(self):
+        schema = StructSchema(Record)
+        with self.assertRaises(TypeError):
+            schema.encode("not a record")
+        with self.assertRaises(TypeError):
+            schema.encode_batch([Record(), "not a record"])
+        with self.assertRaises(TypeError):
+            StructSchema(dict)
+
+
+if __name__ == "__main__":
+    unittest.main()
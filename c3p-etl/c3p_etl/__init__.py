@@ -1 +1,4 @@
 #!/usr/bin/env python3
+
+# Number of rows moved together between the services
+DEFAULT_BATCH_SIZE = 1000
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""Columnar execution of a TransformationPlan.
+
+Each step is applied to a whole column at once, with NumPy when it is installed
+and with plain list operations otherwise.
+"""
+import dataclasses
+import inspect
+import re
+
+from typing import Callable, Dict, List, Sequence
+
+from c3p_etl.functions import (
+    parse_int,
+    parse_date,
+    parse_str,
+    parse_float,
+    convert_to_float_with_two_decimals,
+)
+from c3p_etl.plan import Step, TransformationPlan, column_index
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is an optional dependency
+    np = None
+
+
+def _to_list(values) -> list:
+    # Records hold Python scalars, not NumPy ones
+    return values.tolist() if np is not None and isinstance(values, np.ndarray) else list(values)
+
+
+def _parse_int_column(values: Sequence[str]):
+    if np is not None:
+        return np.array(values).astype(np.int64)
+    return list(map(int, values))
+
+
+def _parse_float_column(values: Sequence[str]):
+    if np is not None:
+        return np.array(values).astype(np.float64)
+    return list(map(float, values))
+
+
+def _parse_str_column(values: Sequence[str]):
+    return list(map(str, values))
+
+
+def _parse_date_column(years: Sequence[str], months: Sequence[str], days: Sequence[str]):
+    if np is None:
+        return list(map(parse_date, years, months, days))
+
+    years = np.array(years).astype(np.int64)
+    months = np.array(months).astype(np.int64)
+    days = np.array(days).astype(np.int64)
+    # Outside of these bounds, let parse_date raise or format the dates
+    if ((years < 1000) | (years > 9999) | (months < 1) | (months > 12) | (days < 1) | (days > 31)).any():
+        raise ValueError("date out of range")
+
+    first_days = (years - 1970).astype("M8[Y]").astype("M8[M]") + (months - 1).astype("m8[M]")
+    dates = first_days.astype("M8[D]") + (days - 1).astype("m8[D]")
+    # A day past the end of the month moves the date to the next month
+    if (dates.astype("M8[M]") != first_days).any():
+        raise ValueError("day is out of range for month")
+
+    return np.char.replace(np.datetime_as_string(dates.astype("M8[s]")), "T", " ")
+
+
+# Every character removed by convert_to_float_with_two_decimals, except the row separator
+_NON_NUMERIC = re.compile(r"[^0-9.\n]")
+
+
+def _convert_to_float_with_two_decimals_column(values: Sequence[str]):
+    # Clean the whole column with a single regex call
+    numeric_parts = _NON_NUMERIC.sub("", "\n".join(values)).split("\n")
+    if len(numeric_parts) != len(values):
+        # A value holds a row separator
+        return list(map(convert_to_float_with_two_decimals, values))
+    if np is not None:
+        # np.round scales by 100 and rounds half to even, which differs from round() on e.g. 1874.605
+        return [round(value, 2) for value in np.array(numeric_parts).astype(np.float64).tolist()]
+    return [round(float(numeric_part), 2) for numeric_part in numeric_parts]
+
+
+# Column implementations of the row functions
+COLUMN_FUNCS: Dict[Callable, Callable] = {
+    parse_int: _parse_int_column,
+    parse_float: _parse_float_column,
+    parse_str: _parse_str_column,
+    parse_date: _parse_date_column,
+    convert_to_float_with_two_decimals: _convert_to_float_with_two_decimals_column,
+}
+
+
+class ColumnBatch:
+    """A struct-of-arrays batch of records: one sequence of values per target column."""
+
+    def __init__(self, record_cls, columns: Dict[str, Sequence], length: int) -> None:
+        self.record_cls = record_cls
+        self.columns = columns
+        self._length = length
+
+    def __len__(self) -> int:
+        return self._length
+
+    def to_records(self) -> List:
+        """Return the batch as a list of record_cls instances."""
+        fields = dataclasses.fields(self.record_cls)
+        names = [field.name for field in fields if field.name in self.columns]
+        if len(names) == len(fields):
+            # All the fields are set, build the records with positional arguments
+            return list(map(self.record_cls, *(_to_list(self.columns[name]) for name in names)))
+        return [
+            self.record_cls(**dict(zip(names, values)))
+            for values in zip(*(_to_list(self.columns[name]) for name in names))
+        ]
+
+
+class ColumnarPlan:
+    """Apply the steps of a TransformationPlan to blocks of rows, one column at a time."""
+
+    def __init__(self, plan: TransformationPlan) -> None:
+        self.plan = plan
+
+    def _apply_step(self, step: Step, columns: Dict[str, list], length: int):
+        if not step.source_columns:
+            return [step.func()] * length
+        source_values = [columns[column] for column in step.source_columns]
+        # The column implementation of the function, declared with it, or of the built-in function it wraps
+        column_func = getattr(step.func, "vectorized", None) or COLUMN_FUNCS.get(inspect.unwrap(step.func))
+        if column_func is not None:
+            return column_func(*source_values)
+        return list(map(step.func, *source_values))
+
+    def transform_columns(self, columns: Dict[str, list], length: int) -> ColumnBatch:
+        """Transform source columns, each holding length values, into a batch of target columns.
+
+        Raises the exception of the first failing value, without telling which row it is.
+        """
+        target_columns = {step.target_column: self._apply_step(step, columns, length) for step in self.plan.steps}
+        return ColumnBatch(self.plan.record_cls, target_columns, length)
+
+    def __call__(self, rows: List, columns: Sequence[str] = None) -> ColumnBatch:
+        """Transform rows given as dicts, or as sequences of values in the order of columns."""
+        if columns is None:
+            source_columns = {column: [row[column] for row in rows] for column in self.plan.source_columns}
+        else:
+            transposed = list(zip(*rows)) or [()] * len(columns)
+            source_columns = {
+                column: transposed[column_index(columns, column)] for column in self.plan.source_columns
+            }
+        return self.transform_columns(source_columns, len(rows))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+import bz2
+import gzip
+import lzma
+import shutil
+
+from typing import Callable, NamedTuple, Optional
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is an optional dependency
+    zstandard = None
+
+
+def _open_zstd(path, mode: str = "rb"):
+    if zstandard is None:
+        raise ValueError(f"Cannot open {path}: zstd requires the zstandard package")
+    return zstandard.open(path, mode)
+
+
+class Compression(NamedTuple):
+    """A compression format, recognized by the extension or the first bytes of a file."""
+
+    name: str
+    extension: str
+    magic: bytes
+    open: Callable
+
+
+COMPRESSIONS = {
+    compression.name: compression
+    for compression in (
+        Compression("gzip", ".gz", b"\x1f\x8b", gzip.open),
+        Compression("bz2", ".bz2", b"BZh", bz2.open),
+        Compression("xz", ".xz", b"\xfd7zXZ\x00", lzma.open),
+        Compression("zstd", ".zst", b"\x28\xb5\x2f\xfd", _open_zstd),
+    )
+}
+
+_MAGIC_BYTES = max(len(compression.magic) for compression in COMPRESSIONS.values())
+
+
+def get_compression(name: str) -> Compression:
+    """Return a compression by name, raising a ValueError for unknown ones."""
+    if name not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression: {name}")
+    return COMPRESSIONS[name]
+
+
+def detect_compression(path) -> Optional[Compression]:
+    """Return the compression of a file from its extension, or else its first bytes. None when not compressed."""
+    name = str(path)
+    for compression in COMPRESSIONS.values():
+        if name.endswith(compression.extension):
+            return compression
+    with open(path, "rb") as file:
+        head = file.read(_MAGIC_BYTES)
+    for compression in COMPRESSIONS.values():
+        if head.startswith(compression.magic):
+            return compression
+    return None
+
+
+def compress_file(source, target, compression: Compression, chunk_bytes: int = 1 << 20):
+    """Write a compressed copy of source to target, streaming it in chunks."""
+    with open(source, "rb") as input_file, compression.open(target, "wb") as output_file:
+        shutil.copyfileobj(input_file, output_file, chunk_bytes)
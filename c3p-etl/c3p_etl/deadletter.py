@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+import asyncio
+import json
+import os
+import time
+
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from c3p_core.stream import Producer
+
+
+class Rejected(NamedTuple):
+    """A row the transformations failed on, with the rule that failed and its exception.
+
+    The row is kept as received, a dict or with columns, a list of values in the order
+    of columns, so that it can be fixed and sent again. rule and target_column are
+    None when the record itself couldn't be created.
+    """
+
+    entity: str
+    row: Any
+    columns: Optional[List[str]]
+    rule: Optional[str]
+    target_column: Optional[str]
+    error_type: str
+    error: str
+
+    @staticmethod
+    def of(entity: str, row, columns: Sequence[str], step, ex: Exception) -> "Rejected":
+        return Rejected(
+            entity,
+            row,
+            list(columns) if columns is not None else None,
+            step.rule if step is not None else None,
+            step.target_column if step is not None else None,
+            type(ex).__name__,
+            str(ex),
+        )
+
+
+class RejectCounters:
+    """Counts of the rejected rows by entity, target column and exception type.
+
+    Instead of logging each rejected row, the counts since the last take() are logged
+    periodically, with the message of the first exception of each kind as a sample.
+    """
+
+    def __init__(self) -> None:
+        self.total = 0
+        self._counts: Counter = Counter()
+        self._samples: Dict[Tuple, str] = {}
+
+    def add(self, rejected: Sequence[Rejected]):
+        for entry in rejected:
+            key = (entry.entity, entry.target_column, entry.error_type)
+            self._counts[key] += 1
+            self._samples.setdefault(key, entry.error)
+        self.total += len(rejected)
+
+    def take(self) -> List[Tuple[Tuple, int, str]]:
+        """Return and reset the counts: ((entity, target_column, error_type), count, sample error)."""
+        counts = [(key, count, self._samples[key]) for key, count in self._counts.most_common()]
+        self._counts.clear()
+        self._samples.clear()
+        return counts
+
+
+class DeadLetterFile:
+    """Append the rejected rows to a JSON lines file, in batches.
+
+    The rows are buffered and written when flush_rows are buffered, when the oldest is
+    flush_interval seconds old (see flush_if_due), and on close. The file is created on
+    the first write. Each batch is appended in a single write, so that several writers
+    can share the file.
+    """
+
+    def __init__(self, path: Path, flush_rows: int = 1000, flush_interval: float = 1.0) -> None:
+        self.path = Path(path)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._lines: List[str] = []
+        # Time of the oldest row not written yet
+        self._buffered_since: float = None
+
+    async def write(self, rejected: Sequence[Rejected]):
+        if not rejected:
+            return
+        if self._buffered_since is None:
+            self._buffered_since = time.monotonic()
+        # Values that aren't JSON types, e.g. dates, are written as strings
+        self._lines.extend(json.dumps(entry._asdict(), default=str) + "\n" for entry in rejected)
+        if len(self._lines) >= self.flush_rows:
+            await self.flush()
+
+    async def flush_if_due(self):
+        if (
+            self._buffered_since is not None
+            and self.flush_interval is not None
+            and time.monotonic() - self._buffered_since >= self.flush_interval
+        ):
+            await self.flush()
+
+    async def flush(self):
+        if not self._lines:
+            return
+        data = "".join(self._lines).encode()
+        await asyncio.get_event_loop().run_in_executor(None, self._append, data)
+        # Only once written: after a failed write, the rows are still buffered, and retried
+        self._lines = []
+        self._buffered_since = None
+
+    def _append(self, data: bytes):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    async def close(self):
+        await self.flush()
+
+
+class DeadLetterStream:
+    """Send the rejected rows to a stream, in a batch per call of write.
+
+    The messages are the rejected rows as dicts, with the properties
+    {"type": "add", "entity": "Rejected<entity>"}, e.g. RejectedOrderRow.
+    """
+
+    def __init__(self, producer: Producer) -> None:
+        self.producer = producer
+
+    async def write(self, rejected: Sequence[Rejected]):
+        if rejected:
+            await self.producer.send_batch_async(
+                [entry._asdict() for entry in rejected],
+                properties={"type": "add", "entity": "Rejected" + rejected[0].entity},
+            )
+
+    async def flush_if_due(self):
+        pass
+
+    async def flush(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+def read_dead_letters(path: Path) -> Iterator[Rejected]:
+    """Read back the rejected rows of a dead-letter file, e.g. to send them again once fixed."""
+    with open(path, "r") as file:
+        for line in file:
+            if line.strip():
+                yield Rejected(**json.loads(line))
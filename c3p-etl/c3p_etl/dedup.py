@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import hashlib
+import heapq
+import os
+
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from typing import List, Sequence, Set
+
+# Size in bytes of a key in the files
+KEY_BYTES = 8
+
+
+def key_of(value) -> int:
+    """Return the 64-bit key of a value: ints are their own key, other values are hashed."""
+    if isinstance(value, int) and -(1 << 63) <= value < (1 << 63):
+        return value
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=KEY_BYTES).digest(), "little", signed=True)
+
+
+class KeyIndex:
+    """A set of 64-bit keys kept on disk in a directory, surviving restarts.
+
+    The keys are a sorted array in keys.bin, searched by bisection, plus the keys
+    added since it was written, in a set and appended to keys.journal. Once the
+    journal holds merge_keys keys, they are merged into a new keys.bin, atomically
+    replacing the previous one. A key takes 8 bytes in memory, once merged.
+    """
+
+    def __init__(self, directory: Path, merge_keys: int = 1 << 20) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.merge_keys = merge_keys
+        self._keys_path = self.directory / "keys.bin"
+        self._journal_path = self.directory / "keys.journal"
+
+        self._sorted = array("q")
+        if self._keys_path.exists():
+            with open(self._keys_path, "rb") as file:
+                self._sorted.frombytes(file.read())
+        self._recent: Set[int] = set()
+        self._journal = open(self._journal_path, "a+b")
+        self._journal.seek(0)
+        data = self._journal.read()
+        # A torn write leaves a partial key at the end of the journal
+        whole = len(data) - len(data) % KEY_BYTES
+        if whole != len(data):
+            self._journal.truncate(whole)
+        self._recent.update(array("q", data[:whole]))
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._recent)
+
+    def __contains__(self, key: int) -> bool:
+        if key in self._recent:
+            return True
+        index = bisect_left(self._sorted, key)
+        return index < len(self._sorted) and self._sorted[index] == key
+
+    def add(self, keys: Sequence[int]):
+        """Add keys, in a single write to the journal."""
+        keys = [key for key in dict.fromkeys(keys) if key not in self]
+        if not keys:
+            return
+        self._journal.seek(0, os.SEEK_END)
+        self._journal.write(array("q", keys).tobytes())
+        self._journal.flush()
+        self._recent.update(keys)
+        if len(self._recent) >= self.merge_keys:
+            self.merge()
+
+    def merge(self):
+        """Merge the keys of the journal into the sorted array, then empty the journal."""
+        if not self._recent:
+            return
+        merged = array("q", heapq.merge(self._sorted, sorted(self._recent)))
+        temporary_path = self._keys_path.with_suffix(".tmp")
+        with open(temporary_path, "wb") as file:
+            merged.tofile(file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, self._keys_path)
+        self._sorted = merged
+        self._recent = set()
+        self._journal.truncate(0)
+
+    def close(self):
+        self._journal.close()
+
+
+class Deduplicator:
+    """Drop the records whose key field was already loaded, according to a KeyIndex.
+
+    filter() returns the new records and holds their keys as pending. commit() adds
+    the pending keys to the index: call it once the records are written, so that the
+    records lost in a crash before that are loaded again on replay, not dropped.
+    """
+
+    def __init__(self, field: str, index: KeyIndex) -> None:
+        self.field = field
+        self.index = index
+        self.duplicates = 0
+        self._pending: Set[int] = set()
+
+    def filter(self, records: Sequence) -> List:
+        new_records = []
+        for record in records:
+            try:
+                key = key_of(getattr(record, self.field))
+            except AttributeError:
+                # Not a record, let the sink reject it
+                new_records.append(record)
+                continue
+            if key in self._pending or key in self.index:
+                self.duplicates += 1
+                continue
+            self._pending.add(key)
+            new_records.append(record)
+        return new_records
+
+    def commit(self):
+        if self._pending:
+            self.index.add(list(self._pending))
+            self._pending = set()
+
+    def close(self):
+        self.index.close()
@@ -1,6 +1,10 @@
 #!/usr/bin/env python3
+import asyncio
+from asyncio import CancelledError
+from concurrent.futures import Executor, ProcessPoolExecutor
+import itertools
+import json
 import os
-import csv
 import shutil
 
 from watchfiles import awatch
@@ -9,10 +13,19 @@ import logging
 from logging.handlers import RotatingFileHandler
 
 from pathlib import Path
+from typing import List, Sequence
 
 from c3p_core import service
 from c3p_core.stream import Producer
 
+from c3p_etl import DEFAULT_BATCH_SIZE
+from c3p_etl.compression import compress_file, detect_compression, get_compression
+from c3p_etl.plan import compile_transformations
+from c3p_etl.reader import CsvReader, SplitCsvReader
+from c3p_etl.registry import create_registry
+
+from c3p_model.order import Order
+
 
 logging.basicConfig(
     handlers=[
@@ -31,8 +44,9 @@ logger = logging.getLogger(__name__)
 
 
 class Extracter(service.Service):
-    def __init__(self, producer: Producer = None) -> None:
+    def __init__(self, producer: Producer = None, batch_size: int = None, columns: Sequence[str] = None) -> None:
         self._producer = producer
+        self.batch_size = batch_size or service.get_setting("crisp.batch_size", DEFAULT_BATCH_SIZE)
         self.data_dir = Path(service.ENV.crisp.data_dir)
 
         self.source_data_dir = self.data_dir / "source"
@@ -41,39 +55,142 @@ class Extracter(service.Service):
         self.source_bak_data_dir = self.data_dir / "source.bak"
         self.source_bak_data_dir.mkdir(parents=True, exist_ok=True)
 
+        # Number of files extracted concurrently. The files waiting are queued by size,
+        # so that small files are not held back by a burst of large ones.
+        self.concurrency = service.get_setting("crisp.extracter.concurrency", 4)
+        self._queue: asyncio.PriorityQueue = None
+        self._sequence = itertools.count()
+        self._workers: List[asyncio.Future] = []
+
+        # Memory-map the source files instead of reading them through a buffer
+        self.use_mmap = service.get_setting("crisp.extracter.mmap", False)
+        # Executor of the reads of the files, by default the one of the event loop
+        self.read_executor: Executor = None
+
+        # Compress the source files moved to the bak folder, e.g. with gzip
+        bak_compression = service.get_setting("crisp.extracter.bak_compression")
+        self.bak_compression = get_compression(bak_compression) if bak_compression else None
+
+        # With split_workers, the files of more than split_bytes are split into ranges of
+        # split_bytes parsed in parallel by a pool of processes
+        self.split_workers = service.get_setting("crisp.extracter.split_workers", 0)
+        self.split_bytes = service.get_setting("crisp.extracter.split_bytes", 64 << 20)
+        self.split_ordered = service.get_setting("crisp.extracter.split_ordered", True)
+        self._split_pool: ProcessPoolExecutor = None
+
+        # Source columns extracted, the others are neither parsed into the rows nor sent.
+        # By default, the columns used by the transformations. None extracts them all.
+        self.columns = columns
+        if self.columns is None and service.get_setting("crisp.extracter.projection", True):
+            self.columns = self._load_source_columns()
+
+    def _load_source_columns(self):
+        transformations_file = service.get_setting("crisp.transformations_file")
+        if transformations_file is None:
+            return None
+        with open(Path(transformations_file), "r") as f:
+            transformations = json.load(f)
+        registry = create_registry(
+            service.get_setting("crisp.transformer.function_modules", []),
+            use_entry_points=service.get_setting("crisp.transformer.entry_points", True),
+            timing=False,
+        )
+        return compile_transformations(transformations, Order, registry.funcs).source_columns
+
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        pass
+        self._shutdown_split_pool()
 
     async def run(self):
+        self._start_workers()
+        try:
+            while True:
+                async for changes in awatch(self.source_data_dir):
+                    for change in changes:
+                        # change is a Tuple[Change, str] of change type and file impacted
+                        if change[0] == 1:  # File added
+                            self.submit(change[1])
+        finally:
+            self._stop_workers()
+
+    def submit(self, path):
+        """Queue a file for extraction, it is moved to the bak folder once extracted."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            # Gone already, the extraction will log it
+            size = 0
+        self._queue.put_nowait((size, next(self._sequence), path))
+
+    def _start_workers(self):
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.ensure_future(self._extract_files()) for _ in range(self.concurrency)]
+
+    def _stop_workers(self):
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        self._shutdown_split_pool()
+
+    def _shutdown_split_pool(self):
+        if self._split_pool is not None:
+            self._split_pool.shutdown(wait=False)
+            self._split_pool = None
+
+    async def _extract_files(self):
         while True:
-            async for changes in awatch(self.source_data_dir):
-                for change in changes:
-                    # change is a Tuple[Change, str] of change type and file impacted
-                    if change[0] == 1:  # File added
-                        await self.extract(change[1])
-
-            # Move all the source files to a bak folder
-            file_names = os.listdir(self.source_data_dir)
-            for file_name in file_names:
-                shutil.move(
-                    os.path.join(self.source_data_dir, file_name),
-                    self.source_bak_data_dir,
-                )
+            _, _, path = await self._queue.get()
+            try:
+                await self.extract(path)
+                await self.backup(path)
+            except Exception as ex:
+                if isinstance(ex, CancelledError):
+                    raise
+                else:
+                    logger.error(f"Failed to extract {path}: {ex}")
+            finally:
+                self._queue.task_done()
+
+    async def backup(self, path):
+        """Move a source file to the bak folder, compressing it off the event loop with bak_compression."""
+        target = os.path.join(self.source_bak_data_dir, os.path.basename(path))
+        if self.bak_compression is None or detect_compression(path) is not None:
+            shutil.move(path, target)
+            return
+        await asyncio.get_event_loop().run_in_executor(
+            None, compress_file, path, target + self.bak_compression.extension, self.bak_compression
+        )
+        os.remove(path)
 
     async def read(self, path):
-        # Use of generators to iterate over the data lazily
-        # without loading the entire data source into memory at once
-        # This allows to process large file
-        with open(path, "r") as data:
-            reader = csv.DictReader(data)
-            for row in reader:
-                yield row
+        """Yield the rows of a file in blocks of batch_size rows, parsed off the event loop."""
+        # A compressed file is read as a stream, it can't be split
+        if self.split_workers and os.path.getsize(path) > self.split_bytes and detect_compression(path) is None:
+            if self._split_pool is None:
+                self._split_pool = ProcessPoolExecutor(max_workers=self.split_workers)
+            reader = SplitCsvReader(
+                path,
+                self.batch_size,
+                self._split_pool,
+                range_bytes=self.split_bytes,
+                max_pending=2 * self.split_workers,
+                ordered=self.split_ordered,
+                executor=self.read_executor,
+                columns=self.columns,
+            )
+        else:
+            reader = CsvReader(path, self.batch_size, use_mmap=self.use_mmap, executor=self.read_executor, columns=self.columns)
+        async with reader:
+            async for block in reader:
+                yield block
 
     async def extract(self, file):
-        async for row in self.read(file):
-            await self._producer.send_async(
-                row, properties={"type": "add", "entity": "OrderRow"}
-            )
+        # Send the rows in batches to amortize the per-message cost of the stream.
+        # The rows are lists of values, their column names are sent once per batch.
+        async for block in self.read(file):
+            properties = {"type": "add", "entity": "OrderRow", "columns": block.columns}
+            await self._producer.send_batch_async(block.rows, properties=properties)
+            # Let the files extracted concurrently send their batches in turn
+            await asyncio.sleep(0)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+import re
+
+from datetime import datetime
+
+from c3p_etl.registry import transform_function
+
+from c3p_model.weight_unit import WeightUnit
+
+
+@transform_function(pure=True)
+def parse_int(value):
+    return int(value)
+
+
+@transform_function(pure=True, cacheable=True)
+def parse_date(year, month, day):
+    return datetime(int(year), int(month), int(day)).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+
+
+@transform_function(pure=True)
+def parse_str(value):
+    return str(value)
+
+
+@transform_function(pure=True)
+def parse_float(value):
+    return float(value)
+
+
+@transform_function(pure=True, cacheable=True)
+def proper_case(value):
+    tokens = value.split(" ")
+    return "".join(w[0].upper() + w[1:] for w in tokens)
+
+
+@transform_function(pure=True, cacheable=True)
+def add_weight_unit(value):
+    return WeightUnit(value.lower())
+
+
+@transform_function(pure=True, cacheable=True)
+def convert_to_float_with_two_decimals(string):
+    # Use regular expression to extract the numeric part from the string
+    numeric_part = re.sub(r"[^0-9.]", "", string)
+
+    # Convert the numeric part to a float with two decimals
+    float_value = round(float(numeric_part), 2)
+    return float_value
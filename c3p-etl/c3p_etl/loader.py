@@ -1,22 +1,26 @@
 #!/usr/bin/env python3
-from enum import Enum
-
 import asyncio
-import aiofiles
-import dataclasses
 
 from asyncio import CancelledError
 
 import logging
-import csv
 
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
+from typing import List, Tuple
 
 from c3p_core.stream import Consumer, Message
 
 from c3p_core import service
 
+from c3p_etl import DEFAULT_BATCH_SIZE
+from c3p_etl.compression import get_compression
+from c3p_etl.dedup import Deduplicator, KeyIndex
+from c3p_etl.sink import ArrowSink, BaseSink, CsvSink, PartitionedCsvSink, SqliteSink, partitioner
+from c3p_etl.sink.arrowsink import FORMATS
+
+from c3p_model.order import Order
+
 logging.basicConfig(
     handlers=[
         RotatingFileHandler(
@@ -32,7 +36,7 @@ logger = logging.getLogger(__name__)
 
 
 class Loader(service.Service):
-    def __init__(self, consumer: Consumer):
+    def __init__(self, consumer: Consumer, batch_size: int = None):
         super().__init__()
 
         self.data_dir = Path(service.ENV.crisp.data_dir)
@@ -40,6 +44,7 @@ class Loader(service.Service):
         self.target_data_dir.mkdir(parents=True, exist_ok=True)
 
         self._consumer = consumer
+        self.batch_size = batch_size or service.get_setting("crisp.batch_size", DEFAULT_BATCH_SIZE)
 
         self._entities = {
             "Order": self._load_order,
@@ -50,6 +55,26 @@ class Loader(service.Service):
             entity_name: 0 for entity_name in self._entities.keys()
         }
 
+        # Long-lived writers of the entities, flushed when their buffer is full,
+        # when it is older than flush_interval seconds and at the end of the stream
+        self.flush_size = service.get_setting("crisp.loader.flush_size", 1 << 20)
+        self.flush_interval = service.get_setting("crisp.loader.flush_interval", 1.0)
+        self._sinks = {
+            "Order": self._create_sink(Order),
+        }
+        # Last message received, acked once the entities of all the messages received are written
+        self._unacked: Message = None
+
+        # Skip the orders whose key field was loaded before, e.g. from a file dropped twice.
+        # The keys loaded are kept in data_dir/dedup/order, across restarts.
+        self._dedup: Deduplicator = None
+        if service.get_setting("crisp.loader.dedup.enabled", False):
+            merge_keys = service.get_setting("crisp.loader.dedup.merge_keys", 1 << 20)
+            self._dedup = Deduplicator(
+                service.get_setting("crisp.loader.dedup.field", "OrderID"),
+                KeyIndex(self.data_dir / "dedup" / "order", merge_keys=merge_keys),
+            )
+
     async def _log_health_check(self):
         while True:
             await asyncio.sleep(3)
@@ -59,73 +84,170 @@ class Loader(service.Service):
                         f"Received since last check: {counter} {entity_name}"
                     )
                     self._counters[entity_name] = 0
+            if self._dedup is not None and self._dedup.duplicates:
+                logger.debug(f"Duplicate orders skipped since last check: {self._dedup.duplicates}")
+                self._dedup.duplicates = 0
 
     async def run(self):
         asyncio.ensure_future(self._log_health_check())
 
-        msg: Message
-        async for msg in self._consumer:
+        try:
+            await self._run()
+        finally:
+            await self._close_sinks()
+            self._ack_written()
+            if self._dedup is not None:
+                self._dedup.close()
+
+    async def _run(self):
+        while True:
             try:
-                props = msg.properties
-                msg_type = props.get("type")
-
-                if msg_type == "add":
-                    entity_type = props.get("entity")
-                    if entity_type not in self._entities.keys():
-                        logger.warn(
-                            f"Received unknown entity type: {entity_type}"
+                # Wake up to flush the buffers even when no message comes in
+                messages = await self._consumer.getmany(max_records=self.batch_size, timeout=self.flush_interval)
+            except StopAsyncIteration:
+                return
+
+            # Consecutive runs of entities of the same type to load, in input order
+            batches: List[Tuple[str, List]] = []
+            end_of_stream = False
+
+            msg: Message
+            for msg in messages:
+                try:
+                    props = msg.properties
+                    msg_type = props.get("type")
+
+                    if msg_type == "add":
+                        entity_type = props.get("entity")
+                        if entity_type not in self._entities.keys():
+                            logger.warn(
+                                f"Received unknown entity type: {entity_type}"
+                            )
+                            continue
+
+                        self._counters[entity_type] += 1
+                        if not batches or batches[-1][0] != entity_type:
+                            batches.append((entity_type, []))
+                        batches[-1][1].append(msg.value)
+
+                    elif msg_type == "end_of_stream":
+                        end_of_stream = True
+                        break
+
+                    else:
+                        logger.warning(
+                            f"Received unsupported message type: {msg_type}"
                         )
-                        continue
 
-                    self._counters[entity_type] += 1
-                    await self._entities[entity_type](msg.value)
+                except Exception as ex:
+                    if isinstance(ex, CancelledError):
+                        raise
+                    else:
+                        logger.error(ex)
+
+            for entity_type, instances in batches:
+                try:
+                    await self._entities[entity_type](instances)
+                except Exception as ex:
+                    if isinstance(ex, CancelledError):
+                        raise
+                    else:
+                        logger.error(f"Failed to load {len(instances)} {entity_type}: {ex}")
+
+            if messages:
+                self._unacked = messages[-1]
+            await self._flush_due_sinks()
+            self._ack_written()
+
+            if end_of_stream:
+                return
+
+    async def _load_order(self, instances_of_entity):
+        if self._dedup is not None:
+            instances_of_entity = self._dedup.filter(instances_of_entity)
+        await self._sinks["Order"].write(instances_of_entity)
+
+    async def _load_product(self, instances_of_entity):
+        # TODO: Implement when there is need to process product files
+        pass
 
-                elif msg_type == "end_of_stream":
-                    return
+    def _create_sink(self, record_cls) -> BaseSink:
+        """Create the sink of an entity, configured by crisp.loader.sinks.<entity>, by default a CSV file."""
+        setting = f"crisp.loader.sinks.{record_cls.__name__}"
+        sink_format = service.get_setting(f"{setting}.format", "csv")
+        if sink_format == "csv" and service.get_setting(f"{setting}.partition.field") is not None:
+            # e.g. target/order/year=2023/month=05/order.csv
+            return PartitionedCsvSink(
+                record_cls,
+                self.target_data_dir / record_cls.__name__.lower(),
+                partitioner(
+                    record_cls,
+                    service.get_setting(f"{setting}.partition.field"),
+                    by=service.get_setting(f"{setting}.partition.by", "value"),
+                    buckets=service.get_setting(f"{setting}.partition.buckets", 16),
+                ),
+                max_open=service.get_setting(f"{setting}.partition.max_open", 64),
+                flush_size=self.flush_size,
+                flush_interval=self.flush_interval,
+            )
+        if sink_format == "csv":
+            compression = service.get_setting(f"{setting}.compression")
+            return CsvSink(
+                record_cls,
+                self.target_data_dir / (record_cls.__name__.lower() + ".csv"),
+                flush_size=self.flush_size,
+                flush_interval=self.flush_interval,
+                rotate_bytes=service.get_setting(f"{setting}.rotate_bytes"),
+                rotate_rows=service.get_setting(f"{setting}.rotate_rows"),
+                compression=get_compression(compression) if compression else None,
+            )
+        if sink_format in FORMATS:
+            return ArrowSink(
+                record_cls,
+                self.target_data_dir / (record_cls.__name__.lower() + FORMATS[sink_format]),
+                format=sink_format,
+                flush_size=service.get_setting(f"{setting}.row_group_size", 65536),
+                flush_interval=self.flush_interval,
+                compression=service.get_setting(f"{setting}.compression"),
+            )
+        if sink_format == "sqlite":
+            return SqliteSink(
+                record_cls,
+                service.get_setting(f"{setting}.path", self.target_data_dir / "crisp.db"),
+                table=service.get_setting(f"{setting}.table"),
+                flush_size=service.get_setting(f"{setting}.batch_rows", 10000),
+                flush_interval=self.flush_interval,
+            )
+        raise ValueError(f"Unsupported sink format for {record_cls.__name__}: {sink_format}")
 
+    async def _flush_due_sinks(self):
+        for entity_type, sink in self._sinks.items():
+            try:
+                await sink.flush_if_due()
+            except Exception as ex:
+                if isinstance(ex, CancelledError):
+                    raise
                 else:
-                    logger.warning(
-                        f"Received unsupported message type: {msg_type}"
-                    )
-
+                    logger.error(f"Failed to flush the {entity_type} sink: {ex}")
+
+    def _ack_written(self):
+        """Ack the last message received once no sink holds buffered records.
+
+        Acks are cumulative: after a restart, a durable stream replays the messages from there.
+        """
+        if self._unacked is not None and not any(sink.buffered for sink in self._sinks.values()):
+            # The keys of the orders written are only recorded now, so that a replay loads the others
+            if self._dedup is not None:
+                self._dedup.commit()
+            self._consumer.ack(self._unacked)
+            self._unacked = None
+
+    async def _close_sinks(self):
+        for entity_type, sink in self._sinks.items():
+            try:
+                await sink.close()
             except Exception as ex:
                 if isinstance(ex, CancelledError):
                     raise
                 else:
-                    logger.error(ex)
-
-    async def _load_order(self, instance_of_entity):
-        await self.write_dict_to_csv(self.target_data_dir, instance_of_entity)
-
-    async def _load_product(self, instance_of_entity):
-        # TODO: Implement when there is need to process product files
-        pass
-
-    async def write_dict_to_csv(self, dir_path, instance_of_entity):
-        # We assume that if the file exists, it has the correct headers
-        # Otherwise we write the headers
-        # A TODO would be to account for the fact that a file can exists and have no header
-
-        file_path = dir_path / "order.csv"
-
-        write_header = False
-        if not file_path.exists():
-            write_header = True
-
-        async with aiofiles.open(file_path, "a", newline="") as file:
-            fieldnames = [
-                field.name for field in dataclasses.fields(instance_of_entity)
-            ]
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            if write_header:
-                await writer.writeheader()
-            values = [
-                getattr(instance_of_entity, field.name)
-                for field in dataclasses.fields(instance_of_entity)
-            ]
-
-            values = list(
-                map(lambda x: x.value if isinstance(x, Enum) else x, values)
-            )
-
-            await writer.writerow(dict(zip(fieldnames, values)))
+                    logger.error(f"Failed to close the {entity_type} sink: {ex}")
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import dataclasses
+
+from functools import lru_cache
+from operator import itemgetter
+from typing import Callable, Dict, List, NamedTuple, Sequence, Tuple
+
+from c3p_etl.functions import (
+    parse_int,
+    parse_date,
+    parse_str,
+    parse_float,
+    proper_case,
+    add_weight_unit,
+)
+
+DATA_TYPES = {
+    "int": parse_int,
+    "str": parse_str,
+    "float": parse_float,
+}
+
+
+class Step(NamedTuple):
+    """A compiled transformation: target_column = func(*source_columns values)."""
+
+    rule: str
+    target_column: str
+    source_columns: Tuple[str, ...]
+    func: Callable
+
+
+def _builtin(func: Callable, transform_funcs) -> Callable:
+    # The registered function of a rule, e.g. timed by the registry, or else the function itself
+    return transform_funcs.get(func.__name__, func)
+
+
+def _rename(params, transform_funcs):
+    data_type = _param(params, "data_type")
+    if data_type not in DATA_TYPES:
+        raise ValueError(f"unsupported data_type '{data_type}'")
+    return (_param(params, "source_column"),), _builtin(DATA_TYPES[data_type], transform_funcs)
+
+
+def _transform(params, transform_funcs):
+    func_name = _param(params, "func")
+    if func_name not in transform_funcs:
+        raise ValueError(f"unknown func '{func_name}'")
+    return (_param(params, "source_column"),), transform_funcs[func_name]
+
+
+def _concatenate_date(params, transform_funcs):
+    columns = tuple(_param(params, key) for key in ("year_column", "month_column", "day_column"))
+    return columns, _builtin(parse_date, transform_funcs)
+
+
+def _proper_case(params, transform_funcs):
+    return (_param(params, "source_column"),), _builtin(proper_case, transform_funcs)
+
+
+def _add_weight_value(params, transform_funcs):
+    # The value is a constant, convert it once at compile time
+    weight_unit = add_weight_unit(_param(params, "value"))
+    return (), lambda: weight_unit
+
+
+RULES = {
+    "rename": _rename,
+    "transform": _transform,
+    "concatenate_date": _concatenate_date,
+    "proper_case": _proper_case,
+    "add_weight_value": _add_weight_value,
+}
+
+
+def _param(params: Dict, key: str):
+    if key not in params:
+        raise ValueError(f"missing '{key}'")
+    return params[key]
+
+
+def column_index(columns: Sequence[str], column: str) -> int:
+    """Return the index of a source column in the columns of the rows."""
+    try:
+        return columns.index(column)
+    except ValueError:
+        raise ValueError(f"missing source column '{column}'") from None
+
+
+def _bind(func: Callable, source_columns: Tuple[str, ...], columns: Tuple[str, ...] = None) -> Callable:
+    """Return a callable computing the value of a step from a row.
+
+    The row is a dict, or a sequence of values in the order of columns.
+    """
+    if not source_columns:
+        return lambda row: func()
+    if columns is not None:
+        source_columns = tuple(column_index(columns, column) for column in source_columns)
+    get = itemgetter(*source_columns)
+    if len(source_columns) == 1:
+        return lambda row: func(get(row))
+    return lambda row: func(*get(row))
+
+
+class TransformationPlan:
+    """The transformations compiled once into a callable turning a row into a record.
+
+    The rows are dicts, or with columns, sequences of values in the order of columns.
+    """
+
+    def __init__(self, record_cls, steps: List[Step], columns: Sequence[str] = None) -> None:
+        self.record_cls = record_cls
+        self.steps = steps
+        self.columns = tuple(columns) if columns is not None else None
+        self._getters = [(step.target_column, _bind(step.func, step.source_columns, self.columns)) for step in steps]
+        self._plans_by_columns: Dict[Tuple[str, ...], "TransformationPlan"] = {}
+
+    def for_columns(self, columns: Sequence[str]) -> "TransformationPlan":
+        """Return the plan for rows of values in the order of columns, compiled once per columns.
+
+        Raises a ValueError when a source column is missing.
+        """
+        columns = tuple(columns)
+        plan = self._plans_by_columns.get(columns)
+        if plan is None:
+            plan = self._plans_by_columns[columns] = TransformationPlan(self.record_cls, self.steps, columns)
+        return plan
+
+    @property
+    def source_columns(self) -> List[str]:
+        """The source columns used by the steps, in order of first use."""
+        columns = {}
+        for step in self.steps:
+            columns.update(dict.fromkeys(step.source_columns))
+        return list(columns)
+
+    def cache_info(self) -> Dict[str, Tuple]:
+        """The hits, misses, maxsize and currsize of the caches of the steps, by target column."""
+        return {step.target_column: step.func.cache_info() for step in self.steps if hasattr(step.func, "cache_info")}
+
+    def failing_step(self, row) -> Tuple[Step, Exception]:
+        """Return the first step failing on a row and its exception, once the plan failed on it.
+
+        The step is None when all the steps succeed, e.g. when the record can't be created.
+        """
+        values = {}
+        for step, (target_column, get) in zip(self.steps, self._getters):
+            try:
+                values[target_column] = get(row)
+            except Exception as ex:
+                return step, ex
+        try:
+            self.record_cls(**values)
+        except Exception as ex:
+            return None, ex
+        return None, None
+
+    def __call__(self, row):
+        return self.record_cls(**{target_column: get(row) for target_column, get in self._getters})
+
+
+def compile_transformations(
+    transformations: List[Dict], record_cls, transform_funcs: Dict[str, Callable], cache_size: int = 0
+) -> TransformationPlan:
+    """Validate the transformations (e.g. the content of transformations.json) and compile them into a plan.
+
+    The results of the cacheable functions are cached, up to cache_size per rule, the
+    least recently used first evicted. A rule may set its own "cache_size", 0 to disable.
+
+    Raises a ValueError describing the first invalid transformation.
+    """
+    if not isinstance(transformations, list):
+        raise ValueError("The transformations must be a list")
+
+    field_names = {field.name for field in dataclasses.fields(record_cls)}
+    steps = []
+    target_columns = set()
+    for index, transformation in enumerate(transformations):
+        try:
+            if not isinstance(transformation, dict) or len(transformation) != 1:
+                raise ValueError("expected an object with a single rule")
+            (rule, params), = transformation.items()
+            if rule not in RULES:
+                raise ValueError(f"unknown rule '{rule}'")
+            if not isinstance(params, dict):
+                raise ValueError(f"the parameters of '{rule}' must be an object")
+
+            target_column = _param(params, "target_column")
+            if target_column not in field_names:
+                raise ValueError(f"'{target_column}' is not a field of {record_cls.__name__}")
+            if target_column in target_columns:
+                raise ValueError(f"'{target_column}' is already set by another transformation")
+            target_columns.add(target_column)
+
+            source_columns, func = RULES[rule](params, transform_funcs)
+
+            rule_cache_size = params.get("cache_size", cache_size)
+            if not isinstance(rule_cache_size, int) or rule_cache_size < 0:
+                raise ValueError(f"invalid cache_size {rule_cache_size!r}")
+            if source_columns and rule_cache_size and getattr(func, "cacheable", False):
+                func = lru_cache(maxsize=rule_cache_size)(func)
+        except ValueError as ex:
+            raise ValueError(f"Invalid transformation #{index}: {ex}") from None
+
+        steps.append(Step(rule, target_column, source_columns, func))
+
+    return TransformationPlan(record_cls, steps)
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+import asyncio
+from asyncio import FIRST_COMPLETED
+import codecs
+from collections import deque
+import csv
+import io
+import itertools
+import mmap
+import os
+
+from concurrent.futures import Executor
+from typing import Deque, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from c3p_etl.compression import Compression, detect_compression
+
+
+class RowBlock(NamedTuple):
+    """Rows of a CSV file, as lists of values in the order of columns."""
+
+    columns: List[str]
+    rows: List[List[str]]
+
+
+def normalize_rows(rows: Iterable[List[str]], width: int, indexes: List[int] = None) -> List[List[str]]:
+    """Skip the blank rows and give the others width values, then keep the values at indexes."""
+    normalized = []
+    for row in rows:
+        if len(row) != width:
+            if not row:
+                continue
+            row = (row + [None] * width)[:width]
+        if indexes is not None:
+            row = [row[index] for index in indexes]
+        normalized.append(row)
+    return normalized
+
+
+class CsvReader:
+    """Parse a CSV file in blocks of block_rows rows, in an executor.
+
+    The file is read and parsed off the event loop, one block per executor call.
+    The rows are lists of values in the order of the header, instead of one dict per
+    row. Like csv.DictReader, the blank lines are skipped and every row has as many
+    values as the header: missing values are None and extra values are dropped.
+
+    With use_mmap, the file is memory-mapped instead of read through a buffer.
+
+    A file compressed with gzip, bz2, xz or zstd is decompressed as it is read. The
+    compression is detected from the extension or the first bytes of the file.
+
+    With columns, only these columns are kept in the rows, in the order of the header.
+    The columns requested that the file does not have are left out of the blocks.
+    """
+
+    def __init__(
+        self,
+        path,
+        block_rows: int,
+        use_mmap: bool = False,
+        executor: Executor = None,
+        encoding: str = "utf-8",
+        columns: Sequence[str] = None,
+    ) -> None:
+        self.path = path
+        self.block_rows = block_rows
+        self.use_mmap = use_mmap
+        self.encoding = encoding
+        self.projection = list(columns) if columns is not None else None
+        # The columns of the file, and of the rows of the blocks
+        self.compression: Compression = None
+        self.header: List[str] = None
+        self.columns: List[str] = None
+        # Indexes of the columns kept, None to keep them all
+        self._indexes: List[int] = None
+        self._executor = executor
+        self._file = None
+        self._map: mmap.mmap = None
+        self._reader: Iterator[List[str]] = None
+
+    async def __aenter__(self) -> "CsvReader":
+        await self._run(self._open)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self._run(self._close)
+
+    def __aiter__(self):
+        return self._blocks()
+
+    async def _blocks(self):
+        while True:
+            block = await self._run(self._read_block)
+            if block is None:
+                return
+            yield block
+
+    def _run(self, func):
+        return asyncio.get_event_loop().run_in_executor(self._executor, func)
+
+    def _open(self):
+        self.compression = detect_compression(self.path)
+        if self.compression is not None:
+            # A compressed file is decompressed as it is read, it can't be mapped
+            self._file = io.TextIOWrapper(self.compression.open(self.path, "rb"), encoding=self.encoding, newline="")
+            lines = self._file
+        elif self.use_mmap:
+            self._file = open(self.path, "rb")
+            # An empty file can't be mapped
+            if os.fstat(self._file.fileno()).st_size:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                lines = codecs.iterdecode(iter(self._map.readline, b""), self.encoding)
+            else:
+                lines = iter(())
+        else:
+            self._file = open(self.path, "r", newline="", encoding=self.encoding)
+            lines = self._file
+        self._reader = csv.reader(lines)
+        self._set_header(next(self._reader, []))
+
+    def _set_header(self, header: List[str]):
+        self.header = self.columns = header
+        if self.projection is not None:
+            wanted = set(self.projection)
+            indexes = [index for index, column in enumerate(self.header) if column in wanted]
+            if len(indexes) < len(self.header):
+                self._indexes = indexes
+                self.columns = [self.header[index] for index in indexes]
+
+    def _read_block(self) -> Optional[RowBlock]:
+        rows = []
+        while len(rows) < self.block_rows:
+            parsed = list(itertools.islice(self._reader, self.block_rows - len(rows)))
+            if not parsed:
+                break
+            rows.extend(normalize_rows(parsed, len(self.header), self._indexes))
+        return RowBlock(self.columns, rows) if rows else None
+
+    def _close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _count_quotes(data, start: int, end: int, chunk_bytes: int = 1 << 20) -> int:
+    return sum(data[offset:min(offset + chunk_bytes, end)].count(b'"') for offset in range(start, end, chunk_bytes))
+
+
+def record_end(data, offset: int, quoted: bool = False) -> int:
+    """Return the offset following the first line break at or after offset that ends a record.
+
+    A line break within a quoted field does not end a record. quoted tells whether offset
+    is within a quoted field: as a doubled quote counts twice, it is when an odd number of
+    quotes precedes offset since the start of the record.
+    """
+    while True:
+        newline = data.find(b"\n", offset)
+        if newline < 0:
+            return len(data)
+        quoted ^= _count_quotes(data, offset, newline) % 2 == 1
+        if not quoted:
+            return newline + 1
+        offset = newline + 1
+
+
+def split_records(data, start: int, range_bytes: int) -> List[Tuple[int, int]]:
+    """Split data from start, a record boundary, into ranges of about range_bytes ending on record boundaries."""
+    ranges = []
+    size = len(data)
+    while start < size:
+        offset = start + range_bytes
+        if offset >= size:
+            end = size
+        else:
+            end = record_end(data, offset, _count_quotes(data, start, offset) % 2 == 1)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def parse_range(
+    path, start: int, end: int, encoding: str, width: int, indexes: List[int] = None
+) -> List[List[str]]:
+    """Parse the records between the offsets start and end of a CSV file, in a worker process."""
+    with open(path, "rb") as file:
+        file.seek(start)
+        text = file.read(end - start).decode(encoding)
+    return normalize_rows(csv.reader(io.StringIO(text, newline="")), width, indexes)
+
+
+class SplitCsvReader(CsvReader):
+    """Parse a large CSV file in byte ranges, in parallel in a pool of processes.
+
+    The file is split into ranges of about range_bytes that end on record boundaries,
+    found by counting the quotes before the line breaks. Each range is parsed by a
+    process of the pool, up to max_pending ranges at a time. The rows are yielded in
+    blocks of block_rows rows in the order of the file, or with ordered False, in the
+    order the ranges are parsed.
+    """
+
+    def __init__(
+        self,
+        path,
+        block_rows: int,
+        pool: Executor,
+        range_bytes: int = 64 << 20,
+        max_pending: int = 4,
+        ordered: bool = True,
+        executor: Executor = None,
+        encoding: str = "utf-8",
+        columns: Sequence[str] = None,
+    ) -> None:
+        super().__init__(path, block_rows, use_mmap=True, executor=executor, encoding=encoding, columns=columns)
+        self.pool = pool
+        self.range_bytes = range_bytes
+        self.max_pending = max_pending
+        self.ordered = ordered
+        self.ranges: List[Tuple[int, int]] = []
+
+    def _open(self):
+        self._file = open(self.path, "rb")
+        # An empty file can't be mapped
+        if not os.fstat(self._file.fileno()).st_size:
+            self._set_header([])
+            return
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header_end = record_end(self._map, 0)
+        header = next(csv.reader(io.StringIO(self._map[:header_end].decode(self.encoding), newline="")), [])
+        self._set_header(header)
+        self.ranges = split_records(self._map, header_end, self.range_bytes)
+
+    async def _blocks(self):
+        loop = asyncio.get_event_loop()
+        ranges = iter(self.ranges)
+        pending: Deque[asyncio.Future] = deque()
+        rows = []
+        try:
+            while True:
+                for start, end in itertools.islice(ranges, self.max_pending - len(pending)):
+                    pending.append(
+                        loop.run_in_executor(
+                            self.pool, parse_range, self.path, start, end, self.encoding, len(self.header), self._indexes
+                        )
+                    )
+                if not pending:
+                    break
+                if self.ordered:
+                    done = [pending.popleft()]
+                    await done[0]
+                else:
+                    done, _ = await asyncio.wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                for future in done:
+                    rows.extend(future.result())
+                start = 0
+                while len(rows) - start >= self.block_rows:
+                    yield RowBlock(self.columns, rows[start: start + self.block_rows])
+                    start += self.block_rows
+                del rows[:start]
+            if rows:
+                yield RowBlock(self.columns, rows)
+        finally:
+            for future in pending:
+                future.cancel()
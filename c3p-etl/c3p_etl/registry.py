@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import importlib
+import time
+
+from functools import wraps
+from types import ModuleType
+from typing import Callable, Dict, Sequence
+
+try:
+    from importlib.metadata import entry_points
+except ImportError:  # pragma: no cover - Python < 3.8
+    entry_points = None
+
+# Entry point group of the packages providing transform functions, or modules of them
+ENTRY_POINT_GROUP = "c3p_etl.transform_functions"
+
+# Module of the built-in transform functions
+BUILTIN_MODULE = "c3p_etl.functions"
+
+
+def transform_function(name: str = None, pure: bool = False, cacheable: bool = False, vectorized: Callable = None):
+    """Declare a transform function, registered under name (by default, its own) when its module is loaded.
+
+    A pure function's result only depends on its arguments. A cacheable function is a
+    pure one worth caching, its results are cached per rule. vectorized is a variant
+    taking whole columns (sequences of values) and returning the column of results,
+    used in columnar mode.
+    """
+    if cacheable and not pure:
+        raise ValueError("A cacheable function must be pure")
+
+    def declare(func: Callable) -> Callable:
+        func.transform_name = name or func.__name__
+        func.pure = pure
+        func.cacheable = cacheable
+        func.vectorized = vectorized
+        return func
+
+    return declare
+
+
+class FunctionStats:
+    """Cumulative number of calls and time in seconds of a function."""
+
+    __slots__ = ("calls", "seconds")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+
+    def __repr__(self) -> str:
+        return f"FunctionStats(calls={self.calls}, seconds={self.seconds:.6f})"
+
+
+class FunctionRegistry:
+    """The transform functions by name, and with timing, their calls and time.
+
+    The functions are registered one by one, from the declared functions of modules,
+    or from the entry points of the installed packages. The vectorized variants are
+    timed apart, under "<name>[vectorized]".
+    """
+
+    def __init__(self, timing: bool = True) -> None:
+        self.timing = timing
+        self.funcs: Dict[str, Callable] = {}
+        self.stats: Dict[str, FunctionStats] = {}
+
+    def register(self, func: Callable, name: str = None):
+        name = name or getattr(func, "transform_name", func.__name__)
+        if name in self.funcs:
+            if getattr(self.funcs[name], "__wrapped__", self.funcs[name]) is func:
+                return
+            raise ValueError(f"A transform function is already registered as '{name}'")
+        self.funcs[name] = self._timed(name, func) if self.timing else func
+
+    def load_module(self, module):
+        """Register the functions declared with transform_function in a module, or a module name."""
+        if not isinstance(module, ModuleType):
+            module = importlib.import_module(module)
+        for value in list(vars(module).values()):
+            # Skip the functions imported from other modules
+            if callable(value) and hasattr(value, "transform_name") and getattr(value, "__module__", None) == module.__name__:
+                self.register(value)
+
+    def load_entry_points(self, group: str = ENTRY_POINT_GROUP):
+        """Register the functions, or the declared functions of the modules, of the entry points of a group."""
+        if entry_points is None:
+            return
+        try:
+            selected = entry_points(group=group)
+        except TypeError:  # pragma: no cover - Python < 3.10
+            selected = entry_points().get(group, [])
+        for entry_point in selected:
+            value = entry_point.load()
+            if isinstance(value, ModuleType):
+                self.load_module(value)
+            else:
+                self.register(value, entry_point.name)
+
+    def _timed(self, name: str, func: Callable) -> Callable:
+        stats = self.stats.setdefault(name, FunctionStats())
+        perf_counter = time.perf_counter
+
+        # wraps keeps the declaration of func: pure, cacheable, ...
+        @wraps(func)
+        def timed(*args):
+            start = perf_counter()
+            try:
+                return func(*args)
+            finally:
+                stats.calls += 1
+                stats.seconds += perf_counter() - start
+
+        if getattr(func, "vectorized", None) is not None:
+            timed.vectorized = self._timed(f"{name}[vectorized]", func.vectorized)
+        return timed
+
+
+def create_registry(modules: Sequence[str] = (), use_entry_points: bool = True, timing: bool = True) -> FunctionRegistry:
+    """Return a registry of the built-in functions, the declared functions of modules and of the entry points."""
+    registry = FunctionRegistry(timing=timing)
+    registry.load_module(BUILTIN_MODULE)
+    for module in modules:
+        registry.load_module(module)
+    if use_entry_points:
+        registry.load_entry_points()
+    return registry
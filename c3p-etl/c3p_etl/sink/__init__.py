@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+
+from .basesink import BaseSink, RecordLayout
+from .csvsink import CsvSink
+from .arrowsink import ArrowSink
+from .sqlitesink import SqliteSink
+from .partitionedsink import PartitionedCsvSink, partitioner
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+from datetime import date, datetime
+from enum import Enum
+from pathlib import Path
+from typing import List
+
+from .basesink import BaseSink
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is an optional dependency
+    pa = None
+
+FORMATS = {
+    "parquet": ".parquet",
+    "arrow": ".arrow",
+}
+
+
+def _arrow_type(hint):
+    """Return the Arrow type of the values of a field with the type hint."""
+    if isinstance(hint, type) and issubclass(hint, Enum):
+        # Enums are written as their value
+        hint = type(next(iter(hint)).value)
+    if hint is bool:
+        return pa.bool_()
+    if hint is int:
+        return pa.int64()
+    if hint is float:
+        return pa.float64()
+    if hint is datetime:
+        return pa.timestamp("ms")
+    if hint is date:
+        return pa.date32()
+    return pa.string()
+
+
+def _to_array(values: List, arrow_type):
+    try:
+        return pa.array(values, type=arrow_type)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # e.g. dates in ISO format, parsed by Arrow
+        return pa.array(values).cast(arrow_type)
+
+
+class ArrowSink(BaseSink):
+    """Write records to a typed columnar file, Parquet or Arrow IPC, kept open.
+
+    flush_size is the number of rows of a row group (Parquet) or record batch (Arrow).
+    The buffer is also flushed after flush_interval seconds, in a smaller row group.
+    compression is a Parquet codec (e.g. snappy, zstd) or, for Arrow, lz4 or zstd.
+
+    A columnar file can't be appended to once closed: when path exists, the records
+    are written to the first free name among path.1, path.2, ... before the suffix.
+    """
+
+    def __init__(
+        self,
+        record_cls,
+        path: Path,
+        format: str = "parquet",
+        flush_size: int = 65536,
+        flush_interval: float = None,
+        compression: str = None,
+    ) -> None:
+        if pa is None:
+            raise ValueError(f"The {format} format requires the pyarrow package")
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported columnar format: {format}")
+        super().__init__(record_cls, flush_size, flush_interval)
+        self.path = Path(path)
+        self.format = format
+        self.compression = compression
+        self.schema = pa.schema(
+            [(name, _arrow_type(self.layout.types.get(name))) for name in self.layout.fieldnames]
+        )
+        self._rows: List[List] = []
+        self._writer = None
+
+    def _buffer(self, rows: List[List]):
+        self._rows.extend(rows)
+
+    def _buffer_size(self) -> int:
+        return len(self._rows)
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        path = self.path
+        index = 0
+        while path.exists():
+            index += 1
+            path = self.path.with_name(f"{self.path.stem}.{index}{self.path.suffix}")
+        self.path = path
+        if self.format == "parquet":
+            self._writer = pq.ParquetWriter(path, self.schema, compression=self.compression or "snappy")
+        else:
+            options = pa.ipc.IpcWriteOptions(compression=self.compression)
+            self._writer = pa.ipc.new_file(path, self.schema, options=options)
+
+    def _write_buffer(self):
+        if self._writer is None:
+            self._open()
+        columns = zip(*self._rows)
+        table = pa.Table.from_arrays(
+            [_to_array(list(values), field.type) for values, field in zip(columns, self.schema)], schema=self.schema
+        )
+        if self.format == "parquet":
+            self._writer.write_table(table, row_group_size=len(table))
+        else:
+            self._writer.write_table(table)
+        self._rows = []
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
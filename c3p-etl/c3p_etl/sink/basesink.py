@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import asyncio
+import dataclasses
+import logging
+import time
+import typing
+
+from abc import ABCMeta, abstractmethod
+from enum import Enum
+from functools import lru_cache
+from operator import attrgetter
+from typing import List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RecordLayout:
+    """The field names of a dataclass and how to turn an instance into a row of values.
+
+    Use RecordLayout.of(record_cls) to compute it once per class.
+    """
+
+    def __init__(self, record_cls) -> None:
+        self.record_cls = record_cls
+        self.fields = dataclasses.fields(record_cls)
+        self.fieldnames: Tuple[str, ...] = tuple(field.name for field in self.fields)
+        self.types = typing.get_type_hints(record_cls)
+        self._getter = attrgetter(*self.fieldnames)
+        # Enum values are written as their value
+        self._enum_indexes = [
+            index
+            for index, field in enumerate(self.fields)
+            if isinstance(self.types.get(field.name), type) and issubclass(self.types[field.name], Enum)
+        ]
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def of(record_cls) -> "RecordLayout":
+        return RecordLayout(record_cls)
+
+    def values(self, record) -> List:
+        if not isinstance(record, self.record_cls):
+            raise TypeError(f"Expected {self.record_cls.__name__}, got {type(record).__name__}")
+        values = self._getter(record)
+        values = list(values) if len(self.fieldnames) > 1 else [values]
+        for index in self._enum_indexes:
+            value = values[index]
+            if isinstance(value, Enum):
+                values[index] = value.value
+        return values
+
+
+class BaseSink(metaclass=ABCMeta):
+    """Buffer records of a dataclass and write them to a target in blocks.
+
+    The buffer is flushed when it reaches flush_size (in the unit of the sink, see
+    _buffer_size), when it is older than flush_interval seconds (see flush_if_due),
+    and on close.
+    """
+
+    def __init__(self, record_cls, flush_size: int, flush_interval: float = None) -> None:
+        self.layout = RecordLayout.of(record_cls)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        # Time of the oldest record not flushed yet
+        self._buffered_since: float = None
+
+    async def write(self, records: Sequence):
+        """Buffer the records, skipping (and logging) the ones that can't be converted."""
+        rows = []
+        for record in records:
+            try:
+                rows.append(self.layout.values(record))
+            except Exception as ex:
+                logger.error(f"Skipped {record}: {ex}")
+        if not rows:
+            return
+
+        if self._buffered_since is None:
+            self._buffered_since = time.monotonic()
+        self._buffer(rows)
+        if self._buffer_size() >= self.flush_size:
+            await self.flush()
+
+    @property
+    def buffered(self) -> bool:
+        """Whether records are waiting to be written."""
+        return self._buffered_since is not None
+
+    async def flush_if_due(self):
+        """Flush the buffer if it holds records older than flush_interval."""
+        if (
+            self._buffered_since is not None
+            and self.flush_interval is not None
+            and time.monotonic() - self._buffered_since >= self.flush_interval
+        ):
+            await self.flush()
+
+    async def flush(self):
+        if self._buffered_since is None:
+            return
+        await asyncio.get_event_loop().run_in_executor(None, self._write_buffer)
+        # Only once written: after a failed write, the records are still buffered, and retried
+        self._buffered_since = None
+
+    async def close(self):
+        try:
+            await self.flush()
+        finally:
+            await asyncio.get_event_loop().run_in_executor(None, self._close)
+
+    @abstractmethod
+    def _buffer(self, rows: List[List]):
+        """Add rows of values to the buffer."""
+        pass
+
+    @abstractmethod
+    def _buffer_size(self) -> int:
+        pass
+
+    @abstractmethod
+    def _write_buffer(self):
+        """Write and clear the buffer, which is kept when the write fails. Runs in an executor thread."""
+        pass
+
+    @abstractmethod
+    def _close(self):
+        """Release the target. Runs in an executor thread."""
+        pass
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+
+import csv
+import io
+import logging
+import os
+import re
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+from c3p_etl.compression import Compression, compress_file
+
+from .basesink import BaseSink
+
+logger = logging.getLogger(__name__)
+
+
+class CsvSink(BaseSink):
+    """Append records to a CSV file kept open, writing the header if the file is empty.
+
+    flush_size is the size in characters of the buffered CSV text.
+
+    With rotate_bytes or rotate_rows, the records are written to path.part, rolled once
+    it holds rotate_bytes bytes or rotate_rows rows, and on close. Rolling renames it
+    to a numbered segment, e.g. order.00000001.csv, which is not written again. With a
+    compression, the segments are then compressed in a background thread, e.g. to
+    order.00000001.csv.gz, and the uncompressed segments are removed.
+    """
+
+    def __init__(
+        self,
+        record_cls,
+        path: Path,
+        flush_size: int = 1 << 20,
+        flush_interval: float = None,
+        rotate_bytes: int = None,
+        rotate_rows: int = None,
+        compression: Compression = None,
+    ) -> None:
+        super().__init__(record_cls, flush_size, flush_interval)
+        self.path = Path(path)
+        self.rotate_bytes = rotate_bytes
+        self.rotate_rows = rotate_rows
+        self.compression = compression
+        self._file = None
+        self._buffer_io = io.StringIO()
+        self._writer = csv.writer(self._buffer_io)
+        self._buffered_rows = 0
+        # Rows in the file being written, when rotating
+        self._rows = 0
+        # Thread compressing the segments
+        self._compressor: ThreadPoolExecutor = None
+
+    @property
+    def rotating(self) -> bool:
+        return self.rotate_bytes is not None or self.rotate_rows is not None
+
+    @property
+    def part_path(self) -> Path:
+        """The file being written, when rotating."""
+        return self.path.with_name(self.path.name + ".part")
+
+    def _buffer(self, rows: List[List]):
+        self._writer.writerows(rows)
+        self._buffered_rows += len(rows)
+
+    def _buffer_size(self) -> int:
+        return self._buffer_io.tell()
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # A part left by a previous run is written on
+        self._file = open(self.part_path if self.rotating else self.path, "a", newline="")
+        if self._file.tell() == 0:
+            csv.writer(self._file).writerow(self.layout.fieldnames)
+        elif self.rotating and self.rotate_rows is not None:
+            with open(self.part_path, newline="") as file:
+                self._rows = sum(1 for _ in csv.reader(file)) - 1
+
+    def _write_buffer(self):
+        if self._file is None:
+            self._open()
+        self._file.write(self._buffer_io.getvalue())
+        self._file.flush()
+        self._rows += self._buffered_rows
+        self._buffered_rows = 0
+        self._buffer_io.seek(0)
+        self._buffer_io.truncate()
+        if self.rotating and (
+            (self.rotate_bytes is not None and self._file.tell() >= self.rotate_bytes)
+            or (self.rotate_rows is not None and self._rows >= self.rotate_rows)
+        ):
+            self._roll()
+
+    def _segment_path(self) -> Path:
+        pattern = re.compile(re.escape(self.path.stem) + r"\.(\d+)" + re.escape(self.path.suffix))
+        numbers = [int(match.group(1)) for match in map(pattern.match, os.listdir(self.path.parent)) if match]
+        return self.path.with_name(f"{self.path.stem}.{max(numbers, default=0) + 1:08d}{self.path.suffix}")
+
+    def _roll(self):
+        """Close the file being written and rename it to the next segment."""
+        self._file.close()
+        self._file = None
+        self._rows = 0
+        segment_path = self._segment_path()
+        os.replace(self.part_path, segment_path)
+        if self.compression is not None:
+            if self._compressor is None:
+                self._compressor = ThreadPoolExecutor(max_workers=1)
+            self._compressor.submit(self._compress, segment_path)
+
+    def _compress(self, segment_path: Path):
+        compressed_path = segment_path.with_name(segment_path.name + self.compression.extension)
+        temporary_path = compressed_path.with_name(compressed_path.name + ".tmp")
+        try:
+            compress_file(segment_path, temporary_path, self.compression)
+            os.replace(temporary_path, compressed_path)
+            os.remove(segment_path)
+        except Exception as ex:
+            # The segment is kept uncompressed
+            logger.error(f"Failed to compress {segment_path}: {ex}")
+
+    def _close(self):
+        if self._file is not None:
+            if self.rotating:
+                self._roll()
+            else:
+                self._file.close()
+                self._file = None
+        if self._compressor is not None:
+            # Wait for the segments being compressed
+            self._compressor.shutdown(wait=True)
+            self._compressor = None
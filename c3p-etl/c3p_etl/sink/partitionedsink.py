@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+
+import csv
+import io
+import zlib
+
+from collections import OrderedDict
+from datetime import date
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from .basesink import BaseSink, RecordLayout
+
+# Partition of the records without a value, or without a valid date
+NULL_PARTITION = "unknown"
+
+DATE_PARTS = {
+    "year": ("year",),
+    "month": ("year", "month"),
+    "day": ("year", "month", "day"),
+}
+
+
+def _date_partitioner(index: int, parts) -> Callable[[List], str]:
+    def partition(row: List) -> str:
+        value = row[index]
+        if value is None or value == "":
+            return NULL_PARTITION
+        # A date, or a date in ISO format, e.g. "2023-05-17 00:00:00"
+        text = value.isoformat() if isinstance(value, date) else str(value)
+        try:
+            year, month, day = text[:10].split("-")
+        except ValueError:
+            return NULL_PARTITION
+        values = {"year": year, "month": month, "day": day}
+        return "/".join(f"{part}={values[part]}" for part in parts)
+
+    return partition
+
+
+def _hash_partitioner(index: int, field: str, buckets: int) -> Callable[[List], str]:
+    width = len(str(buckets - 1))
+
+    def partition(row: List) -> str:
+        # A stable hash, unlike hash() which changes with the process
+        return f"{field}_bucket={zlib.crc32(str(row[index]).encode()) % buckets:0{width}d}"
+
+    return partition
+
+
+def _value_partitioner(index: int, field: str) -> Callable[[List], str]:
+    def partition(row: List) -> str:
+        value = row[index]
+        if value is None or value == "":
+            return NULL_PARTITION
+        return f"{field}=" + str(value).replace("/", "_")
+
+    return partition
+
+
+def partitioner(record_cls, field: str, by: str = "value", buckets: int = 16) -> Callable[[List], str]:
+    """Return a function giving the relative directory of the partition of a row of values of record_cls.
+
+    by is year, month or day, to partition by a date field (year=2023/month=05),
+    hash, to spread the values of the field over buckets (ProductId_bucket=03),
+    or value, for a partition per value (Unit=kg).
+    """
+    layout = RecordLayout.of(record_cls)
+    if field not in layout.fieldnames:
+        raise ValueError(f"'{field}' is not a field of {record_cls.__name__}")
+    index = layout.fieldnames.index(field)
+    if by in DATE_PARTS:
+        return _date_partitioner(index, DATE_PARTS[by])
+    if by == "hash":
+        if buckets < 1:
+            raise ValueError(f"Invalid number of buckets: {buckets}")
+        return _hash_partitioner(index, field, buckets)
+    if by == "value":
+        return _value_partitioner(index, field)
+    raise ValueError(f"Unsupported partitioning: {by}")
+
+
+class PartitionedCsvSink(BaseSink):
+    """Append records to a CSV file per partition, in a directory per partition under directory.
+
+    Each partition has its own buffer. flush_size is the total size in characters of
+    the buffered CSV text. The files are kept open, at most max_open at a time: the
+    least recently written one is closed to open another.
+    """
+
+    def __init__(
+        self,
+        record_cls,
+        directory: Path,
+        partition: Callable[[List], str],
+        file_name: str = None,
+        max_open: int = 64,
+        flush_size: int = 1 << 20,
+        flush_interval: float = None,
+    ) -> None:
+        super().__init__(record_cls, flush_size, flush_interval)
+        if max_open < 1:
+            raise ValueError(f"Invalid number of open files: {max_open}")
+        self.directory = Path(directory)
+        self.partition = partition
+        self.file_name = file_name or record_cls.__name__.lower() + ".csv"
+        self.max_open = max_open
+        self._buffers: Dict[str, io.StringIO] = {}
+        self._size = 0
+        # Open files by partition, from the least to the most recently written
+        self._files: "OrderedDict[str, io.TextIOBase]" = OrderedDict()
+
+    def path(self, partition: str) -> Path:
+        return self.directory / partition / self.file_name
+
+    def _buffer(self, rows: List[List]):
+        rows_by_partition: Dict[str, List[List]] = {}
+        for row in rows:
+            rows_by_partition.setdefault(self.partition(row), []).append(row)
+        for partition, partition_rows in rows_by_partition.items():
+            buffer = self._buffers.get(partition)
+            if buffer is None:
+                buffer = self._buffers[partition] = io.StringIO()
+            start = buffer.tell()
+            csv.writer(buffer).writerows(partition_rows)
+            self._size += buffer.tell() - start
+
+    def _buffer_size(self) -> int:
+        return self._size
+
+    def _file(self, partition: str):
+        file = self._files.get(partition)
+        if file is not None:
+            self._files.move_to_end(partition)
+            return file
+        if len(self._files) >= self.max_open:
+            _, least_recent = self._files.popitem(last=False)
+            least_recent.close()
+        path = self.path(partition)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        file = open(path, "a", newline="")
+        if file.tell() == 0:
+            csv.writer(file).writerow(self.layout.fieldnames)
+        self._files[partition] = file
+        return file
+
+    def _write_buffer(self):
+        for partition in list(self._buffers):
+            text = self._buffers[partition].getvalue()
+            file = self._file(partition)
+            file.write(text)
+            file.flush()
+            # Once written, so that a failed write is retried with the partitions not written yet
+            del self._buffers[partition]
+            self._size -= len(text)
+
+    def _close(self):
+        while self._files:
+            _, file = self._files.popitem(last=False)
+            file.close()
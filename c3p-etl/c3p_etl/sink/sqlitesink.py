@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+
+import sqlite3
+
+from datetime import date, datetime
+from enum import Enum
+from pathlib import Path
+from typing import List
+
+from .basesink import BaseSink
+
+SQLITE_TYPES = {
+    bool: "INTEGER",
+    int: "INTEGER",
+    float: "REAL",
+    str: "TEXT",
+}
+
+
+def _sqlite_type(hint) -> str:
+    """Return the SQLite column type of a field with the type hint. Dates are stored as ISO text."""
+    if isinstance(hint, type) and issubclass(hint, Enum):
+        # Enums are stored as their value
+        hint = type(next(iter(hint)).value)
+    return SQLITE_TYPES.get(hint, "TEXT")
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class SqliteSink(BaseSink):
+    """Insert records into a table of a SQLite database, created from the fields of the dataclass.
+
+    flush_size is the number of rows inserted by a flush, with executemany in a single
+    transaction: a flush commits the rows of whole batches, or none of them. The
+    database is in WAL mode, so that readers don't block the loading.
+    """
+
+    def __init__(
+        self, record_cls, path: Path, table: str = None, flush_size: int = 10000, flush_interval: float = None
+    ) -> None:
+        super().__init__(record_cls, flush_size, flush_interval)
+        self.path = Path(path)
+        self.table = table or record_cls.__name__.lower()
+        columns = [
+            f"{_quote(name)} {_sqlite_type(self.layout.types.get(name))}" for name in self.layout.fieldnames
+        ]
+        self._create_sql = f"CREATE TABLE IF NOT EXISTS {_quote(self.table)} ({', '.join(columns)})"
+        placeholders = ", ".join("?" * len(self.layout.fieldnames))
+        self._insert_sql = f"INSERT INTO {_quote(self.table)} VALUES ({placeholders})"
+        # Indexes of the date and datetime fields, stored as ISO text
+        self._date_indexes = [
+            index
+            for index, name in enumerate(self.layout.fieldnames)
+            if isinstance(self.layout.types.get(name), type) and issubclass(self.layout.types[name], date)
+        ]
+        self._rows: List[List] = []
+        self._connection: sqlite3.Connection = None
+
+    def _buffer(self, rows: List[List]):
+        for index in self._date_indexes:
+            for row in rows:
+                value = row[index]
+                if isinstance(value, date):
+                    row[index] = value.isoformat(" ") if isinstance(value, datetime) else value.isoformat()
+        self._rows.extend(rows)
+
+    def _buffer_size(self) -> int:
+        return len(self._rows)
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # The writes run in executor threads, one at a time
+        connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        try:
+            connection.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode, a commit is durable once the log is synced at a checkpoint
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                connection.execute(self._create_sql)
+        except Exception:
+            connection.close()
+            raise
+        self._connection = connection
+
+    def _write_buffer(self):
+        if self._connection is None:
+            self._open()
+        # Commits on success, rolls back and keeps the rows buffered on failure
+        with self._connection:
+            self._connection.executemany(self._insert_sql, self._rows)
+        self._rows = []
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
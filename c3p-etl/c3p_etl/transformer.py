@@ -1,22 +1,28 @@
 #!/usr/bin/env python3
 import asyncio
-from asyncio import CancelledError
+from asyncio import CancelledError, FIRST_COMPLETED
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-import re
 import json
 
 import logging
 from logging.handlers import RotatingFileHandler
 
 from pathlib import Path
-
-from datetime import datetime
+from typing import Deque, Dict, List, Sequence, Tuple
 
 from c3p_core import service
 from c3p_core.stream import Producer, Consumer, Message
 
+from c3p_etl import DEFAULT_BATCH_SIZE
+from c3p_etl.columnar import ColumnarPlan
+from c3p_etl.deadletter import DeadLetterFile, DeadLetterStream, RejectCounters, Rejected
+from c3p_etl.functions import convert_to_float_with_two_decimals  # noqa: F401
+from c3p_etl.plan import TransformationPlan, compile_transformations
+from c3p_etl.registry import FunctionRegistry, create_registry
+
 from c3p_model.order import Order
-from c3p_model.weight_unit import WeightUnit
 
 logging.basicConfig(
     handlers=[
@@ -34,62 +40,119 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def parse_int(value):
-    return int(value)
-
-
-def parse_date(year, month, day):
-    return datetime(int(year), int(month), int(day)).strftime(
-        "%Y-%m-%d %H:%M:%S"
-    )
-
+def transform_order_rows(
+    plan: TransformationPlan, columnar_plan: ColumnarPlan, rows: List, columns: Sequence[str] = None
+) -> Tuple[List[Order], List[Rejected]]:
+    """Transform the rows into orders, returning the orders and the rejected rows.
 
-def parse_str(value):
-    return str(value)
+    The rows are dicts, or with columns, lists of values in the order of columns.
+    """
+    if columns is not None:
+        plan = plan.for_columns(columns)
+    if columnar_plan is not None:
+        try:
+            return columnar_plan(rows, columns).to_records(), []
+        except Exception:
+            # Transform the rows one at a time to reject only the invalid ones
+            pass
 
+    orders = []
+    rejected = []
+    for row in rows:
+        try:
+            orders.append(plan(row))
+        except Exception as ex:
+            step, step_ex = plan.failing_step(row)
+            rejected.append(Rejected.of("OrderRow", row, columns, step, step_ex or ex))
+    return orders, rejected
 
-def parse_float(value):
-    return float(value)
 
+# The plans of a worker process, compiled once by _init_worker
+_worker_plans: Tuple[TransformationPlan, ColumnarPlan] = None
 
-def proper_case(value):
-    tokens = value.split(" ")
-    return "".join(w[0].upper() + w[1:] for w in tokens)
 
+def _init_worker(
+    transformations: List[dict], mode: str, cache_size: int = 0, function_modules: Sequence[str] = (), use_entry_points: bool = True
+):
+    global _worker_plans
+    # The functions are not timed in the worker processes
+    registry = create_registry(function_modules, use_entry_points, timing=False)
+    plan = compile_transformations(transformations, Order, registry.funcs, cache_size)
+    _worker_plans = (plan, ColumnarPlan(plan) if mode == "columnar" else None)
 
-def add_weight_unit(value):
-    return WeightUnit(value.lower())
 
-
-def convert_to_float_with_two_decimals(string):
-    # Use regular expression to extract the numeric part from the string
-    numeric_part = re.sub(r"[^0-9.]", "", string)
-
-    # Convert the numeric part to a float with two decimals
-    float_value = round(float(numeric_part), 2)
-    return float_value
+def _transform_order_rows_in_worker(rows: List, columns: Sequence[str] = None) -> Tuple[List[Order], List[Rejected]]:
+    return transform_order_rows(*_worker_plans, rows, columns)
 
 
 class Transformer(service.Service):
-    def __init__(self, consumer: Consumer, producer: Producer):
+    def __init__(self, consumer: Consumer, producer: Producer, batch_size: int = None, dead_letter_producer: Producer = None):
         super().__init__()
 
         self._consumer = consumer
         self._producer = producer
+        self.batch_size = batch_size or service.get_setting("crisp.batch_size", DEFAULT_BATCH_SIZE)
         self._transformations = self._load_transformations()
 
         self._entities = {
-            "OrderRow": self._transform_order_row,
-            "ProductRow": self._transform_product_row,
+            "OrderRow": self._transform_order_rows,
+            "ProductRow": self._transform_product_rows,
         }
 
         self._counters = {
             entity_name: 0 for entity_name in self._entities.keys()
         }
 
-        self._transform_funcs = {
-            "convert_to_float_with_two_decimals": convert_to_float_with_two_decimals
-        }
+        # The transform functions: the built-in ones, the ones of the modules of function_modules
+        # and of the c3p_etl.transform_functions entry points. With timing, their calls are timed.
+        self._function_modules = service.get_setting("crisp.transformer.function_modules", [])
+        self._use_entry_points = service.get_setting("crisp.transformer.entry_points", True)
+        self._registry: FunctionRegistry = create_registry(
+            self._function_modules,
+            use_entry_points=self._use_entry_points,
+            timing=service.get_setting("crisp.transformer.timing", True),
+        )
+        self._transform_funcs = self._registry.funcs
+
+        # Validate and compile the transformations once, instead of interpreting them for every row
+        # The results of the cacheable functions are cached, up to cache_size per rule
+        self._cache_size = service.get_setting("crisp.transformer.cache_size", 4096)
+        self._plan = compile_transformations(self._transformations, Order, self._transform_funcs, self._cache_size)
+
+        # In columnar mode, the rules are applied to whole columns of a batch of rows
+        mode = service.get_setting("crisp.transformer.mode", "row")
+        if mode not in ("row", "columnar"):
+            raise ValueError(f"Unsupported transformer mode: {mode}")
+        self._mode = mode
+        self._columnar_plan = ColumnarPlan(self._plan) if mode == "columnar" else None
+
+        # With workers, order rows are transformed in a pool of processes.
+        # Each batch is one task, up to max_pending batches are in flight.
+        self._workers = service.get_setting("crisp.transformer.workers", 0)
+        self._ordered = service.get_setting("crisp.transformer.ordered", True)
+        self._max_pending = service.get_setting("crisp.transformer.max_pending", 2 * self._workers)
+        self._pool: ProcessPoolExecutor = None
+        # Futures of the batches being transformed by the pool, in submission order
+        self._pending: Deque[asyncio.Future] = deque()
+        # Last message received, acked once the entities of all the messages received are sent
+        self._unacked: Message = None
+        # Cache counters and function calls last logged. The ones of the worker processes are not logged.
+        self._last_cache_info = {}
+        self._last_calls: Dict[str, int] = {}
+
+        # The rejected rows, with the failing rule and exception, go to the dead-letter stream if any,
+        # or else are appended to a JSON lines file. They are counted, and the counts logged periodically.
+        if dead_letter_producer is not None:
+            self._dead_letter = DeadLetterStream(dead_letter_producer)
+        else:
+            data_dir = Path(service.get_setting("crisp.data_dir", "."))
+            self._dead_letter = DeadLetterFile(
+                Path(service.get_setting("crisp.transformer.dead_letter.path", data_dir / "dead_letter" / "orderrow.jsonl")),
+                flush_rows=service.get_setting("crisp.transformer.dead_letter.flush_rows", 1000),
+            )
+        self._rejects = RejectCounters()
+        # Rejected rows not handed to the dead letter yet
+        self._rejected: List[Rejected] = []
 
     async def _log_health_check(self):
         while True:
@@ -100,6 +163,31 @@ class Transformer(service.Service):
                         f"Received since last check: {counter} {entity_name}"
                     )
                     self._counters[entity_name] = 0
+            self._log_rejects()
+            self._log_cache_info()
+            self._log_function_stats()
+
+    def _log_rejects(self):
+        """Log the rows rejected since the last check, counted by target column and exception type."""
+        for (entity_name, target_column, error_type), count, error in self._rejects.take():
+            logger.warning(
+                f"Rejected since last check: {count} {entity_name} at {target_column or 'the record'}, {error_type}: {error}"
+            )
+
+    def _log_cache_info(self):
+        """Log the hits and misses of the caches of the rules, when they changed."""
+        cache_info = self._plan.cache_info()
+        if cache_info != self._last_cache_info:
+            for target_column, info in cache_info.items():
+                logger.debug(f"Cache of {target_column}: {info.hits} hits, {info.misses} misses, {info.currsize}/{info.maxsize}")
+            self._last_cache_info = cache_info
+
+    def _log_function_stats(self):
+        """Log the cumulative calls and time of the transform functions called since the last check."""
+        for name, stats in self._registry.stats.items():
+            if stats.calls != self._last_calls.get(name, 0):
+                logger.debug(f"Function {name}: {stats.calls} calls, {stats.seconds:.3f} s")
+                self._last_calls[name] = stats.calls
 
     def _load_transformations(self):
         with open(Path(service.ENV.crisp.transformations_file), "r") as f:
@@ -108,85 +196,169 @@ class Transformer(service.Service):
     async def run(self):
         asyncio.ensure_future(self._log_health_check())
 
-        msg: Message
-        async for msg in self._consumer:
+        if self._workers:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self._workers,
+                initializer=_init_worker,
+                initargs=(self._transformations, self._mode, self._cache_size, self._function_modules, self._use_entry_points),
+            )
+        try:
+            await self._run()
+            # Wait for the batches still being transformed
+            await self._send_pending(0)
+            await self._ack_sent()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
             try:
-                props = msg.properties
-                msg_type = props.get("type")
-
-                if msg_type == "add":
-                    entity_type = props.get("entity")
-                    if entity_type not in self._entities.keys():
-                        logger.warn(
-                            f"Received unknown entity type: {entity_type}"
-                        )
-                        continue
+                await self._write_rejected()
+                await self._dead_letter.close()
+            finally:
+                self._log_rejects()
 
-                    self._counters[entity_type] += 1
-                    await self._entities[entity_type](msg.value)
-
-                elif msg_type == "end_of_stream":
-                    return
+    async def _run(self):
+        while True:
+            try:
+                # Don't wait for new messages forever while transformed batches are pending
+                timeout = 0.1 if self._pending else None
+                messages = await self._consumer.getmany(max_records=self.batch_size, timeout=timeout)
+            except StopAsyncIteration:
+                return
+
+            # Consecutive runs of rows of the same entity type and columns, in input order
+            batches: List[Tuple[str, List[str], List]] = []
+            end_of_stream = False
+
+            msg: Message
+            for msg in messages:
+                try:
+                    props = msg.properties
+                    msg_type = props.get("type")
+
+                    if msg_type == "add":
+                        entity_type = props.get("entity")
+                        if entity_type not in self._entities.keys():
+                            logger.warn(
+                                f"Received unknown entity type: {entity_type}"
+                            )
+                            continue
+
+                        self._counters[entity_type] += 1
+                        # Rows are dicts, or lists of values whose column names are in the properties
+                        columns = props.get("columns")
+                        if not batches or batches[-1][0] != entity_type or batches[-1][1] != columns:
+                            batches.append((entity_type, columns, []))
+                        batches[-1][2].append(msg.value)
+
+                    elif msg_type == "end_of_stream":
+                        end_of_stream = True
+                        break
+
+                    else:
+                        logger.warning(
+                            f"Received unsupported message type: {msg_type}"
+                        )
 
-                else:
-                    logger.warning(
-                        f"Received unsupported message type: {msg_type}"
+                except Exception as ex:
+                    if isinstance(ex, CancelledError):
+                        raise
+                    else:
+                        logger.error(ex)
+
+            for entity_type, columns, rows in batches:
+                if self._pool is not None and entity_type == "OrderRow":
+                    loop = asyncio.get_event_loop()
+                    self._pending.append(
+                        loop.run_in_executor(self._pool, _transform_order_rows_in_worker, rows, columns)
                     )
-
-            except Exception as ex:
-                if isinstance(ex, CancelledError):
-                    raise
-                else:
-                    logger.error(ex)
-
-    async def _transform_order_row(self, row: dict):
-        order: Order = Order()
-        for transformation in self._transformations:
-            if "rename" in transformation:
-                source_col = transformation["rename"]["source_column"]
-                target_col = transformation["rename"]["target_column"]
-                data_type = transformation["rename"]["data_type"]
-                if data_type == "int":
-                    setattr(order, target_col, parse_int(row[source_col]))
-                elif data_type == "str":
-                    setattr(order, target_col, parse_str(row[source_col]))
-                elif data_type == "float":
-                    setattr(order, target_col, parse_float(row[source_col]))
-            elif "transform" in transformation:
-                source_col = transformation["transform"]["source_column"]
-                target_col = transformation["transform"]["target_column"]
-                transform_func = transformation["transform"]["func"]
-                setattr(
-                    order,
-                    target_col,
-                    self._transform_funcs[transform_func](row[source_col]),
-                )
-            elif "concatenate_date" in transformation:
-                year_col = transformation["concatenate_date"]["year_column"]
-                month_col = transformation["concatenate_date"]["month_column"]
-                day_col = transformation["concatenate_date"]["day_column"]
-                target_col = transformation["concatenate_date"]["target_column"]
-                setattr(
-                    order,
-                    target_col,
-                    parse_date(
-                        row[year_col],
-                        row[month_col],
-                        row[day_col],
-                    ),
-                )
-            elif "proper_case" in transformation:
-                source_col = transformation["proper_case"]["source_column"]
-                target_col = transformation["proper_case"]["target_column"]
-                setattr(order, target_col, proper_case(row[source_col]))
-            elif "add_weight_value" in transformation:
-                target_col = transformation["add_weight_value"]["target_column"]
-                value = transformation["add_weight_value"]["value"]
-                setattr(order, target_col, add_weight_unit(value))
-
-        await self._producer.send_async(
-            order, properties={"type": "add", "entity": "Order"}
-        )
-
-    async def _transform_product_row(self, row: dict):
-        logger.info(f"TODO. Implement transformation for {row}")
+                    continue
+                try:
+                    await self._send(self._entities[entity_type](rows, columns))
+                except Exception as ex:
+                    if isinstance(ex, CancelledError):
+                        raise
+                    else:
+                        logger.error(f"Failed to transform {len(rows)} {entity_type}: {ex}")
+
+            if messages:
+                self._unacked = messages[-1]
+            await self._send_pending(self._max_pending)
+            await self._ack_sent()
+
+            if end_of_stream:
+                return
+
+    async def _ack_sent(self):
+        """Ack the last message received if none of the batches is still being transformed.
+
+        Acks are cumulative: after a restart, a durable stream replays the messages from there.
+        The rejected rows are written to the dead letter first, so that none is lost.
+        """
+        if self._unacked is not None and not self._pending:
+            await self._write_rejected()
+            await self._dead_letter.flush()
+            self._consumer.ack(self._unacked)
+            self._unacked = None
+
+    def _reject(self, rejected: List[Rejected]):
+        if rejected:
+            self._rejects.add(rejected)
+            self._rejected.extend(rejected)
+
+    async def _write_rejected(self):
+        """Hand the rejected rows to the dead letter, which writes them in batches."""
+        if self._rejected:
+            rejected, self._rejected = self._rejected, []
+            await self._dead_letter.write(rejected)
+
+    async def _send(self, entities: List):
+        if entities:
+            entity_name = type(entities[0]).__name__
+            await self._producer.send_batch_async(
+                entities, properties={"type": "add", "entity": entity_name}
+            )
+
+    async def _send_pending(self, max_pending: int):
+        """Send the batches transformed by the pool, waiting until at most max_pending are left.
+
+        When ordered, the batches are sent in the order they were received.
+        """
+        while self._pending:
+            if self._ordered:
+                if len(self._pending) <= max_pending and not self._pending[0].done():
+                    return
+                done = [self._pending.popleft()]
+            else:
+                done = [future for future in self._pending if future.done()]
+                if len(self._pending) > max_pending and not done:
+                    finished, _ = await asyncio.wait(self._pending, return_when=FIRST_COMPLETED)
+                    done = list(finished)
+                if not done:
+                    return
+                for future in done:
+                    self._pending.remove(future)
+
+            for future in done:
+                try:
+                    orders, rejected = await future
+                    self._reject(rejected)
+                    await self._send(orders)
+                except Exception as ex:
+                    if isinstance(ex, CancelledError):
+                        raise
+                    else:
+                        logger.error(f"Failed to transform a batch of OrderRow: {ex}")
+
+    def _transform_order_rows(self, rows: List, columns: Sequence[str] = None) -> List[Order]:
+        orders, rejected = transform_order_rows(self._plan, self._columnar_plan, rows, columns)
+        self._reject(rejected)
+        return orders
+
+    def _transform_order_row(self, row: dict) -> Order:
+        return self._plan(row)
+
+    def _transform_product_rows(self, rows: List, columns: Sequence[str] = None) -> List:
+        for row in rows:
+            logger.info(f"TODO. Implement transformation for {row}")
+        return []
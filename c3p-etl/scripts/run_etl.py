@@ -1,12 +1,16 @@
 #!/usr/bin/env python3
 
 import argparse
+import asyncio
+import multiprocessing
 
-from c3p_core.stream.schema import PickleSchema
+from pathlib import Path
+
+from c3p_core.stream.schema import PassthroughSchema, PickleSchema, StructSchema
 
 from c3p_core import service
 
-import c3p_core.stream.stub as sstream
+from c3p_core.stream import Type, create_stream
 
 from c3p_etl.extracter import Extracter
 from c3p_etl.transformer import Transformer
@@ -35,47 +39,147 @@ args = parser.parse_args()
 
 service.load_configuration(args.config_file)
 
+# Type of the streams between the services
+stream_type = Type.from_string(service.get_setting("crisp.stream.type", "STUB"))
+
+# Schema of the Order messages: PICKLE or STRUCT, a compact binary layout derived from the dataclass
+order_schema_type = service.get_setting("crisp.stream.order_schema", "PICKLE")
+if order_schema_type not in ("PICKLE", "STRUCT"):
+    raise ValueError(f"Unsupported order schema: {order_schema_type}")
+
+# The services share this process: the streams can hand the objects through without encoding them
+passthrough = service.get_setting("crisp.stream.passthrough", False)
+copy_on_fan_out = service.get_setting("crisp.stream.copy_on_fan_out", False)
+if passthrough and stream_type in (Type.FILE, Type.PROCESS):
+    raise ValueError(f"The {stream_type} streams carry encoded messages, they can't pass the objects through")
+
+# Replicas of the transformer share the partitions of the OrderRow stream
+transformer_replicas = service.get_setting("crisp.transformer.replicas", 1)
+if transformer_replicas > 1 and stream_type not in (Type.STUB, Type.MEMORY):
+    raise ValueError(f"The {stream_type} streams have no consumer groups, the transformer can't be replicated")
+
+if stream_type == Type.FILE:
+    # Durable streams: the consumers resume from their last ack after a restart
+    stream_options = {
+        "directory": service.get_setting("crisp.stream.directory", str(Path(service.ENV.crisp.data_dir) / "streams")),
+        "segment_bytes": service.get_setting("crisp.stream.segment_bytes", 64 << 20),
+        "fsync": service.get_setting("crisp.stream.fsync", False),
+    }
+elif stream_type == Type.PROCESS:
+    # Each service runs in its own process, the streams are ring buffers in shared memory
+    stream_options = {
+        "capacity_bytes": service.get_setting("crisp.stream.capacity_bytes", 16 << 20),
+        "transport": service.get_setting("crisp.stream.transport"),
+    }
+else:
+    # Bounds of the consumers' queues, so that a slow consumer holds back its producer
+    stream_options = {
+        "capacity": service.get_setting("crisp.stream.capacity"),
+        "capacity_bytes": service.get_setting("crisp.stream.capacity_bytes"),
+        "partitions": service.get_setting("crisp.stream.partitions", transformer_replicas),
+    }
+
+
+def run_stage(create_stage):
+    """Run the service returned by create_stage in this child process, then close its endpoints."""
+    # The event loop of the parent process can't be shared
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    manager = service.ServiceManager()
+    stage_service, endpoints = create_stage()
+    try:
+        manager.register(stage_service)
+        manager.start()
+    finally:
+        for endpoint in endpoints:
+            endpoint.close()
+
+
+def extracter_stage():
+    producer = e2t_stream.create_producer()
+    return Extracter(producer=producer), [producer]
+
+
+def transformer_stage():
+    consumer = e2t_stream.create_consumer("transformer")
+    producer = t2l_stream.create_producer()
+    return Transformer(consumer, producer), [producer, consumer]
+
+
+def loader_stage():
+    consumer = t2l_stream.create_consumer("loader")
+    return Loader(consumer), [consumer]
+
+
 e2t_stream = None
-e2t_producer = e2t_consumer = None
+e2t_producer = None
+e2t_consumers = []
 t2l_stream = None
 t2l_producer = t2l_consumer = None
 try:
+    # The consumers of the PROCESS streams are declared before the processes are started
+    e2t_options = dict(stream_options, consumers=("transformer",)) if stream_type == Type.PROCESS else stream_options
+    t2l_options = dict(stream_options, consumers=("loader",)) if stream_type == Type.PROCESS else stream_options
+
     # Create the extracter with its output stream
-    e2t_stream = sstream.Stream(
+    e2t_stream = create_stream(
+        stream_type,
         topic="OrderRow",
-        schema=PickleSchema(dict),
+        schema=PassthroughSchema(list, copy_on_fan_out) if passthrough else PickleSchema(list),
+        **e2t_options,
     )
-    e2t_producer = e2t_stream.create_producer()
-
-    extracter = Extracter(producer=e2t_producer)
-    service.SERVICES.register(extracter)
 
-    # Create the transformer
-    e2t_consumer = e2t_stream.create_consumer("transformer")
-
-    t2l_stream = sstream.Stream(
+    t2l_stream = create_stream(
+        stream_type,
         topic=Order.__name__.lower(),
-        schema=PickleSchema(Order),
+        schema=(
+            PassthroughSchema(Order, copy_on_fan_out)
+            if passthrough
+            else StructSchema(Order) if order_schema_type == "STRUCT" else PickleSchema(Order)
+        ),
+        **t2l_options,
     )
-    t2l_producer = t2l_stream.create_producer()
 
-    transformer = Transformer(e2t_consumer, t2l_producer)
-    service.SERVICES.register(transformer)
+    if stream_type == Type.PROCESS:
+        # The child processes inherit the streams, the stage functions are not pickled
+        context = multiprocessing.get_context("fork")
+        processes = [
+            context.Process(target=run_stage, args=(stage,), name=stage.__name__)
+            for stage in (extracter_stage, transformer_stage, loader_stage)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    else:
+        e2t_producer = e2t_stream.create_producer()
+
+        extracter = Extracter(producer=e2t_producer)
+        service.SERVICES.register(extracter)
+
+        # Create the transformers, members of the same consumer group
+        t2l_producer = t2l_stream.create_producer()
+        for index in range(transformer_replicas):
+            suffix = str(index) if transformer_replicas > 1 else ""
+            e2t_consumers.append(e2t_stream.create_consumer("transformer" + suffix, group="transformer"))
+
+            transformer = Transformer(e2t_consumers[-1], t2l_producer)
+            service.SERVICES.register(transformer, name="Transformer" + suffix)
 
-    # Create the loader
-    t2l_consumer = t2l_stream.create_consumer("loader")
+        # Create the loader
+        t2l_consumer = t2l_stream.create_consumer("loader")
 
-    loader = Loader(t2l_consumer)
-    service.SERVICES.register(loader)
+        loader = Loader(t2l_consumer)
+        service.SERVICES.register(loader)
 
-    # Start the services
-    service.SERVICES.start()
+        # Start the services
+        service.SERVICES.start()
 
 finally:
     if e2t_producer is not None:
         e2t_producer.close()
 
-    if e2t_consumer is not None:
+    for e2t_consumer in e2t_consumers:
         e2t_consumer.close()
 
     if e2t_stream is not None:
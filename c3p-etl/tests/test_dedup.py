@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+from pathlib import Path
+import tempfile
+import unittest
+
+from c3p_etl.dedup import Deduplicator, KeyIndex, key_of
+
+from c3p_model.order import Order
+
+
+class TestKeyIndex(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self._tmp_dir.name) / "dedup"
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def test_key_of(self):
+        self.assertEqual(42, key_of(42))
+        self.assertEqual(key_of("P-10001"), key_of("P-10001"))
+        self.assertNotEqual(key_of("P-10001"), key_of("P-10002"))
+        self.assertLess(abs(key_of(1 << 70)), 1 << 63)
+
+    def test_survives_restarts(self):
+        index = KeyIndex(self.directory, merge_keys=4)
+        index.add([5, 3, 3])
+        self.assertIn(3, index)
+        self.assertNotIn(4, index)
+        index.close()
+
+        # The journal is reloaded
+        index = KeyIndex(self.directory, merge_keys=4)
+        self.assertEqual(2, len(index))
+        index.add([1, 9])
+        # Merged into the sorted keys once the journal holds merge_keys keys
+        self.assertEqual([1, 3, 5, 9], list(index._sorted))
+        self.assertEqual(0, (self.directory / "keys.journal").stat().st_size)
+        index.add([7])
+        index.close()
+
+        index = KeyIndex(self.directory)
+        self.assertEqual([1, 3, 5, 7, 9], sorted(key for key in range(10) if key in index))
+        index.close()
+
+    def test_torn_journal(self):
+        index = KeyIndex(self.directory)
+        index.add([1, 2])
+        index.close()
+        with open(self.directory / "keys.journal", "ab") as file:
+            file.write(b"\x03\x00")
+
+        index = KeyIndex(self.directory)
+        self.assertEqual(2, len(index))
+        index.add([3])
+        index.close()
+        self.assertEqual(3, len(KeyIndex(self.directory)))
+
+
+class TestDeduplicator(unittest.TestCase):
+    def test_filter(self):
+        with tempfile.TemporaryDirectory() as directory:
+            deduplicator = Deduplicator("OrderID", KeyIndex(Path(directory)))
+            orders = [Order(OrderID=1), Order(OrderID=2), Order(OrderID=1)]
+            self.assertEqual(orders[:2], deduplicator.filter(orders))
+            # The keys are recorded on commit, they are pending meanwhile
+            self.assertEqual(0, len(deduplicator.index))
+            self.assertEqual(["not an order"], deduplicator.filter([Order(OrderID=2), "not an order"]))
+            deduplicator.commit()
+            self.assertEqual(2, len(deduplicator.index))
+            self.assertEqual([Order(OrderID=3)], deduplicator.filter([Order(OrderID=1), Order(OrderID=3)]))
+            self.assertEqual(3, deduplicator.duplicates)
+            deduplicator.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
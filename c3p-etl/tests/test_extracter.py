@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import gzip
+import json
+import os
+from pathlib import Path
+import tempfile
+import unittest
+
+from c3p_core import service
+from c3p_core.stream import Producer
+
+from c3p_etl.compression import COMPRESSIONS, zstandard
+from c3p_etl.extracter import Extracter
+
+
+class RecordingProducer(Producer):
+    """Keep the batches sent, to check where the batch boundaries are."""
+
+    def __init__(self):
+        self.batches = []
+
+    async def send_async(self, value, key=None, properties=None, timestamp=None):
+        self.batches.append(([value], properties))
+
+    async def send_batch_async(self, values, key=None, properties=None, timestamp=None):
+        self.batches.append((list(values), properties))
+
+    def close(self):
+        pass
+
+
+class TestExtracter(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+        service.ENV = service.configuration.namespace_it_deep(
+            {"crisp": {"data_dir": str(self.tmp_dir / "data"), "batch_size": 2}}, {}
+        )
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def write_csv(self, nb_rows, name="order_test.csv"):
+        path = self.tmp_dir / name
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["Order Number", "Product Name"])
+            for i in range(nb_rows):
+                writer.writerow([i, f"{name} {i}"])
+        return path
+
+    def extract_files(self, extracter, paths):
+        async def extract():
+            extracter._start_workers()
+            for path in paths:
+                extracter.submit(str(path))
+            await extracter._queue.join()
+            extracter._stop_workers()
+
+        asyncio.get_event_loop().run_until_complete(extract())
+
+    @staticmethod
+    def sources(batches):
+        return [rows[0][1].split()[0] for rows, _ in batches]
+
+    def test_extract_batches(self):
+        producer = RecordingProducer()
+        extracter = Extracter(producer=producer)
+        asyncio.get_event_loop().run_until_complete(extracter.extract(self.write_csv(5)))
+
+        # The trailing partial batch is sent too
+        self.assertEqual([2, 2, 1], [len(rows) for rows, _ in producer.batches])
+        # The rows are lists of values, the column names are in the properties
+        self.assertEqual(
+            [[str(i), f"order_test.csv {i}"] for i in range(5)],
+            [row for rows, _ in producer.batches for row in rows],
+        )
+        for _, properties in producer.batches:
+            self.assertEqual({"type": "add", "entity": "OrderRow", "columns": ["Order Number", "Product Name"]}, properties)
+
+    def test_extract_full_batches(self):
+        producer = RecordingProducer()
+        extracter = Extracter(producer=producer, batch_size=3)
+        asyncio.get_event_loop().run_until_complete(extracter.extract(self.write_csv(6)))
+
+        self.assertEqual([3, 3], [len(rows) for rows, _ in producer.batches])
+
+    def test_extract_files_smallest_first(self):
+        producer = RecordingProducer()
+        extracter = Extracter(producer=producer)
+        extracter.concurrency = 1
+        paths = [self.write_csv(4, "large.csv"), self.write_csv(1, "small.csv")]
+        self.extract_files(extracter, paths)
+
+        self.assertEqual(["small.csv", "large.csv", "large.csv"], self.sources(producer.batches))
+        # The extracted files are moved to the bak folder
+        self.assertEqual(["large.csv", "small.csv"], sorted(os.listdir(extracter.source_bak_data_dir)))
+        self.assertFalse(any(path.exists() for path in paths))
+
+    def test_extract_files_concurrently(self):
+        producer = RecordingProducer()
+        extracter = Extracter(producer=producer)
+        extracter.concurrency = 2
+        paths = [self.write_csv(6, "a.csv"), self.write_csv(6, "b.csv"), self.write_csv(2, "missing.csv")]
+        paths[2].unlink()
+        # A single reading thread runs the reads of the files in turn, for a deterministic order
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            extracter.read_executor = executor
+            self.extract_files(extracter, paths)
+
+        # The batches of the files extracted at the same time are interleaved
+        self.assertEqual(["a.csv", "b.csv"] * 3, self.sources(producer.batches))
+
+    def test_read_blocks(self):
+        path = self.tmp_dir / "irregular.csv"
+        path.write_text('Order Number,Product Name\n1,"multi\nline"\n\n2\n3,box,extra\n')
+
+        async def read(extracter):
+            return [block async for block in extracter.read(path)]
+
+        for use_mmap in (False, True):
+            with self.subTest(use_mmap=use_mmap):
+                extracter = Extracter(producer=RecordingProducer())
+                extracter.use_mmap = use_mmap
+                blocks = asyncio.get_event_loop().run_until_complete(read(extracter))
+
+                # Like csv.DictReader: blank lines are skipped, short rows padded with None, long ones cut
+                self.assertEqual([["1", "multi\nline"], ["2", None]], blocks[0].rows)
+                self.assertEqual([["3", "box"]], blocks[1].rows)
+                self.assertEqual(["Order Number", "Product Name"], blocks[1].columns)
+
+    def test_extract_projection(self):
+        path = self.tmp_dir / "wide.csv"
+        path.write_text("Extra Col1,Product Name,Order Number,Empty Column\nx,box,1,\ny,bag\n")
+        transformations_file = self.tmp_dir / "transformations.json"
+        transformations_file.write_text(
+            json.dumps(
+                [
+                    {"rename": {"source_column": "Order Number", "target_column": "OrderID", "data_type": "int"}},
+                    {"proper_case": {"source_column": "Product Name", "target_column": "ProductName"}},
+                    {"rename": {"source_column": "Count", "target_column": "Quantity", "data_type": "float"}},
+                ]
+            )
+        )
+        service.ENV.crisp.transformations_file = str(transformations_file)
+
+        producer = RecordingProducer()
+        extracter = Extracter(producer=producer)
+        self.assertEqual(["Order Number", "Product Name", "Count"], extracter.columns)
+        asyncio.get_event_loop().run_until_complete(extracter.extract(path))
+
+        # Only the columns used by the transformations are sent, in the order of the file.
+        # The file has no Count column, the transformer rejects its rows.
+        properties = {"type": "add", "entity": "OrderRow", "columns": ["Product Name", "Order Number"]}
+        self.assertEqual([([["box", "1"], ["bag", None]], properties)], producer.batches)
+
+        service.ENV.crisp.extracter = service.configuration.namespace_it_deep({"projection": False}, {})
+        producer = RecordingProducer()
+        asyncio.get_event_loop().run_until_complete(Extracter(producer=producer).extract(path))
+        self.assertEqual(["Extra Col1", "Product Name", "Order Number", "Empty Column"], producer.batches[0][1]["columns"])
+
+    def test_read_split(self):
+        path = self.tmp_dir / "large.csv"
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["Order Number", "Product Name"])
+            for i in range(200):
+                # Line breaks and quotes within the fields, which must not split a record
+                writer.writerow([i, f'box "{i}"\nline' if i % 3 else f"box {i}"])
+            file.write("\n200\n")
+
+        async def read(extracter):
+            return [block async for block in extracter.read(path)]
+
+        expected = asyncio.get_event_loop().run_until_complete(read(Extracter(producer=RecordingProducer())))
+        expected_rows = [row for block in expected for row in block.rows]
+        self.assertEqual(["200", None], expected_rows[-1])
+
+        for ordered in (True, False):
+            with self.subTest(ordered=ordered):
+                with Extracter(producer=RecordingProducer()) as extracter:
+                    extracter.split_workers = 2
+                    extracter.split_bytes = 100
+                    extracter.split_ordered = ordered
+                    blocks = asyncio.get_event_loop().run_until_complete(read(extracter))
+
+                rows = [row for block in blocks for row in block.rows]
+                if ordered:
+                    self.assertEqual(expected_rows, rows)
+                    # The blocks are full across the ranges
+                    self.assertEqual([len(block.rows) for block in expected], [len(block.rows) for block in blocks])
+                else:
+                    self.assertEqual(sorted(expected_rows, key=str), sorted(rows, key=str))
+                self.assertEqual(["Order Number", "Product Name"], blocks[0].columns)
+
+    def test_read_compressed(self):
+        source = self.write_csv(5)
+
+        async def read(path):
+            return [row async for block in Extracter(producer=RecordingProducer()).read(path) for row in block.rows]
+
+        expected = asyncio.get_event_loop().run_until_complete(read(source))
+        for compression in COMPRESSIONS.values():
+            if compression.name == "zstd" and zstandard is None:
+                continue
+            # Detected from the extension, or else the first bytes
+            for name in (f"order.csv{compression.extension}", f"{compression.name}.csv"):
+                with self.subTest(compression=compression.name, name=name):
+                    path = self.tmp_dir / name
+                    with compression.open(path, "wb") as file:
+                        file.write(source.read_bytes())
+                    self.assertEqual(expected, asyncio.get_event_loop().run_until_complete(read(path)))
+
+    def test_backup_compressed(self):
+        service.ENV.crisp.extracter = service.configuration.namespace_it_deep({"bak_compression": "gzip"}, {})
+        extracter = Extracter(producer=RecordingProducer())
+        paths = [self.write_csv(3, "plain.csv"), self.tmp_dir / "compressed.csv.gz"]
+        with gzip.open(paths[1], "wb") as file:
+            file.write(paths[0].read_bytes())
+        expected = paths[0].read_bytes()
+        self.extract_files(extracter, paths)
+
+        # The plain file is compressed, the compressed one is moved as is
+        self.assertEqual(["compressed.csv.gz", "plain.csv.gz"], sorted(os.listdir(extracter.source_bak_data_dir)))
+        with gzip.open(extracter.source_bak_data_dir / "plain.csv.gz", "rb") as file:
+            self.assertEqual(expected, file.read())
+        self.assertFalse(any(path.exists() for path in paths))
+
+
+if __name__ == "__main__":
+    unittest.main()
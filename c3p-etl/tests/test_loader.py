@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+import asyncio
+import csv
+from pathlib import Path
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from c3p_core import service
+from c3p_core.stream.schema import PickleSchema
+import c3p_core.stream.file as fstream
+import c3p_core.stream.stub as sstream
+
+from c3p_etl.loader import Loader
+from c3p_etl.sink import CsvSink
+from c3p_etl.sink.arrowsink import pa
+
+from c3p_model.order import Order
+from c3p_model.weight_unit import WeightUnit
+
+
+class TestLoader(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self._tmp_dir.name)
+        service.ENV = service.configuration.namespace_it_deep(
+            {"crisp": {"data_dir": str(self.data_dir), "batch_size": 100}}, {}
+        )
+        sstream.Stream("TestLoaderOrder", PickleSchema(object)).reset()
+        # Accept any object, to check how the loader deals with invalid entities
+        self.stream = sstream.Stream("TestLoaderOrder", PickleSchema(object))
+        self.producer = self.stream.create_producer()
+        self.loader = Loader(self.stream.create_consumer("loader"))
+
+    def tearDown(self):
+        self.stream.reset()
+        self._tmp_dir.cleanup()
+
+    def read_orders(self):
+        with open(self.data_dir / "target" / "order.csv", newline="") as file:
+            return list(csv.DictReader(file))
+
+    def test_run_stops_at_end_of_stream(self):
+        loop = asyncio.get_event_loop()
+        properties = {"type": "add", "entity": "Order"}
+        loop.run_until_complete(self.producer.send_batch_async([Order(OrderID=i) for i in range(3)], properties=properties))
+        loop.run_until_complete(self.producer.send_async(None, properties={"type": "end_of_stream"}))
+        loop.run_until_complete(self.producer.send_batch_async([Order(OrderID=i) for i in range(3, 5)], properties=properties))
+
+        loop.run_until_complete(self.loader.run())
+
+        orders = self.read_orders()
+        self.assertEqual(["0", "1", "2"], [order["OrderID"] for order in orders])
+        self.assertEqual(WeightUnit.Unknown.value, orders[0]["Unit"])
+
+    def test_run_skips_rejected_rows(self):
+        loop = asyncio.get_event_loop()
+        orders = ["not an order", Order(OrderID=0), Order(OrderID=2)]
+        loop.run_until_complete(self.producer.send_batch_async(orders, properties={"type": "add", "entity": "Order"}))
+        self.producer.close()
+
+        loop.run_until_complete(self.loader.run())
+
+        self.assertEqual(["0", "2"], [order["OrderID"] for order in self.read_orders()])
+
+    def test_run_acks_written_orders(self):
+        loop = asyncio.get_event_loop()
+        stream = fstream.Stream("TestLoaderOrder", PickleSchema(Order), str(self.data_dir / "streams"))
+        producer = stream.create_producer()
+        loop.run_until_complete(
+            producer.send_batch_async([Order(OrderID=i) for i in range(3)], properties={"type": "add", "entity": "Order"})
+        )
+        producer.close()
+
+        loop.run_until_complete(Loader(stream.create_consumer("loader")).run())
+
+        self.assertEqual(["0", "1", "2"], [order["OrderID"] for order in self.read_orders()])
+        # A loader restarted on the stream doesn't load the orders again
+        self.assertEqual(4, stream.create_consumer("loader").committed)
+        stream.reset()
+
+    def test_run_does_not_ack_unwritten_orders(self):
+        loop = asyncio.get_event_loop()
+        stream = fstream.Stream("TestLoaderOrder", PickleSchema(Order), str(self.data_dir / "streams"))
+        producer = stream.create_producer()
+        loop.run_until_complete(
+            producer.send_batch_async([Order(OrderID=i) for i in range(3)], properties={"type": "add", "entity": "Order"})
+        )
+        producer.close()
+
+        with mock.patch.object(CsvSink, "_write_buffer", side_effect=OSError("disk full")):
+            loop.run_until_complete(Loader(stream.create_consumer("loader")).run())
+
+        self.assertFalse((self.data_dir / "target" / "order.csv").exists())
+        # The orders are replayed by a restarted loader
+        self.assertEqual(0, stream.create_consumer("loader").committed)
+        stream.reset()
+
+    @unittest.skipIf(pa is None, "pyarrow is not installed")
+    def test_run_parquet_sink(self):
+        import pyarrow.parquet as pq
+
+        service.ENV.crisp.loader = service.configuration.namespace_it_deep(
+            {"sinks": {"Order": {"format": "parquet", "row_group_size": 2}}}, {}
+        )
+        loader = Loader(self.stream.create_consumer("parquet"))
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(
+            self.producer.send_batch_async([Order(OrderID=i) for i in range(3)], properties={"type": "add", "entity": "Order"})
+        )
+        self.producer.close()
+
+        loop.run_until_complete(loader.run())
+
+        self.assertEqual([0, 1, 2], pq.read_table(self.data_dir / "target" / "order.parquet").column("OrderID").to_pylist())
+
+    def test_run_sqlite_sink(self):
+        service.ENV.crisp.loader = service.configuration.namespace_it_deep({"sinks": {"Order": {"format": "sqlite"}}}, {})
+        loader = Loader(self.stream.create_consumer("sqlite"))
+        loop = asyncio.get_event_loop()
+        loop.run_until_complete(
+            self.producer.send_batch_async([Order(OrderID=i) for i in range(3)], properties={"type": "add", "entity": "Order"})
+        )
+        self.producer.close()
+
+        loop.run_until_complete(loader.run())
+
+        connection = sqlite3.connect(str(self.data_dir / "target" / "crisp.db"))
+        try:
+            self.assertEqual([(0,), (1,), (2,)], connection.execute("SELECT OrderID FROM 'order'").fetchall())
+        finally:
+            connection.close()
+
+    def test_run_partitioned_sink(self):
+        service.ENV.crisp.loader = service.configuration.namespace_it_deep(
+            {"sinks": {"Order": {"partition": {"field": "ProductId"}}}}, {}
+        )
+        loader = Loader(self.stream.create_consumer("partitioned"))
+        loop = asyncio.get_event_loop()
+        orders = [Order(OrderID=i, ProductId=f"P{i % 2}") for i in range(3)]
+        loop.run_until_complete(self.producer.send_batch_async(orders, properties={"type": "add", "entity": "Order"}))
+        self.producer.close()
+
+        loop.run_until_complete(loader.run())
+
+        for product_id, order_ids in (("P0", ["0", "2"]), ("P1", ["1"])):
+            with open(self.data_dir / "target" / "order" / f"ProductId={product_id}" / "order.csv", newline="") as file:
+                self.assertEqual(order_ids, [order["OrderID"] for order in csv.DictReader(file)])
+
+    def test_run_skips_loaded_orders(self):
+        service.ENV.crisp.loader = service.configuration.namespace_it_deep({"dedup": {"enabled": True}}, {})
+        loop = asyncio.get_event_loop()
+        stream = fstream.Stream("TestLoaderOrder", PickleSchema(Order), str(self.data_dir / "streams"))
+        producer = stream.create_producer()
+        # The same file extracted twice
+        for _ in range(2):
+            loop.run_until_complete(
+                producer.send_batch_async([Order(OrderID=i) for i in range(3)], properties={"type": "add", "entity": "Order"})
+            )
+        loop.run_until_complete(
+            producer.send_batch_async([Order(OrderID=i) for i in range(2, 5)], properties={"type": "add", "entity": "Order"})
+        )
+        producer.close()
+        loop.run_until_complete(Loader(stream.create_consumer("loader")).run())
+        self.assertEqual(["0", "1", "2", "3", "4"], [order["OrderID"] for order in self.read_orders()])
+
+        # A restarted loader replaying the stream keeps skipping them
+        loop.run_until_complete(Loader(stream.create_consumer("replay")).run())
+        self.assertEqual(5, len(self.read_orders()))
+        stream.reset()
+
+    def test_unsupported_sink(self):
+        service.ENV.crisp.loader = service.configuration.namespace_it_deep({"sinks": {"Order": {"format": "xml"}}}, {})
+        with self.assertRaises(ValueError):
+            Loader(self.stream.create_consumer("xml"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+import sys
+import unittest
+from unittest import mock
+
+from c3p_etl import registry as registry_module
+from c3p_etl.columnar import ColumnarPlan
+from c3p_etl.functions import parse_int
+from c3p_etl.plan import compile_transformations
+from c3p_etl.registry import FunctionRegistry, create_registry, transform_function
+
+from c3p_model.order import Order
+
+
+def _double_column(values):
+    return [2 * int(value) for value in values]
+
+
+@transform_function(pure=True, vectorized=_double_column)
+def double(value):
+    return 2 * int(value)
+
+
+@transform_function(name="upper", pure=True, cacheable=True)
+def to_upper(value):
+    return value.upper()
+
+
+def not_declared(value):
+    return value
+
+
+TRANSFORMATIONS = [
+    {"transform": {"source_column": "Id", "target_column": "OrderID", "func": "double"}},
+    {"transform": {"source_column": "Name", "target_column": "ProductName", "func": "upper"}},
+]
+
+
+class TestFunctionRegistry(unittest.TestCase):
+    def test_load_module(self):
+        registry = FunctionRegistry()
+        registry.load_module(__name__)
+        self.assertEqual(["double", "upper"], sorted(registry.funcs))
+        # Loading a module again doesn't register its functions twice
+        registry.load_module(sys.modules[__name__])
+        self.assertEqual(2, len(registry.funcs))
+        with self.assertRaisesRegex(ValueError, "already registered as 'upper'"):
+            registry.register(not_declared, "upper")
+
+    def test_declarations(self):
+        with self.assertRaises(ValueError):
+            transform_function(cacheable=True)
+        self.assertTrue(to_upper.pure and to_upper.cacheable)
+        self.assertIs(_double_column, double.vectorized)
+
+        registry = create_registry([__name__], use_entry_points=False)
+        # The built-in functions, and the declarations kept by the timed functions
+        self.assertIn("convert_to_float_with_two_decimals", registry.funcs)
+        self.assertTrue(registry.funcs["upper"].cacheable)
+        self.assertIs(to_upper, registry.funcs["upper"].__wrapped__)
+
+    def test_timing(self):
+        registry = create_registry([__name__], use_entry_points=False)
+        plan = compile_transformations(TRANSFORMATIONS, Order, registry.funcs, cache_size=16)
+        rows = [{"Id": str(i % 2), "Name": "box"} for i in range(4)]
+        self.assertEqual([Order(OrderID=2 * (i % 2), ProductName="BOX") for i in range(4)], [plan(row) for row in rows])
+
+        self.assertEqual(4, registry.stats["double"].calls)
+        # The cached function is only called on misses
+        self.assertEqual(1, registry.stats["upper"].calls)
+        self.assertGreater(registry.stats["double"].seconds, 0)
+
+        # The columnar plan uses the vectorized variant, timed apart
+        self.assertEqual([0, 2, 0, 2], [order.OrderID for order in ColumnarPlan(plan)(rows).to_records()])
+        self.assertEqual(1, registry.stats["double[vectorized]"].calls)
+        self.assertEqual(4, registry.stats["double"].calls)
+
+        self.assertEqual({}, create_registry(use_entry_points=False, timing=False).stats)
+
+    def test_load_entry_points(self):
+        entry_points = [mock.Mock(), mock.Mock()]
+        entry_points[0].name = "as_int"
+        entry_points[0].load.return_value = parse_int
+        entry_points[1].load.return_value = sys.modules[__name__]
+        with mock.patch.object(registry_module, "entry_points", return_value=entry_points) as mock_entry_points:
+            registry = FunctionRegistry(timing=False)
+            registry.load_entry_points()
+        mock_entry_points.assert_called_once_with(group="c3p_etl.transform_functions")
+        self.assertEqual({"as_int": parse_int, "double": double, "upper": to_upper}, registry.funcs)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+import asyncio
+import csv
+from datetime import datetime
+import gzip
+import os
+import sqlite3
+from pathlib import Path
+import tempfile
+import unittest
+
+from c3p_etl.compression import get_compression
+from c3p_etl.sink import ArrowSink, CsvSink, PartitionedCsvSink, RecordLayout, SqliteSink, partitioner
+from c3p_etl.sink.arrowsink import pa
+
+from c3p_model.order import Order
+from c3p_model.weight_unit import WeightUnit
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+class TestCsvSink(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp_dir.name) / "order.csv"
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def read_rows(self):
+        with open(self.path, newline="") as file:
+            return list(csv.reader(file))
+
+    def test_record_layout(self):
+        layout = RecordLayout.of(Order)
+        self.assertIs(layout, RecordLayout.of(Order))
+        self.assertEqual(("OrderID", "OrderDate", "ProductId", "ProductName", "Quantity", "Unit"), layout.fieldnames)
+        self.assertEqual([1, None, "", "", 2.5, "kg"], layout.values(Order(OrderID=1, Quantity=2.5, Unit=WeightUnit.Kilograms)))
+        with self.assertRaises(TypeError):
+            layout.values("not an order")
+
+    def test_header_written_once(self):
+        sink = CsvSink(Order, self.path)
+        run(sink.write([Order(OrderID=1), "not an order", Order(OrderID=2)]))
+        self.assertFalse(self.path.exists())
+        run(sink.close())
+
+        sink = CsvSink(Order, self.path)
+        run(sink.write([Order(OrderID=3)]))
+        run(sink.close())
+
+        rows = self.read_rows()
+        self.assertEqual(list(RecordLayout.of(Order).fieldnames), rows[0])
+        self.assertEqual(["1", "2", "3"], [row[0] for row in rows[1:]])
+
+    def test_header_written_in_empty_file(self):
+        self.path.touch()
+        sink = CsvSink(Order, self.path)
+        run(sink.write([Order(OrderID=1)]))
+        run(sink.close())
+        self.assertEqual("OrderID", self.read_rows()[0][0])
+
+    def test_flush_on_size(self):
+        sink = CsvSink(Order, self.path, flush_size=50)
+        run(sink.write([Order(OrderID=1)]))
+        self.assertFalse(self.path.exists())
+        run(sink.write([Order(OrderID=i) for i in range(2, 6)]))
+        self.assertEqual(6, len(self.read_rows()))
+        run(sink.close())
+
+    def test_flush_on_time(self):
+        sink = CsvSink(Order, self.path, flush_interval=0.05)
+        run(sink.write([Order(OrderID=1)]))
+        run(sink.flush_if_due())
+        self.assertFalse(self.path.exists())
+        run(asyncio.sleep(0.05))
+        run(sink.flush_if_due())
+        self.assertEqual(2, len(self.read_rows()))
+        run(sink.close())
+
+    def test_rotate_rows(self):
+        sink = CsvSink(Order, self.path, flush_size=1, rotate_rows=2)
+        for i in range(5):
+            run(sink.write([Order(OrderID=i)]))
+        # The file being written is a part, the full ones are renamed to segments
+        self.assertEqual(["order.00000001.csv", "order.00000002.csv", "order.csv.part"], sorted(os.listdir(self.path.parent)))
+        run(sink.close())
+
+        # A restarted sink numbers its segments after the existing ones
+        sink = CsvSink(Order, self.path, flush_size=1, rotate_rows=2)
+        run(sink.write([Order(OrderID=5)]))
+        run(sink.close())
+        segments = sorted(os.listdir(self.path.parent))
+        self.assertEqual([f"order.{i:08d}.csv" for i in range(1, 5)], segments)
+        ids = []
+        for segment in segments:
+            self.path = self.path.with_name(segment)
+            rows = self.read_rows()
+            self.assertEqual("OrderID", rows[0][0])
+            ids.extend(int(row[0]) for row in rows[1:])
+        self.assertEqual(list(range(6)), ids)
+
+    def test_rotate_bytes_compressed(self):
+        sink = CsvSink(Order, self.path, flush_size=1, rotate_bytes=100, compression=get_compression("gzip"))
+        run(sink.write([Order(OrderID=i) for i in range(10)]))
+        run(sink.write([Order(OrderID=10)]))
+        run(sink.close())
+
+        # The segments are compressed once closed
+        self.assertEqual(["order.00000001.csv.gz", "order.00000002.csv.gz"], sorted(os.listdir(self.path.parent)))
+        with gzip.open(self.path.with_name("order.00000002.csv.gz"), "rt", newline="") as file:
+            self.assertEqual(["OrderID", "10"], [row[0] for row in csv.reader(file)])
+
+
+@unittest.skipIf(pa is None, "pyarrow is not installed")
+class TestArrowSink(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.tmp_dir = Path(self._tmp_dir.name)
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def orders(self, start, stop):
+        return [
+            Order(OrderID=i, OrderDate="2023-01-02 00:00:00", ProductName=f"P{i}", Quantity=i / 2, Unit=WeightUnit.Kilograms)
+            for i in range(start, stop)
+        ]
+
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+
+        path = self.tmp_dir / "order.parquet"
+        sink = ArrowSink(Order, path, flush_size=3, compression="zstd")
+        run(sink.write(self.orders(0, 4)))
+        run(sink.write(self.orders(4, 5)))
+        run(sink.close())
+
+        parquet_file = pq.ParquetFile(path)
+        # A row group per flush
+        self.assertEqual([4, 1], [parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)])
+        table = parquet_file.read()
+        self.assertEqual(pa.int64(), table.schema.field("OrderID").type)
+        self.assertEqual(pa.timestamp("ms"), table.schema.field("OrderDate").type)
+        self.assertEqual(pa.float64(), table.schema.field("Quantity").type)
+        self.assertEqual(list(range(5)), table.column("OrderID").to_pylist())
+        self.assertEqual(["kg"] * 5, table.column("Unit").to_pylist())
+
+        # A closed file is not appended to, the next records go to a new file
+        sink = ArrowSink(Order, path)
+        run(sink.write([Order(OrderID=9)]))
+        run(sink.close())
+        self.assertEqual(self.tmp_dir / "order.1.parquet", sink.path)
+        self.assertEqual([9], pq.read_table(sink.path).column("OrderID").to_pylist())
+        self.assertEqual([None], pq.read_table(sink.path).column("OrderDate").to_pylist())
+
+    def test_arrow(self):
+        path = self.tmp_dir / "order.arrow"
+        sink = ArrowSink(Order, path, format="arrow", flush_size=2, compression="lz4")
+        run(sink.write(self.orders(0, 3)))
+        run(sink.close())
+
+        with pa.ipc.open_file(path) as reader:
+            table = reader.read_all()
+        self.assertEqual([0, 1, 2], table.column("OrderID").to_pylist())
+        self.assertEqual(["P0", "P1", "P2"], table.column("ProductName").to_pylist())
+
+    def test_unsupported_format(self):
+        with self.assertRaises(ValueError):
+            ArrowSink(Order, self.tmp_dir / "order.orc", format="orc")
+
+
+class TestSqliteSink(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.path = Path(self._tmp_dir.name) / "crisp.db"
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def query(self, sql):
+        connection = sqlite3.connect(str(self.path))
+        try:
+            return connection.execute(sql).fetchall()
+        finally:
+            connection.close()
+
+    def test_insert_batches(self):
+        sink = SqliteSink(Order, self.path, flush_size=3)
+        orders = [
+            Order(OrderID=1, OrderDate="2023-05-17 00:00:00", Quantity=1.5, Unit=WeightUnit.Kilograms),
+            Order(OrderID=2, OrderDate=datetime(2023, 5, 18), Unit=WeightUnit.Pounds),
+        ]
+        run(sink.write(orders))
+        self.assertFalse(self.path.exists())
+        run(sink.write([Order(OrderID=i) for i in range(3, 5)]))
+        # The rows of a flush are committed together
+        self.assertEqual([(4,)], self.query("SELECT COUNT(*) FROM 'order'"))
+        run(sink.write([Order(OrderID=5)]))
+        run(sink.close())
+
+        self.assertEqual(
+            [(1, "2023-05-17 00:00:00", "", "", 1.5, "kg"), (2, "2023-05-18 00:00:00", "", "", 0.0, "lbs")],
+            self.query("SELECT * FROM 'order' WHERE OrderID <= 2 ORDER BY OrderID"),
+        )
+        self.assertEqual([(5,)], self.query("SELECT COUNT(*) FROM 'order'"))
+        self.assertEqual([("wal",)], self.query("PRAGMA journal_mode"))
+        columns = {row[1]: row[2] for row in self.query("PRAGMA table_info('order')")}
+        self.assertEqual(
+            {
+                "OrderID": "INTEGER",
+                "OrderDate": "TEXT",
+                "ProductId": "TEXT",
+                "ProductName": "TEXT",
+                "Quantity": "REAL",
+                "Unit": "TEXT",
+            },
+            columns,
+        )
+
+        # The table is reused by the next sink
+        sink = SqliteSink(Order, self.path)
+        run(sink.write([Order(OrderID=6)]))
+        run(sink.close())
+        self.assertEqual([(6,)], self.query("SELECT COUNT(*) FROM 'order'"))
+
+    def test_failed_batch_is_rolled_back(self):
+        self.query("CREATE TABLE 'order' (OrderID INTEGER PRIMARY KEY, OrderDate, ProductId, ProductName, Quantity, Unit)")
+        sink = SqliteSink(Order, self.path, flush_size=10)
+        run(sink.write([Order(OrderID=1), Order(OrderID=2), Order(OrderID=1)]))
+        with self.assertRaises(sqlite3.IntegrityError):
+            run(sink.flush())
+        # None of the rows of the batch are inserted, they stay buffered
+        self.assertEqual([(0,)], self.query("SELECT COUNT(*) FROM 'order'"))
+        self.assertTrue(sink.buffered)
+        # The database is released even though the last flush fails
+        with self.assertRaises(sqlite3.IntegrityError):
+            run(sink.close())
+        self.assertIsNone(sink._connection)
+
+
+class TestPartitionedCsvSink(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.directory = Path(self._tmp_dir.name) / "order"
+
+    def tearDown(self):
+        self._tmp_dir.cleanup()
+
+    def read_ids(self, partition):
+        with open(self.directory / partition / "order.csv", newline="") as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(list(RecordLayout.of(Order).fieldnames), rows[0])
+        return [int(row[0]) for row in rows[1:]]
+
+    def test_partitioner(self):
+        values = RecordLayout.of(Order).values
+        order = Order(OrderID=1, OrderDate="2023-05-17 00:00:00", ProductId="P-1", Unit=WeightUnit.Kilograms)
+        self.assertEqual("year=2023/month=05", partitioner(Order, "OrderDate", by="month")(values(order)))
+        by_day = partitioner(Order, "OrderDate", by="day")
+        self.assertEqual("year=2023/month=05/day=17", by_day(values(Order(OrderDate=datetime(2023, 5, 17)))))
+        self.assertEqual("unknown", partitioner(Order, "OrderDate", by="year")(values(Order())))
+        self.assertEqual("Unit=kg", partitioner(Order, "Unit")(values(order)))
+        by_hash = partitioner(Order, "ProductId", by="hash", buckets=16)
+        self.assertRegex(by_hash(values(order)), r"^ProductId_bucket=\d\d$")
+        self.assertEqual(by_hash(values(order)), by_hash(values(Order(ProductId="P-1"))))
+        for field, by in (("Missing", "value"), ("OrderDate", "week")):
+            with self.subTest(field=field, by=by), self.assertRaises(ValueError):
+                partitioner(Order, field, by=by)
+
+    def test_write_partitions(self):
+        sink = PartitionedCsvSink(Order, self.directory, partitioner(Order, "OrderDate", by="month"), max_open=2)
+        months = ["2023-01-05 00:00:00", "2023-02-05 00:00:00", "2023-03-05 00:00:00"]
+        run(sink.write([Order(OrderID=i, OrderDate=months[i % 3]) for i in range(6)]))
+        run(sink.flush())
+        # At most max_open files are open, the least recently written is closed
+        self.assertEqual(["year=2023/month=02", "year=2023/month=03"], list(sink._files))
+        run(sink.write([Order(OrderID=6, OrderDate=months[0]), Order(OrderID=7)]))
+        run(sink.close())
+
+        self.assertEqual([0, 3, 6], self.read_ids("year=2023/month=01"))
+        self.assertEqual([1, 4], self.read_ids("year=2023/month=02"))
+        self.assertEqual([2, 5], self.read_ids("year=2023/month=03"))
+        self.assertEqual([7], self.read_ids("unknown"))
+        self.assertFalse(sink._files)
+
+
+if __name__ == "__main__":
+    unittest.main()
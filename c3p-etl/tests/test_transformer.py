@@ -1,13 +1,53 @@
 #!/usr/bin/env python3
 
+import asyncio
+import json
 from pathlib import Path
+from random import Random
+import tempfile
 import unittest
-import sqlite3
-import json
-import re
-import datetime
 
-from c3p_etl.transformer import convert_to_float_with_two_decimals
+from c3p_core import service
+from c3p_core.stream.schema import PickleSchema
+import c3p_core.stream.stub as sstream
+
+from c3p_etl import columnar
+from c3p_etl.columnar import ColumnarPlan
+from c3p_etl.deadletter import DeadLetterFile, RejectCounters, Rejected, read_dead_letters
+from c3p_etl.functions import parse_int
+from c3p_etl.plan import compile_transformations
+from c3p_etl.transformer import Transformer, convert_to_float_with_two_decimals
+
+from c3p_model.order import Order
+from c3p_model.weight_unit import WeightUnit
+
+
+TRANSFORMATIONS_FILE = Path(__file__).resolve().parents[2] / "transformations.json"
+
+
+def order_row(order_number, product_name="this is a product"):
+    return {
+        "Order Number": str(order_number),
+        "Year": "2023",
+        "Month": "5",
+        "Day": "17",
+        "Product Number": "P-10001",
+        "Product Name": product_name,
+        "Count": "1,234.567",
+    }
+
+
+async def run_transformer(transformer: Transformer, output: sstream.Consumer):
+    await transformer.run()
+    messages = []
+    try:
+        while True:
+            batch = await output.getmany(timeout=0.01)
+            if not batch:
+                return messages
+            messages.extend(batch)
+    except StopAsyncIteration:
+        return messages
 
 
 class TestCache(unittest.TestCase):
@@ -17,5 +57,319 @@ class TestCache(unittest.TestCase):
         )
 
 
+class TestPlan(unittest.TestCase):
+    def setUp(self):
+        with open(TRANSFORMATIONS_FILE) as file:
+            self.transformations = json.load(file)
+
+    def compile(self, transformations):
+        transform_funcs = {"parse_int": parse_int, "convert_to_float_with_two_decimals": convert_to_float_with_two_decimals}
+        return compile_transformations(transformations, Order, transform_funcs)
+
+    def test_source_columns(self):
+        plan = self.compile(self.transformations)
+        self.assertEqual(
+            ["Order Number", "Year", "Month", "Day", "Product Number", "Product Name", "Count"],
+            plan.source_columns,
+        )
+
+    def test_compiled_plan(self):
+        plan = self.compile(
+            [
+                {"transform": {"source_column": "Id", "target_column": "OrderID", "func": "parse_int"}},
+                {"rename": {"source_column": "Qty", "target_column": "Quantity", "data_type": "float"}},
+            ]
+        )
+        self.assertEqual(Order(OrderID=7, Quantity=2.5), plan({"Id": "7", "Qty": "2.5", "Other": "x"}))
+        with self.assertRaises(KeyError):
+            plan({"Id": "7"})
+
+    def test_plan_for_columns(self):
+        plan = self.compile(self.transformations)
+        row = order_row(12, "blue big box")
+        columns = list(reversed(row)) + ["Extra"]
+        self.assertEqual(plan(row), plan.for_columns(columns)([row[column] for column in columns[:-1]] + ["x"]))
+        self.assertIs(plan.for_columns(columns), plan.for_columns(tuple(columns)))
+        with self.assertRaisesRegex(ValueError, "missing source column 'Count'"):
+            plan.for_columns(columns[1:])
+
+    def test_cached_rules(self):
+        transformations = [dict(transformation) for transformation in self.transformations]
+        # A rule may set its own cache size
+        transformations[1] = {"concatenate_date": dict(transformations[1]["concatenate_date"], cache_size=0)}
+        transform_funcs = {"convert_to_float_with_two_decimals": convert_to_float_with_two_decimals}
+        plan = compile_transformations(transformations, Order, transform_funcs, cache_size=2)
+        rows = [order_row(i, f"product {i % 3}") for i in range(6)]
+        self.assertEqual([self.compile(self.transformations)(row) for row in rows], [plan(row) for row in rows])
+
+        # Only the cacheable functions are cached, the least recently used results are evicted
+        cache_info = plan.cache_info()
+        self.assertEqual(["ProductName", "Quantity"], sorted(cache_info))
+        # Three product names used in turn always miss a cache of two
+        self.assertEqual((0, 6, 2, 2), tuple(cache_info["ProductName"]))
+        self.assertEqual((5, 1, 2, 1), tuple(cache_info["Quantity"]))
+        self.assertEqual({}, self.compile(self.transformations).cache_info())
+
+        with self.assertRaisesRegex(ValueError, "invalid cache_size"):
+            self.compile([{"proper_case": {"source_column": "A", "target_column": "ProductName", "cache_size": -1}}])
+
+    def test_invalid_transformations(self):
+        invalid = [
+            {"rename": {"source_column": "A", "target_column": "OrderID", "data_type": "long"}},
+            {"rename": {"source_column": "A", "target_column": "Missing", "data_type": "int"}},
+            {"rename": {"target_column": "OrderID", "data_type": "int"}},
+            {"transform": {"source_column": "A", "target_column": "OrderID", "func": "unknown"}},
+            {"unknown_rule": {"target_column": "OrderID"}},
+            {"proper_case": {"source_column": "A", "target_column": "ProductName"}, "rename": {}},
+            {"add_weight_value": {"target_column": "Unit", "value": "tons"}},
+        ]
+        for transformation in invalid:
+            with self.subTest(transformation=transformation), self.assertRaises(ValueError):
+                self.compile([transformation])
+
+        with self.assertRaisesRegex(ValueError, "#1: 'OrderID' is already set"):
+            self.compile([self.transformations[0], self.transformations[0]])
+
+
+class TestColumnarPlan(unittest.TestCase):
+    def setUp(self):
+        with open(TRANSFORMATIONS_FILE) as file:
+            transform_funcs = {"convert_to_float_with_two_decimals": convert_to_float_with_two_decimals}
+            self.plan = compile_transformations(json.load(file), Order, transform_funcs)
+        self.rows = [order_row(i, f"product {i % 3}") for i in range(20)]
+        self.rows[3]["Month"] = "2"
+        self.rows[3]["Day"] = "28"
+        self.rows[4]["Year"] = "2024"
+        self.rows[4]["Month"] = "12"
+        self.rows[4]["Day"] = "31"
+        self.rows[5]["Count"] = "9,999.995"
+
+    def check_same_as_row_plan(self):
+        columnar_plan = ColumnarPlan(self.plan)
+        self.assertEqual([self.plan(row) for row in self.rows], columnar_plan(self.rows).to_records())
+
+        for column, value in (("Order Number", "bad"), ("Day", "30"), ("Month", "13")):
+            rows = [dict(row) for row in self.rows]
+            rows[7][column] = value
+            with self.subTest(column=column), self.assertRaises(ValueError):
+                rows[7]["Month"] = "2" if column == "Day" else rows[7]["Month"]
+                columnar_plan(rows)
+
+    def test_same_as_row_plan(self):
+        self.check_same_as_row_plan()
+
+    def test_same_as_row_plan_without_numpy(self):
+        np = columnar.np
+        columnar.np = None
+        try:
+            self.check_same_as_row_plan()
+        finally:
+            columnar.np = np
+
+    def test_same_quantities_as_row_plan(self):
+        random = Random(42)
+        counts = [f"{random.randrange(10000)}.{random.randrange(1000):03d}" for _ in range(10000)] + ["1874.605", "3765.975"]
+        rows = [dict(order_row(i), Count=count) for i, count in enumerate(counts)]
+        expected = [self.plan(row).Quantity for row in rows]
+        self.assertEqual(expected, [order.Quantity for order in ColumnarPlan(self.plan)(rows).to_records()])
+
+    def test_cached_same_as_row_plan(self):
+        with open(TRANSFORMATIONS_FILE) as file:
+            transform_funcs = {"convert_to_float_with_two_decimals": convert_to_float_with_two_decimals}
+            self.plan = compile_transformations(json.load(file), Order, transform_funcs, cache_size=16)
+        self.check_same_as_row_plan()
+        self.test_same_as_row_plan_without_numpy()
+
+    def test_rows_of_values(self):
+        columns = list(self.rows[0])
+        rows = [[row[column] for column in columns] for row in self.rows]
+        columnar_plan = ColumnarPlan(self.plan)
+        self.assertEqual(columnar_plan(self.rows).to_records(), columnar_plan(rows, columns).to_records())
+
+    def test_struct_of_arrays(self):
+        batch = ColumnarPlan(self.plan)(self.rows)
+        self.assertEqual(20, len(batch))
+        self.assertEqual(list(range(20)), list(batch.columns["OrderID"]))
+
+
+class TestDeadLetter(unittest.TestCase):
+    def test_file(self):
+        rejected = [
+            Rejected("OrderRow", order_row("bad"), None, "transform", "OrderID", "ValueError", "bad"),
+            Rejected("OrderRow", ["x", "y"], ["A", "B"], None, None, "TypeError", "missing"),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "dead_letter" / "orderrow.jsonl"
+            dead_letter = DeadLetterFile(path, flush_rows=3)
+            loop = asyncio.get_event_loop()
+            loop.run_until_complete(dead_letter.write(rejected))
+            # Buffered until flush_rows rows are rejected
+            self.assertFalse(path.exists())
+            loop.run_until_complete(dead_letter.write(rejected[:1]))
+            loop.run_until_complete(dead_letter.write(rejected[1:]))
+            loop.run_until_complete(dead_letter.close())
+            self.assertEqual(rejected + rejected, list(read_dead_letters(path)))
+
+    def test_counters(self):
+        counters = RejectCounters()
+        counters.add([Rejected("OrderRow", {}, None, "transform", "OrderID", "ValueError", f"bad {i}") for i in range(3)])
+        counters.add([Rejected("OrderRow", {}, None, "proper_case", "ProductName", "IndexError", "empty")])
+        self.assertEqual(
+            [(("OrderRow", "OrderID", "ValueError"), 3, "bad 0"), (("OrderRow", "ProductName", "IndexError"), 1, "empty")],
+            counters.take(),
+        )
+        self.assertEqual([], counters.take())
+        self.assertEqual(4, counters.total)
+
+
+class TestTransformer(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.dead_letter_path = Path(self._tmp_dir.name) / "dead_letter" / "orderrow.jsonl"
+        service.ENV = service.configuration.namespace_it_deep(
+            {"crisp": {"transformations_file": str(TRANSFORMATIONS_FILE), "batch_size": 100, "data_dir": self._tmp_dir.name}}, {}
+        )
+        for topic in ("TestOrderRow", "TestOrder"):
+            sstream.Stream(topic, PickleSchema(object)).reset()
+        self.input_stream = sstream.Stream("TestOrderRow", PickleSchema(dict))
+        self.output_stream = sstream.Stream("TestOrder", PickleSchema(Order))
+        self.input = self.input_stream.create_producer()
+        self.output = self.output_stream.create_consumer("test")
+        self.transformer = Transformer(self.input_stream.create_consumer("transformer"), self.output_stream.create_producer())
+
+    def tearDown(self):
+        self.input_stream.reset()
+        self.output_stream.reset()
+        self._tmp_dir.cleanup()
+
+    def run_transformer(self):
+        loop = asyncio.get_event_loop()
+        return loop.run_until_complete(run_transformer(self.transformer, self.output))
+
+    def test_transform_order_row(self):
+        order = self.transformer._transform_order_row(order_row(12, "blue big box"))
+        self.assertEqual(
+            Order(12, "2023-05-17 00:00:00", "P-10001", "BlueBigBox", 1234.57, WeightUnit.Kilograms),
+            order,
+        )
+
+    def test_run_stops_at_end_of_stream(self):
+        loop = asyncio.get_event_loop()
+        properties = {"type": "add", "entity": "OrderRow"}
+        loop.run_until_complete(self.input.send_batch_async([order_row(i) for i in range(3)], properties=properties))
+        # The end of stream arrives in the middle of the batch read by the transformer
+        loop.run_until_complete(self.input.send_async(None, properties={"type": "end_of_stream"}))
+        loop.run_until_complete(self.input.send_batch_async([order_row(i) for i in range(3, 5)], properties=properties))
+
+        messages = self.run_transformer()
+        self.assertEqual([0, 1, 2], [message.value.OrderID for message in messages])
+        self.assertEqual({"type": "add", "entity": "Order"}, messages[0].properties)
+
+    def test_run_skips_rejected_rows(self):
+        loop = asyncio.get_event_loop()
+        rows = [order_row(0), order_row("bad"), order_row(2), order_row(3, "")]
+        loop.run_until_complete(self.input.send_batch_async(rows, properties={"type": "add", "entity": "OrderRow"}))
+        self.input.close()
+
+        with self.assertLogs("c3p_etl.transformer", "WARNING") as logs:
+            messages = self.run_transformer()
+        self.assertEqual([0, 2], [message.value.OrderID for message in messages])
+
+        # The rejected rows are written to the dead letter with the failing rule, and counted
+        rejected = list(read_dead_letters(self.dead_letter_path))
+        self.assertEqual([rows[1], rows[3]], [entry.row for entry in rejected])
+        self.assertEqual(("rename", "OrderID", "ValueError"), rejected[0][3:6])
+        self.assertEqual(("proper_case", "ProductName"), rejected[1][3:5])
+        self.assertEqual(2, len(logs.records))
+        self.assertIn("Rejected since last check: 1 OrderRow at OrderID, ValueError", logs.output[0])
+
+    def test_run_rejects_to_stream(self):
+        dead_letter_stream = sstream.Stream("TestRejectedOrderRow", PickleSchema(dict))
+        dead_letter_stream.reset()
+        dead_letter = dead_letter_stream.create_consumer("test")
+        self.transformer = Transformer(
+            self.input_stream.create_consumer("dead_letter"),
+            self.output_stream.create_producer(),
+            dead_letter_producer=dead_letter_stream.create_producer(),
+        )
+        self.input_stream.create_consumer("transformer").close()
+
+        loop = asyncio.get_event_loop()
+        rows = [order_row(0), order_row("bad")]
+        loop.run_until_complete(self.input.send_batch_async(rows, properties={"type": "add", "entity": "OrderRow"}))
+        self.input.close()
+
+        self.assertEqual(1, len(self.run_transformer()))
+        messages = loop.run_until_complete(dead_letter.getmany(timeout=0.01))
+        self.assertEqual({"type": "add", "entity": "RejectedOrderRow"}, messages[0].properties)
+        self.assertEqual(
+            Rejected("OrderRow", rows[1], None, "rename", "OrderID", "ValueError", "invalid literal for int() with base 10: 'bad'"),
+            Rejected(**messages[0].value),
+        )
+        self.assertFalse(self.dead_letter_path.exists())
+        dead_letter_stream.reset()
+
+    def test_run_with_workers(self):
+        for ordered in (True, False):
+            with self.subTest(ordered=ordered):
+                service.ENV.crisp.transformer = service.configuration.namespace_it_deep(
+                    {"workers": 2, "ordered": ordered, "max_pending": 1}, {}
+                )
+                self.transformer = Transformer(self.input_stream.create_consumer("workers"), self.output_stream.create_producer())
+                self.transformer.batch_size = 10
+
+                loop = asyncio.get_event_loop()
+                rows = [order_row(i) for i in range(95)] + [order_row("bad")]
+                properties = {"type": "add", "entity": "OrderRow"}
+                for i in range(0, len(rows), 10):
+                    loop.run_until_complete(self.input.send_batch_async(rows[i:i + 10], properties=properties))
+                self.input_stream.create_consumer("transformer").close()
+                self.input.close()
+
+                order_ids = [message.value.OrderID for message in self.run_transformer()]
+                self.assertEqual(list(range(95)), order_ids if ordered else sorted(order_ids))
+                # The rows rejected by the worker processes are written to the dead letter too
+                self.assertEqual([rows[-1]], [entry.row for entry in read_dead_letters(self.dead_letter_path)])
+                self.dead_letter_path.unlink()
+
+                self.input_stream.reset()
+                self.input_stream = sstream.Stream("TestOrderRow", PickleSchema(dict))
+                self.input = self.input_stream.create_producer()
+
+    def test_run_rows_of_values(self):
+        for mode in ("row", "columnar"):
+            with self.subTest(mode=mode):
+                service.ENV.crisp.transformer = service.configuration.namespace_it_deep({"mode": mode}, {})
+                stream = sstream.Stream("TestOrderRowValues", PickleSchema(list))
+                self.transformer = Transformer(stream.create_consumer("transformer"), self.output_stream.create_producer())
+
+                loop = asyncio.get_event_loop()
+                producer = stream.create_producer()
+                for i, columns in enumerate((list(order_row(0)), list(reversed(order_row(0))))):
+                    rows = [[row[column] for column in columns] for row in (order_row(2 * i), order_row(2 * i + 1))]
+                    loop.run_until_complete(
+                        producer.send_batch_async(rows, properties={"type": "add", "entity": "OrderRow", "columns": columns})
+                    )
+                producer.close()
+
+                messages = self.run_transformer()
+                self.assertEqual([0, 1, 2, 3], [message.value.OrderID for message in messages])
+                self.assertEqual("ThisIsAProduct", messages[3].value.ProductName)
+                stream.reset()
+
+    def test_run_columnar_skips_rejected_rows(self):
+        service.ENV.crisp.transformer = service.configuration.namespace_it_deep({"mode": "columnar"}, {})
+        self.transformer = Transformer(self.input_stream.create_consumer("columnar"), self.output_stream.create_producer())
+        self.input_stream.create_consumer("transformer").close()
+
+        loop = asyncio.get_event_loop()
+        rows = [order_row(0), order_row("bad"), order_row(2), order_row(3, "")]
+        loop.run_until_complete(self.input.send_batch_async(rows, properties={"type": "add", "entity": "OrderRow"}))
+        self.input.close()
+
+        messages = self.run_transformer()
+        self.assertEqual([0, 2], [message.value.OrderID for message in messages])
+
+
 if __name__ == "__main__":
     unittest.main()